@@ -9,9 +9,11 @@ from typing import Optional
 import click
 
 from smartedu.configs.conf import DEFAULT_PATH, DATA_PATH
+from smartedu.downloader_async import is_available as async_available
 from smartedu.ui.cli import display_welcome, display_info, preprocess
 from smartedu.ui.cli import simple_download, interactive_download
 from smartedu.parser import get_formats
+from smartedu.utils.concurrency import DEFAULT_CEILING
 
 
 # 配置日志
@@ -30,6 +32,28 @@ logger = logging.getLogger(__name__)
 @click.option("--formats", "-t", help="下载资源类型，逗号分隔")
 @click.option("--auth", "-a", help="用户登录信息X-ND-AUTH字段；当下载失败或非最新版教材时配置")
 @click.option("--backup", "-b", is_flag=True, help="尝试用备用链接下载")
+@click.option(
+    "--engine",
+    "-e",
+    type=click.Choice(["thread", "async"]),
+    default="thread",
+    help="下载引擎：thread（线程池）或async（asyncio，适合大批量，需要aiohttp）",
+)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CEILING,
+    show_default=True,
+    help="最大并发下载数；自动调整时每个主机从4开始，不超过该值",
+)
+@click.option("--adaptive/--fixed", default=True, help="按下载速度和错误率自动调整并发数，或固定并发数")
+@click.option(
+    "--dedup/--no-dedup",
+    default=False,
+    help="相同资源只下载、保存一份（同一文件系统内硬链接，只读），默认关闭",
+)
+@click.option("--hedge", is_flag=True, help="配置请求较慢时向另一个镜像主机再发一次（增加请求数）")
 @click.option("--urls", "-u", help="URL路径列表，逗号分隔")
 @click.option("--file", "-f", type=click.Path(exists=True), help="包含URL的文件")
 @click.option("--output", "-o", type=click.Path(), default=DEFAULT_PATH, help="下载文件保存目录")
@@ -39,6 +63,11 @@ def main(
     formats: Optional[str],
     auth: Optional[str],
     backup: bool,
+    engine: str,
+    workers: int,
+    adaptive: bool,
+    dedup: bool,
+    hedge: bool,
     urls: Optional[str],
     file: Optional[str],
     output: str,
@@ -51,6 +80,10 @@ def main(
         logging.getLogger().setLevel(logging.DEBUG)
         logger.debug("调试模式已启用")
 
+    if engine == "async" and not async_available():
+        logger.error("asyncio引擎需要安装aiohttp（pip install aiohttp），或使用 --engine thread")
+        sys.exit(1)
+
     mode = (urls or file) and (not interactive)
     display_welcome(not mode)
     formats = get_formats(formats)
@@ -61,6 +94,10 @@ def main(
         "下载资源类型": formats,
         "登录参数（X-ND-AUTH）": auth,
         "启用备用链接": backup,
+        "下载引擎": engine,
+        "并发下载数": f"{'自动调整，最多' if adaptive else '固定'}{workers}",
+        "相同资源去重": dedup,
+        "对冲请求": hedge,
         "默认保存路径": output,
     }
     display_info(info)
@@ -72,14 +109,37 @@ def main(
     try:
         if mode:
             # 非交互模式，直接下载预定义URL
+            # 流式读取：边校验、去重、解析边下载
             predefined_urls = preprocess(file, urls)
-            if not predefined_urls:
+            valid = simple_download(
+                predefined_urls,
+                output,
+                formats,
+                auth,
+                backup,
+                engine,
+                workers,
+                adaptive,
+                dedup,
+                hedge,
+            )
+            if not valid:
                 logger.error("没有提供有效的URL")
                 sys.exit(1)
-            simple_download(predefined_urls, output, formats, auth)
         else:
             # 默认改成交互模式
-            interactive_download(output, formats, auth, backup, data_dir=DATA_PATH)
+            interactive_download(
+                output,
+                formats,
+                auth,
+                backup,
+                data_dir=DATA_PATH,
+                engine=engine,
+                workers=workers,
+                adaptive=adaptive,
+                dedup=dedup,
+                hedge=hedge,
+            )
             # logger.warning("请使用-u/-f提供URL列表，或使用-i进行交互")
 
     except Exception as e:
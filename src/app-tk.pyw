@@ -7,6 +7,7 @@ import logging
 
 from smartedu.ui.theme import set_dpi_scale, set_theme
 from smartedu.ui.tk import BasicDownloadApp
+from smartedu.utils.session import close_sessions
 
 
 def main(theme=None):
@@ -15,6 +16,7 @@ def main(theme=None):
     set_theme(theme=theme, font_scale=scale)
     app.eval("tk::PlaceWindow . center")
     app.mainloop()
+    close_sessions()
 
 
 if __name__ == "__main__":
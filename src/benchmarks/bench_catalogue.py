@@ -0,0 +1,73 @@
+"""
+教材目录基准：从JSON构建目录树 vs 加载编译好的索引
+
+运行: cd src && python -m benchmarks.bench_catalogue
+"""
+
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from smartedu.configs.tags import BookItem, TagHierarchy
+from smartedu.index import build_index, load_index
+from smartedu.loader import query_metadata, update_hierarchies
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data" / "v2" / "tchMaterial"
+
+
+def build_from_json(data_dir=DATA_DIR):
+    with open(data_dir / "tch_material_tag.json", encoding="utf-8") as f:
+        tag_data = json.load(f)
+    parts_data = []
+    for part_file in sorted(data_dir.glob("part_*.json")):
+        with open(part_file, encoding="utf-8") as f:
+            parts_data.extend(json.load(f))
+
+    tag_dict = {tag["tag_id"]: tag["tag_name"] for e in parts_data for tag in e["tag_list"]}
+    book_list = [
+        BookItem(e["id"], e["title"], tag_path, tag_path.split("/")[-1])
+        for e in parts_data
+        for tag_path in e["tag_paths"]
+    ]
+    tag_hier = TagHierarchy.from_dict(0, tag_data)
+    return update_hierarchies(tag_hier, tag_dict, book_list)
+
+
+def walk_first(tag_hier):
+    # 模拟交互模式：每级选择第一项，直到书本列表
+    current = tag_hier.children[0]
+    while True:
+        title, options, children, is_book = query_metadata(current)
+        if is_book or not children:
+            return options
+        current = children[0]
+
+
+def main():
+    start = time.perf_counter()
+    tag_hier = build_from_json()
+    walk_first(tag_hier)
+    json_elapsed = time.perf_counter() - start
+
+    version = {"module_version": 0}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index_file = Path(temp_dir, "tchMaterial.idx")
+        start = time.perf_counter()
+        build_index(tag_hier, version, index_file)
+        build_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index_root = load_index(index_file, version)
+        walk_first(index_root)
+        index_elapsed = time.perf_counter() - start
+        size = index_file.stat().st_size
+        index_root._index.close()
+
+    print(f"json parse + build = {json_elapsed * 1000:.1f} ms")
+    print(f"index build = {build_elapsed * 1000:.1f} ms, size = {size / 1024:.1f} KB")
+    print(f"index load + walk = {index_elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+并发数基准：固定5个并发与自适应并发（上限16）对比
+    - 高延迟链路：每个请求延迟50ms，并发越多越快
+    - 限流服务器：同时超过4个请求返回429
+
+运行: cd src && python -m benchmarks.bench_concurrency
+"""
+
+import logging
+import tempfile
+import time
+
+from smartedu.downloader import download_files
+
+from smartedu.tests.server import LocalServer
+
+
+def run(count, delay, max_active, max_workers, adaptive):
+    files = {f"/pdf/{i}.pdf": bytes(64 * 1024) for i in range(count)}
+    with LocalServer(files, delay=delay, max_active=max_active) as server:
+        url_list = [
+            [f"{i}.pdf", server.url(f"/details/{i}.json"), server.url(path), server.url(path)]
+            for i, path in enumerate(files)
+        ]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            start = time.perf_counter()
+            results = download_files(url_list, temp_dir, max_workers, None, False, adaptive)
+            elapsed = time.perf_counter() - start
+    failed = sum(1 for r in results if r["status"] != "success")
+    return elapsed, failed
+
+
+def main(count=300):
+    logging.disable(logging.ERROR)  # 429导致的下载失败日志
+    cases = [("高延迟链路", 0.05, 0), ("限流服务器", 0.05, 4)]
+    for title, delay, max_active in cases:
+        for name, max_workers, adaptive in [("固定5", 5, False), ("自适应16", 16, True)]:
+            elapsed, failed = run(count, delay, max_active, max_workers, adaptive)
+            print(f"{title} {name}: elapsed = {elapsed:.2f}s, failed = {failed}/{count}")
+
+
+if __name__ == "__main__":
+    main()
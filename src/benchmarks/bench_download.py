@@ -0,0 +1,58 @@
+"""
+下载请求数基准：本地HTTP服务模拟r1-ndr，统计下载一批文件发出的请求数、连接数与耗时
+
+原实现（baseline）：每个文件新建连接 requests.get，在响应中再 requests.get 一次读取数据
+现实现：同一主机共用连接池（utils.session），状态码、大小校验和数据读取共用一个响应
+
+运行: cd src && python -m benchmarks.bench_download
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+from smartedu.utils.dl import download_file
+
+from smartedu.tests.server import LocalServer
+
+
+def baseline_download(file_path, url, headers, timeout, chunk_size):
+    # 原 download_file + stream_download：第一个响应不读取，第二个请求下载数据
+    with requests.get(url, headers=headers, stream=True, timeout=timeout):
+        with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+            with open(file_path, "wb") as fw:
+                for data in response.iter_content(chunk_size=chunk_size):
+                    fw.write(data)
+            return {"status": "success" if response.ok else "failed"}
+
+
+def download(file_path, url, headers, timeout, chunk_size):
+    return download_file(file_path, url, headers, timeout, True, chunk_size)
+
+
+def main(count=50, size=2 * 1024 * 1024):
+    files = {f"/pdf/{i}.pdf": bytes(size) for i in range(count)}
+    print(f"files = {count}, size = {size / 1024 / 1024:.1f} MB")
+    with LocalServer(files) as server:
+        for name, func in [("baseline", baseline_download), ("session", download)]:
+            server.requests.clear()
+            server.connections.clear()
+            with tempfile.TemporaryDirectory() as temp_dir:
+                start = time.perf_counter()
+                for path in files:
+                    file_path = Path(temp_dir, Path(path).name)
+                    out = func(file_path, server.url(path), {}, 10, 16 * 1024)
+                    assert out["status"] == "success", out
+                elapsed = time.perf_counter() - start
+
+            requests_count = len(server.requests)
+            print(
+                f"{name}: requests = {requests_count} ({requests_count / count:.1f} / file), "
+                f"connections = {len(server.connections)}, elapsed = {elapsed:.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+对冲请求基准：主服务器3%的请求延迟1秒（长尾），备用服务器正常，比较配置请求耗时的分位数
+
+运行: cd src && python -m benchmarks.bench_hedge
+"""
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from smartedu.utils import hedge
+from smartedu.utils.dl import fetch_file
+
+from smartedu.tests.server import LocalServer
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+
+def run(fetch, count, warmup=50):
+    # 预热：积累延迟样本后再统计
+    for i in range(warmup):
+        fetch(i)
+
+    elapsed = []
+    for i in range(count):
+        start = time.perf_counter()
+        assert fetch(i) == {"id": i}
+        elapsed.append(time.perf_counter() - start)
+    return elapsed
+
+
+def main(count=1000):
+    files = {f"/details/{i}.json": b'{"id": %d}' % i for i in range(count)}
+    slow_delay = lambda: 1.0 if random.random() < 0.03 else 0.01  # noqa: E731
+    with LocalServer(files, delay=slow_delay) as slow, LocalServer(files, delay=0.01) as fast:
+        # 固定镜像顺序：先请求有长尾的服务器
+        hedge.ranked_urls = lambda url: [url, url.replace(slow.url(""), fast.url(""))]
+        tracker = hedge.LatencyTracker()
+        executor = ThreadPoolExecutor(max_workers=4)
+
+        cases = {
+            "不对冲": lambda i: fetch_file(slow.url(f"/details/{i}.json"), {}, 5, failover=False),
+            "对冲": lambda i: hedge.hedged_fetch(
+                slow.url(f"/details/{i}.json"), {}, 5, "json", None, executor, tracker
+            ),
+        }
+        for name, fetch in cases.items():
+            elapsed = run(fetch, count)
+            requests = len(slow.requests) + len(fast.requests)
+            print(
+                f"{name}: p50 = {percentile(elapsed, 0.5) * 1000:.0f}ms, "
+                f"p95 = {percentile(elapsed, 0.95) * 1000:.0f}ms, "
+                f"p99 = {percentile(elapsed, 0.99) * 1000:.0f}ms, "
+                f"requests = {requests}"
+            )
+            slow.requests.clear()
+            fast.requests.clear()
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
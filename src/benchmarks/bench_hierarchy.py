@@ -0,0 +1,74 @@
+"""
+目录树合并基准：update_hierarchies 按字典查找子节点 vs 原先的线性查找
+
+把 data/v2 的书本复制 n 份（末级标签各不相同），观察构建时间随兄弟节点数的增长
+
+运行: cd src && python -m benchmarks.bench_hierarchy
+"""
+
+import json
+import time
+from pathlib import Path
+
+from smartedu.configs.tags import BookItem, TagHierarchy
+from smartedu.loader import update_hierarchies
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data" / "v2" / "tchMaterial"
+
+
+def update_hierarchies_linear(tag_hier, tag_dict, book_list):
+    # 原实现：逐个扫描 children
+    for book_item in book_list:
+        tag_paths = book_item.tag_path.split("/")
+        if tag_paths[0] != tag_hier.tag_id:
+            continue
+        current_item = tag_hier
+        for current_tag_id in tag_paths[1:]:
+            for item in current_item.children:
+                if item.tag_id == current_tag_id:
+                    current_item = item
+                    break
+            else:
+                name = tag_dict[current_tag_id]
+                new_tag = TagHierarchy(current_item.level + 1, name, current_tag_id, name)
+                new_tag.set_book(book_item)
+                current_item.add_child(new_tag)
+                current_item = new_tag
+    return tag_hier
+
+
+def load_data(copies):
+    with open(DATA_DIR / "tch_material_tag.json", encoding="utf-8") as f:
+        tag_data = json.load(f)
+    parts_data = []
+    for part_file in sorted(DATA_DIR.glob("part_*.json")):
+        with open(part_file, encoding="utf-8") as f:
+            parts_data.extend(json.load(f))
+
+    tag_dict = {tag["tag_id"]: tag["tag_name"] for e in parts_data for tag in e["tag_list"]}
+    book_list = []
+    for k in range(copies):
+        for e in parts_data:
+            for tag_path in e["tag_paths"]:
+                tag_id = f"{tag_path.split('/')[-1]}-{k}" if k else tag_path.split("/")[-1]
+                tag_dict[tag_id] = tag_dict.get(tag_path.split("/")[-1], tag_id)
+                path = "/".join(tag_path.split("/")[:-1] + [tag_id])
+                book_list.append(BookItem(e["id"], e["title"], path, tag_id))
+    return tag_data, tag_dict, book_list
+
+
+def main():
+    print(f"{'copies':>6} {'books':>7} {'linear(ms)':>11} {'index(ms)':>10}")
+    for copies in [1, 4, 16, 64]:
+        tag_data, tag_dict, book_list = load_data(copies)
+        elapsed = []
+        for func in [update_hierarchies_linear, update_hierarchies]:
+            tag_hier = TagHierarchy.from_dict(0, tag_data)
+            start = time.perf_counter()
+            func(tag_hier, tag_dict, book_list)
+            elapsed.append((time.perf_counter() - start) * 1000)
+        print(f"{copies:>6} {len(book_list):>7} {elapsed[0]:>11.1f} {elapsed[1]:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
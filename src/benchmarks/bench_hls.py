@@ -0,0 +1,32 @@
+"""
+HLS视频下载基准：300个分片，每个分片延迟30ms，比较逐个下载和并发下载的耗时
+
+运行: cd src && python -m benchmarks.bench_hls
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+from smartedu.utils.hls import download_hls
+
+from smartedu.tests.server import LocalServer
+
+
+def main(count=300, delay=0.03):
+    segments = [f"#EXTINF:10.0,\nseg-{i}.ts" for i in range(count)]
+    files = {"/video/index.m3u8": "\n".join(["#EXTM3U", *segments, "#EXT-X-ENDLIST"]).encode()}
+    for i in range(count):
+        files[f"/video/seg-{i}.ts"] = bytes(64 * 1024)
+
+    with LocalServer(files, delay=delay) as server, tempfile.TemporaryDirectory() as tmp_dir:
+        for workers in [1, 8, 16]:
+            file_path = Path(tmp_dir) / f"{workers}.ts"
+            start = time.perf_counter()
+            out = download_hls(file_path, server.url("/video/index.m3u8"), {}, workers=workers)
+            elapsed = time.perf_counter() - start
+            print(f"并发 {workers:2d}: {out['status']}, {out['size'] >> 20}MB, {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
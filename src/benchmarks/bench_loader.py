@@ -0,0 +1,53 @@
+"""
+目录数据获取基准：本地HTTP服务提供data/v2/syncClassroom，比较逐个获取与并发获取part_*.json的耗时
+
+运行: cd src && python -m benchmarks.bench_loader
+"""
+
+import json
+import time
+from pathlib import Path
+
+from smartedu.configs.resources import RESOURCE_DICT
+from smartedu.loader import fetch_version_data_online
+from smartedu.utils.dl import fetch_file
+
+from smartedu.tests.server import LocalServer
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data" / "v2" / "syncClassroom"
+
+
+def main(delay=0.2):
+    files = {f"/{f.name}": f.read_bytes() for f in DATA_DIR.glob("*.json")}
+    with LocalServer(files, delay=delay) as server:
+        version = json.loads(files["/data_version.json"])
+        version["urls"] = [server.url("/" + url.split("/")[-1]) for url in version["urls"]]
+        files["/data_version.json"] = json.dumps(version).encode()
+
+        name = "/benchmark"
+        RESOURCE_DICT[name] = {
+            "resources": {
+                "tag": server.url("/national_lesson_tag.json"),
+                "version": server.url("/data_version.json"),
+            }
+        }
+        urls = [server.url("/national_lesson_tag.json"), server.url("/data_version.json")]
+        urls += version["urls"]
+
+        start = time.perf_counter()
+        for url in urls:
+            fetch_file(url, {})
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        output = fetch_version_data_online(name, use_cache=False)
+        concurrent = time.perf_counter() - start
+        assert all(data for _, data in output[2][1])
+
+        print(f"files = {len(urls)}, delay = {delay}s")
+        print(f"sequential = {sequential:.3f}s")
+        print(f"concurrent = {concurrent:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+目录树内存基准：统计 data/v1、data/v2 中各目录数据构建 TagHierarchy/BookItem 后占用的内存
+
+运行: cd src && python -m benchmarks.bench_memory
+"""
+
+import gc
+import json
+import tracemalloc
+from pathlib import Path
+
+from smartedu.configs.tags import BookItem, TagHierarchy
+from smartedu.loader import update_hierarchies
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data"
+TAG_FILES = {"tchMaterial": "tch_material_tag.json", "syncClassroom": "national_lesson_tag.json"}
+
+
+def load_parts(data_dir):
+    parts_data = []
+    for part_file in sorted(data_dir.glob("part_*.json")):
+        with open(part_file, encoding="utf-8") as f:
+            parts_data.extend(json.load(f))
+
+    tag_dict = {}
+    books = []
+    for e in parts_data:
+        tag_list = e["tag_list"] if isinstance(e["tag_list"], list) else []
+        for tag in tag_list:
+            tag_dict.setdefault(tag["tag_id"], tag["tag_name"])
+        for tag_path in e.get("tag_paths") or []:
+            books.append((e["id"], e["title"], tag_path))
+    return tag_dict, books
+
+
+def measure(data_dir, tag_file):
+    with open(data_dir / tag_file, encoding="utf-8") as f:
+        tag_data = json.load(f)
+    tag_dict, books = load_parts(data_dir)
+    gc.collect()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    book_list = [BookItem(*book, book[2].split("/")[-1]) for book in books]
+    tag_hier = TagHierarchy.from_dict(0, tag_data)
+    tag_hier = update_hierarchies(tag_hier, tag_dict, book_list)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    count = 0
+    nodes = [tag_hier]
+    while nodes:
+        node = nodes.pop()
+        count += 1
+        nodes.extend(node.children)
+    return count, len(book_list), after - before
+
+
+def main():
+    print(f"{'data':<22} {'nodes':>7} {'books':>6} {'memory(KB)':>11}")
+    for version in ["v1", "v2"]:
+        for name, tag_file in TAG_FILES.items():
+            data_dir = DATA_DIR / version / name
+            if not (data_dir / tag_file).exists():
+                continue
+            count, books, memory = measure(data_dir, tag_file)
+            print(f"{version + '/' + name:<22} {count:>7} {books:>6} {memory / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
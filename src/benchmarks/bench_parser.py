@@ -0,0 +1,77 @@
+"""
+URL解析基准：
+1. parse_urls 解析10万个URL，重复多轮，耗时不应随调用次数增加
+2. 流式解析100万行的URL文件（1万个不重复），内存峰值只随不重复的配置数增长
+
+运行: cd src && python -m benchmarks.bench_parser
+"""
+
+import tempfile
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+from smartedu.configs.resources import RESOURCE_DICT
+from smartedu.parser import iter_config_urls, iter_url_lines, parse_urls
+
+
+def gen_urls(count):
+    examples = [
+        url
+        for config_info in RESOURCE_DICT.values()
+        if "params" in config_info
+        for url in config_info.get("examples", [])
+    ]
+    urls = []
+    for i in range(count):
+        # 换成不同的ID，避免去重
+        url = examples[i % len(examples)]
+        urls.append(url.replace("Id=", f"Id={uuid.UUID(int=i)}&old=", 1))
+    return urls
+
+
+def stream(lines=1_000_000, unique=10_000):
+    urls = gen_urls(unique)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        list_file = Path(tmp_dir) / "urls.txt"
+        with open(list_file, "w", encoding="utf-8") as f:
+            for i in range(lines):
+                f.write(urls[i % unique] + "\n")
+
+        def parse():
+            stats = {}
+            with open(list_file, encoding="utf-8") as f:
+                for _ in iter_config_urls(iter_url_lines(f), ["pdf"], False, stats=stats):
+                    pass
+            return stats
+
+        start = time.perf_counter()
+        stats = parse()
+        elapsed = time.perf_counter() - start
+        # tracemalloc 较慢，单独统计内存
+        tracemalloc.start()
+        parse()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"流式解析: {lines} 行 -> {stats}, {elapsed:.2f}s, "
+            f"内存峰值 {peak / 1024 / 1024:.1f}MB（文件 {list_file.stat().st_size >> 20}MB）"
+        )
+
+
+def main(count=100_000, rounds=5):
+    urls = gen_urls(count)
+    for i in range(rounds):
+        start = time.perf_counter()
+        config_urls = parse_urls(urls, ["pdf", "mp3"], activate_backup=True)
+        elapsed = time.perf_counter() - start
+        print(
+            f"第{i + 1}轮: {count} 个URL -> {len(config_urls)} 个配置, "
+            f"{elapsed:.2f}s, {elapsed / count * 1e6:.1f}us/URL"
+        )
+
+
+if __name__ == "__main__":
+    main()
+    stream()
@@ -1,6 +1,9 @@
 DEFAULT_PATH = "./downloads"
 DEFAULT_URLS = []
 DATA_PATH = "data"
+CACHE_PATH = "~/.cache/smartedu"
+STORE_PATH = "~/.cache/smartedu/store"
+STORE_MAX_SIZE = 10 * 1024**3  # 去重存储的大小上限，超过时删除最久未用的文件
 EXIT_KEY = "exit"
 ZERO_KEY = "0"
 FIRST_KEY = "1"
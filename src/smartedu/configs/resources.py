@@ -4,6 +4,13 @@ SERVER_LIST = [
     "s-file-3",
 ]
 
+# 资源文件（ti_storages）的镜像主机前缀：r1-ndr、r2-ndr-private等
+STORAGE_LIST = [
+    "r1",
+    "r2",
+    "r3",
+]
+
 SERVER_LIST2 = [
     "pretest-s-file-1",
     "pretest-s-file-2",
@@ -27,8 +34,10 @@ TI_FORMATS = [
     ["superboard", "superboard"],
 ]
 
-ACCEPTED_FORMATS = [t for k, v in RESOURCE_TYPE_DICT.items() if k != "assets_video" for t in v[1]]
+ACCEPTED_FORMATS = [t for v in RESOURCE_TYPE_DICT.values() for t in v[1]]
 FORMATS_REMAP = {"mp4": "m3u8"}
+# 保存的文件类型：m3u8的分片按顺序拼接为.ts（fMP4分片下载后改为.mp4，见 utils.hls）
+SAVE_FORMATS = {"m3u8": "ts"}
 
 DOMAIN_REMAP_DICT = {
     "web-bd.ykt.eduyun.cn": "basic.smartedu.cn",
@@ -1,6 +1,12 @@
 from __future__ import annotations
-from typing import Optional, Any, Dict, List, Tuple
+from typing import Optional, Any, Callable, Dict, List, Tuple
 import re
+import sys
+
+
+def _intern(x: Optional[str]) -> Optional[str]:
+    # 标签ID、名称在各节点间大量重复，驻留后共享同一字符串对象
+    return sys.intern(x) if isinstance(x, str) else x
 
 
 def strip(x):
@@ -9,11 +15,13 @@ def strip(x):
 
 
 class BookItem:
+    __slots__ = ("book_id", "book_name", "tag_path", "tag_id")
+
     def __init__(self, book_id: str, book_name: str, tag_path: str, tag_id: str):
         self.book_id = book_id
         self.book_name = book_name
         self.tag_path = tag_path
-        self.tag_id = tag_id
+        self.tag_id = _intern(tag_id)
 
     def __repr__(self):
         return f"BookItem: {self.book_id}/{self.book_name}"
@@ -24,6 +32,20 @@ class TagHierarchy:
     convert and flatten tch_material_tag.json
     """
 
+    __slots__ = (
+        "level",
+        "name",
+        "tag_id",
+        "tag_name",
+        "_children",
+        "_child_index",
+        "_loader",
+        "tag_list",
+        "tag_path",
+        "_is_book",
+        "book_item",
+    )
+
     def __init__(
         self,
         level: int = 0,
@@ -34,15 +56,18 @@ class TagHierarchy:
         hierarchies_ext: Optional[Dict[str, Any]] = None,
     ):
         self.level = level
-        self.name = name
-
-        self.tag_id = tag_id
-        self.tag_name = tag_name
-        self.children = (
-            [TagHierarchy.from_dict(level + 1, child) for child in children] if children else []
-        )
-        self.tag_list = hierarchies_ext.get("hidden_tags") if hierarchies_ext else []
-        self.tag_path = hierarchies_ext.get("tag_path") if hierarchies_ext else []
+        self.name = _intern(name)
+
+        self.tag_id = _intern(tag_id)
+        self.tag_name = _intern(tag_name)
+        self._children = []
+        self._child_index = None  # tag_id -> child，添加子节点时创建
+        self._loader = None  # 首次访问children时调用，见 set_loader
+        for child in children or []:
+            self.add_child(TagHierarchy.from_dict(level + 1, child))
+        # 无扩展信息的节点共享空元组
+        self.tag_list = hierarchies_ext.get("hidden_tags") if hierarchies_ext else ()
+        self.tag_path = hierarchies_ext.get("tag_path") if hierarchies_ext else ()
         self._is_book = False
         self.book_item: BookItem = None
 
@@ -59,6 +84,16 @@ class TagHierarchy:
             hierarchies_ext=hierarchy.get("ext"),
         )
 
+    @property
+    def children(self) -> List[TagHierarchy]:
+        if self._loader is not None:
+            self._loader(self)
+        return self._children
+
+    def set_loader(self, loader: Optional[Callable[[TagHierarchy], None]]) -> None:
+        # 延迟加载子节点（书本）：loader负责添加子节点，并对已加载的节点 set_loader(None)
+        self._loader = loader
+
     @property
     def is_book(self) -> bool:
         return self._is_book
@@ -69,7 +104,14 @@ class TagHierarchy:
         self._is_book = True
 
     def add_child(self, child: TagHierarchy) -> None:
-        self.children.append(child)
+        self._children.append(child)
+        # tag_id重复时保留第一个，与按顺序查找的结果一致
+        if self._child_index is None:
+            self._child_index = {}
+        self._child_index.setdefault(child.tag_id, child)
+
+    def get_child(self, tag_id: str) -> Optional[TagHierarchy]:
+        return self._child_index.get(tag_id) if self._child_index else None
 
     def _get_books(self) -> List[Tuple[str, str]]:
         options = []
@@ -85,4 +127,4 @@ class TagHierarchy:
             return False, [(child.tag_id, strip(child.tag_name)) for child in self.children]
 
     def __repr__(self):
-        return f"TagHierarchy: level={self.level}, name={self.name}\n\ttag={self.tag_id}/{self.tag_name}\n\tchild={len(self.children)}, book={self.book_item}"
+        return f"TagHierarchy: level={self.level}, name={self.name}\n\ttag={self.tag_id}/{self.tag_name}\n\tchild={len(self._children)}, book={self.book_item}"
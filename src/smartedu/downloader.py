@@ -1,21 +1,142 @@
 import logging
-from concurrent.futures import as_completed, ThreadPoolExecutor
+import queue
+import threading
+import time
+from concurrent.futures import as_completed, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from itertools import islice
 from pathlib import Path
 from typing import Callable
 
-from .utils.dl import download_file, fetch_file
-from .utils.file import gen_filename
+from .utils.cache import get_cache
+from .utils.concurrency import AdaptiveLimiter, DEFAULT_CEILING, is_overload
+from .utils.dl import check_modified, download_file, fetch_file
+from .utils.file import gen_filename, release_filename
+from .utils.hedge import hedged_fetch, LatencyTracker
+from .utils.hls import download_hls, HLS_WORKERS, is_hls
+from .utils.manifest import content_id_from_url, DownloadManifest
+from .utils.mirrors import ranked_urls
+from .utils.progress import ProgressTracker
+from .utils.retry import RetryPolicy
 from .utils.misc import get_headers
+from .utils.session import set_pool_size
+from .utils.store import BlobStore, link_file, remove_readonly
 
 
-def _download_file(url, name, save_dir, raw_url, fix_url, auth=None) -> dict:
+SEGMENT_THRESHOLD = 8 * 1024 * 1024  # 大于8M的文件分段并发下载
+SEGMENT_SIZE = 2 * 1024 * 1024  # 每段2M：阈值附近的文件也能分成多于SEGMENT_WORKERS段
+SEGMENT_WORKERS = 4
+CONNECTIONS_PER_FILE = max(SEGMENT_WORKERS, HLS_WORKERS)  # 单个文件（分段、视频分片）的并发连接数
+PROGRESS_INTERVAL = 0.5  # 秒：回调 "progress" 事件的间隔
+
+
+def _link_stored(store, url, headers, timeout, file_path) -> dict | None:
+    # 同一资源已下载过（可能在其他目录）且未变化时，直接链接已保存的文件
+    entry = store.get(url)
+    if entry is None or check_modified(url, headers, entry, timeout):
+        return None
+    try:
+        link_file(entry["blob"], file_path)
+    except OSError as e:
+        # 不在同一文件系统等：正常下载，不复制
+        logging.debug(f"link stored failed: {url} -> {file_path}, {e}")
+        return None
+    logging.debug(f"link stored: {url} -> {file_path}")
+    out = {"url": url, "status": "linked", "code": 304, "file": str(file_path)}
+    out.update(size=entry["size"], sha256=entry["sha256"])
+    out.update(etag=entry["etag"], last_modified=entry["last_modified"])
+    out["remote_size"] = entry["remote_size"]
+    return out
+
+
+def _download_mirrors(
+    download_url, file_path, headers, timeout, chunk_size, progress, limiter=None, cancel=None
+) -> dict:
+    # 优先使用最快的镜像主机，429/5xx/网络错误时换下一个；
+    # limiter: 按实际请求的镜像主机占用并发名额，换镜像前释放并把结果反馈给该主机
+    # cancel: 传给下载函数，在数据块/分片之间检查，取消时保留.part文件
+    for mirror_url in ranked_urls(download_url):
+        start = limiter.acquire(mirror_url) if limiter else None
+        out = {"url": mirror_url, "status": "failed", "code": -1}
+        try:
+            if is_hls(download_url):
+                out = download_hls(
+                    file_path, mirror_url, headers, timeout, progress=progress, cancel=cancel
+                )
+            else:
+                out = download_file(
+                    file_path,
+                    mirror_url,
+                    headers,
+                    timeout,
+                    True,
+                    chunk_size,
+                    segment_size=SEGMENT_SIZE,
+                    segment_workers=SEGMENT_WORKERS,
+                    segment_threshold=SEGMENT_THRESHOLD,
+                    progress=progress,
+                    cancel=cancel,
+                )
+        finally:
+            if limiter:
+                size = out.get("size", 0) if out["status"] == "success" else 0
+                limiter.release(mirror_url, start, out["code"], size)
+        if out["status"] != "failed" or not is_overload(out["code"]):
+            break
+        logging.debug(f"mirror failed: {mirror_url}, code = {out['code']}")
+    return out
+
+
+def _download_file(
+    url,
+    name,
+    save_dir,
+    raw_url,
+    fix_url,
+    auth=None,
+    manifest=None,
+    store=None,
+    progress=None,
+    limiter=None,
+    cancel=None,
+) -> dict:
     headers = get_headers(auth)
     timeout = 10
     chunk_size = 16 * 1024  # 16k
     download_url = url if auth else fix_url
+    content_id = content_id_from_url(raw_url)
+
+    record = manifest.get(content_id, download_url) if manifest else None
+    if record and not check_modified(download_url, headers, record, timeout):
+        # 已下载且未变化，跳过
+        logging.debug(f"skip unchanged: {download_url} -> {record['file']}")
+        out = {"url": download_url, "status": "skipped", "code": 304}
+        out.update(file=record["file"], size=record["size"])
+        out.update(download=download_url, original=url, raw=raw_url)
+        return out
 
-    file_path = gen_filename(download_url, name, save_dir)
-    out = download_file(file_path, download_url, headers, timeout, True, chunk_size)
+    # 已有记录但文件有更新时，覆盖原文件
+    file_path = Path(record["file"]) if record else gen_filename(download_url, name, save_dir)
+    if record:
+        # 去重时原文件是存储中只读文件的硬链接，先删除（Windows上不能替换只读文件）
+        remove_readonly(file_path, partial(store.protect, download_url) if store else None)
+    try:
+        args = (download_url, file_path, headers, timeout, chunk_size, progress, limiter, cancel)
+        if store is None:
+            out = _download_mirrors(*args)
+        else:
+            # 同一资源同时只下载一次；已保存过的直接链接，下载后内容相同的也只保留一份
+            with store.lock(download_url):
+                out = _link_stored(store, download_url, headers, timeout, file_path)
+                if out is None:
+                    out = _download_mirrors(*args)
+                    if out["status"] == "success":
+                        out["sha256"] = store.add(download_url, out)
+    finally:
+        release_filename(file_path)
+
+    if manifest and out["status"] in ["success", "linked"]:
+        manifest.update(content_id, download_url, out)
 
     out["download"] = download_url
     out["original"] = url
@@ -23,82 +144,315 @@ def _download_file(url, name, save_dir, raw_url, fix_url, auth=None) -> dict:
     return out
 
 
-def download_files(url_list: list, output_dir: str, max_workers: int = 5, auth: str = None) -> list:
-    """并发下载多个文件"""
-    save_dir = Path(output_dir)
-    if not save_dir.exists():
-        save_dir.mkdir(parents=True)
+def _download_limited(
+    limiter,
+    resource,
+    save_dir,
+    auth=None,
+    manifest=None,
+    retry=None,
+    store=None,
+    tracker=None,
+    cancel=None,
+) -> dict:
+    # 每个镜像主机按其并发上限排队（见 _download_mirrors）；
+    # 失败时按重试策略退避（不占用并发名额）后重试，已下载的部分从.part文件续传
+    # tracker: 统计下载字节数，见 utils.progress；cancel: 取消正在下载的文件，见 _download_mirrors
+    name, raw_url, url, fix_url = resource
+    if retry:
+        retry.budget.record_request()
 
-    results = []
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_url = {
-            executor.submit(_download_file, url, name, save_dir, raw_url, fix_url, auth): url
-            for name, raw_url, url, fix_url in url_list
-        }
-        for future in as_completed(future_to_url):
-            # url = future_to_url[future]
-            result = future.result()
-            results.append(result)
+    retries = 0
+    progress = tracker.start(name) if tracker else None
+    while True:
+        result = {"url": url, "status": "failed", "code": -1, "raw": raw_url}
+        try:
+            result = _download_file(
+                url,
+                name,
+                save_dir,
+                raw_url,
+                fix_url,
+                auth,
+                manifest,
+                store,
+                progress,
+                limiter,
+                cancel,
+            )
+        except Exception as e:
+            logging.error(f"下载失败: {url}, 错误: {e}")
 
-    return results
+        if result["status"] != "failed" or not retry:
+            break
+        if not retry.should_retry(retries, result["code"]):
+            break
+        retry.wait(retries, result.get("retry_after"))
+        retries += 1
+
+    if progress:
+        tracker.finish(progress)
+    result["retries"] = retries
+    return result
 
 
-def download_files_tk(
-    app, base_progress, url_list: list, output_dir: str, max_workers: int = 5, auth: str = None
+def download_files(
+    url_list: list,
+    output_dir: str,
+    max_workers: int = DEFAULT_CEILING,
+    auth: str = None,
+    incremental: bool = True,
+    adaptive: bool = True,
+    store: BlobStore = None,
 ) -> list:
-    """tk下载文件，更新进度条"""
+    """
+    并发下载多个文件；incremental时根据下载记录跳过未变化的文件
+
+    max_workers为并发上限；adaptive时按主机根据吞吐、耗时和错误率自动调整实际并发数
+    store: 内容寻址存储，同一资源只下载、保存一份，硬链接到输出目录
+    """
     save_dir = Path(output_dir)
     if not save_dir.exists():
         save_dir.mkdir(parents=True)
 
+    manifest = DownloadManifest(save_dir) if incremental else None
+    limiter = AdaptiveLimiter(max_workers, adaptive=adaptive)
+    retry = RetryPolicy()
     results = []
-    total = len(url_list)
+    set_pool_size(max_workers * CONNECTIONS_PER_FILE)
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         future_to_url = {
-            executor.submit(_download_file, url, name, save_dir, raw_url, fix_url, auth): url
-            for name, raw_url, url, fix_url in url_list
+            executor.submit(
+                _download_limited, limiter, resource, save_dir, auth, manifest, retry, store
+            ): resource
+            for resource in url_list
         }
         for future in as_completed(future_to_url):
             # url = future_to_url[future]
             result = future.result()
             results.append(result)
 
-            # 更新GUI下载进度
-            finished = len(results)
-            app.progress_label.config(text=f"已经下载 {finished} / {total} 项资源...")
-            app.progress_var.set(base_progress + (finished / total) * (100 - base_progress))
-            app.update()
-
+    if manifest:
+        manifest.close()
     return results
 
 
-def fetch_resources(url_list: list, extract_func: Callable, max_workers: int = 5) -> list:
+def _fallback_chain(entry) -> list:
+    # parse_urls 的一项：配置URL、[主配置URL, 备用URL, ...]，或分步解析的 {"url": 配置URL, ...}
+    if isinstance(entry, str):
+        return [entry]
+    if isinstance(entry, dict):
+        return [entry["url"]]
+    return list(entry)
+
+
+def _process_config(entry, url: str, data, extract_func: Callable) -> tuple[list, list]:
     """
-    获取配置信息
+    返回 (资源列表, 接下来要请求的配置)，失败或为空时都是[]
+
+    分步解析时，entry["expand"](data) 生成下一步的配置；entry["transform"](data) 整理后再解析资源
+    """
+    if not data:
+        logging.debug(f"None data URL = {url}")
+        return [], []
+    step = entry if isinstance(entry, dict) else {}
+    try:
+        if "expand" in step:
+            return [], step["expand"](data)
+        if "transform" in step:
+            data = step["transform"](data)
+        return [resource for resource in extract_func(data) if resource[1]], []
+    except Exception as e:
+        logging.error(f"处理URL失败: {url}, 错误: {e}")
+        return [], []
+
+
+def iter_resources(
+    url_list: list,
+    extract_func: Callable,
+    max_workers: int = DEFAULT_CEILING,
+    use_cache: bool = True,
+    hedge: bool = False,
+):
+    """
+    并发获取配置信息，每得到一个配置即产出其中的资源 [title, raw_url, resource_url, fix_url]
+
+    url_list 中的列表项依次请求，直到某个配置解析出资源（备用链接）
+    分步解析的配置返回后，其生成的下一步配置立即并发请求
+    url_list 可以是生成器：按需读取，同时进行的请求不超过 max_workers * 2 个（不含下一步的配置）
+    max_workers 默认与下载并发上限相同（DEFAULT_CEILING）
+    hedge: 超过近期p95仍未返回的请求，向另一个镜像主机再发一次，取先返回的结果；会增加请求数，默认关闭
     """
     headers = get_headers()
     timeout = 5
     data_format = "json"
-    results = []
+    cache = get_cache() if use_cache else None
+    # 对冲请求使用单独的线程池，避免与等待中的主请求互相阻塞
+    hedge_executor = ThreadPoolExecutor(max_workers=max_workers * 2) if hedge else None
+    tracker = LatencyTracker()
+    retry = RetryPolicy()
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_url = {
-            executor.submit(fetch_file, url, headers, timeout, data_format): url for url in url_list
-        }
+    def fetch(url):
+        if hedge_executor is None:
+            return fetch_file(url, headers, timeout, data_format, None, cache, retry=retry)
+        return hedged_fetch(
+            url, headers, timeout, data_format, cache, hedge_executor, tracker, retry
+        )
 
-        for future in as_completed(future_to_url):
-            raw_url = future_to_url[future]
+    def resolve(entry):
+        chain = _fallback_chain(entry)
+        for i, url in enumerate(chain):
+            if i > 0:
+                logging.debug(f"try backup URL = {url}")
+            resources, children = _process_config(entry, url, fetch(url), extract_func)
+            if resources or children:
+                return url, resources, children
+        return chain[0], [], []
+
+    set_pool_size(max_workers * 2 if hedge else max_workers)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            entries = iter(url_list)
+
+            def submit(count):
+                return {executor.submit(resolve, entry) for entry in islice(entries, count)}
+
+            pending = submit(max_workers * 2)
             try:
-                result = future.result()
-                if result:
-                    resource = extract_func(result)
-                    for title, resource_url, fix_resource_url in resource:
-                        if resource_url:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    pending |= submit(len(done))
+                    for future in done:
+                        try:
+                            raw_url, resources, children = future.result()
+                        except Exception as e:
+                            logging.error(f"处理URL失败: {e}")
+                            continue
+                        pending |= {executor.submit(resolve, child) for child in children}
+                        for title, resource_url, fix_resource_url in resources:
                             logging.debug(f"title = {title}, resource_url={resource_url}")
-                            results.append([title, raw_url, resource_url, fix_resource_url])
-                else:
-                    logging.debug(f"None data URL = {raw_url}")
-            except Exception as e:
-                logging.error(f"处理URL失败: {raw_url}, 错误: {e}")
+                            yield [title, raw_url, resource_url, fix_resource_url]
+            finally:
+                # 提前结束（如取消下载）时，尚未开始的请求不再执行
+                for future in pending:
+                    future.cancel()
+    finally:
+        if hedge_executor:
+            # 落后的对冲请求不再等待
+            hedge_executor.shutdown(wait=False, cancel_futures=True)
 
-    return results
+
+def fetch_resources(
+    url_list: list,
+    extract_func: Callable,
+    max_workers: int = DEFAULT_CEILING,
+    use_cache: bool = True,
+    hedge: bool = False,
+) -> list:
+    """
+    获取配置信息
+    """
+    return list(iter_resources(url_list, extract_func, max_workers, use_cache, hedge))
+
+
+def download_pipeline(
+    config_urls: list,
+    extract_func: Callable,
+    output_dir: str,
+    max_workers: int = DEFAULT_CEILING,
+    auth: str = None,
+    incremental: bool = True,
+    callback: Callable = None,
+    fetch_workers: int = DEFAULT_CEILING,
+    adaptive: bool = True,
+    store: BlobStore = None,
+    cancel: threading.Event = None,
+    use_cache: bool = True,
+    hedge: bool = False,
+) -> tuple[list, list]:
+    """
+    边解析边下载：每个配置解析出的资源立即放入下载队列（有界队列，下载跟不上时解析暂停）
+    max_workers为下载并发上限，adaptive时按主机自动调整
+    store: 内容寻址存储，同一资源只下载、保存一份，硬链接到输出目录
+    cancel: 设置后停止解析，队列中未开始的资源记为 "cancelled"；
+        正在下载的文件在下一个数据块处停止，也记为 "cancelled"，保留.part文件，再次下载时续传
+    fetch_workers、use_cache、hedge: 配置请求的并发数、是否使用本地缓存、对冲请求，见 iter_resources
+
+    callback(event, data) 在调用线程中执行：
+        "resource": 新的资源项；"resolved": 解析完成，data为资源总数；"result": 单个文件下载结果
+        "progress": 每隔 PROGRESS_INTERVAL 秒及结束时一次，data为 ProgressTracker.snapshot()
+    返回 (资源列表, 下载结果列表)
+    """
+    save_dir = Path(output_dir)
+    if not save_dir.exists():
+        save_dir.mkdir(parents=True)
+
+    manifest = DownloadManifest(save_dir) if incremental else None
+    limiter = AdaptiveLimiter(max_workers, adaptive=adaptive)
+    retry = RetryPolicy()
+    tracker = ProgressTracker()
+    resource_queue = queue.Queue(maxsize=max_workers * 2)
+    event_queue = queue.Queue()
+
+    def resolve():
+        count = 0
+        try:
+            resources = iter_resources(config_urls, extract_func, fetch_workers, use_cache, hedge)
+            for resource in resources:
+                if cancel is not None and cancel.is_set():
+                    logging.debug(f"resolve cancelled, resources = {count}")
+                    break
+                event_queue.put(("resource", resource))
+                resource_queue.put(resource)
+                count += 1
+        finally:
+            for _ in range(max_workers):
+                resource_queue.put(None)
+            event_queue.put(("resolved", count))
+
+    def download():
+        while (resource := resource_queue.get()) is not None:
+            if cancel is not None and cancel.is_set():
+                _, raw_url, url, _ = resource
+                result = {"url": url, "status": "cancelled", "code": -1, "raw": raw_url}
+            else:
+                result = _download_limited(
+                    limiter, resource, save_dir, auth, manifest, retry, store, tracker, cancel
+                )
+            event_queue.put(("result", result))
+
+    set_pool_size(max_workers * CONNECTIONS_PER_FILE)
+    threads = [threading.Thread(target=resolve, daemon=True)]
+    threads += [threading.Thread(target=download, daemon=True) for _ in range(max_workers)]
+    for thread in threads:
+        thread.start()
+
+    resource_list = []
+    results = []
+    total = None
+    next_report = time.perf_counter() + PROGRESS_INTERVAL
+    while total is None or len(results) < total:
+        try:
+            event, data = event_queue.get(timeout=PROGRESS_INTERVAL)
+        except queue.Empty:
+            event, data = None, None
+        if event == "resource":
+            resource_list.append(data)
+        elif event == "resolved":
+            total = data
+        elif event == "result":
+            results.append(data)
+        if callback and event:
+            callback(event, data)
+        if callback and time.perf_counter() >= next_report:
+            callback("progress", tracker.snapshot(total))
+            next_report = time.perf_counter() + PROGRESS_INTERVAL
+
+    if callback:
+        callback("progress", tracker.snapshot(total))
+
+    for thread in threads:
+        thread.join()
+    if manifest:
+        manifest.close()
+    return resource_list, results
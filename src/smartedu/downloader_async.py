@@ -0,0 +1,365 @@
+"""
+asyncio下载引擎：大量配置JSON请求用协程并发（需要安装aiohttp），文件下载在线程池中执行
+
+与 downloader.download_pipeline 接口一致，按主机限制并发数
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+from urllib.parse import urlparse
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .downloader import _download_limited, _fallback_chain, _process_config
+from .downloader import CONNECTIONS_PER_FILE, PROGRESS_INTERVAL
+from .utils.cache import get_cache, ResponseCache
+from .utils.concurrency import AdaptiveLimiter, is_overload
+from .utils.dl import FetchPlan
+from .utils.hedge import hedge_targets, LatencyTracker
+from .utils.manifest import DownloadManifest
+from .utils.mirrors import get_scoreboard
+from .utils.progress import ProgressTracker
+from .utils.retry import RetryPolicy
+from .utils.misc import get_headers
+from .utils.session import set_pool_size
+from .utils.store import BlobStore
+
+
+def is_available() -> bool:
+    # asyncio引擎依赖aiohttp
+    return aiohttp is not None
+
+
+class HostLimiter:
+    """每个主机一个信号量"""
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._semaphores = {}
+
+    def __call__(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host)
+        return self._semaphores[host]
+
+
+async def _fetch_mirrors(session, plan: FetchPlan, timeout, host_limit=None):
+    """
+    依次请求各镜像，返回 (是否得到结果, 数据)；响应的处理见 FetchPlan
+    host_limit: 按实际请求的镜像主机占用并发名额，换镜像前释放
+    """
+    scoreboard = get_scoreboard()
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    for mirror_url in plan.mirrors():
+        try:
+            async with host_limit(mirror_url) if host_limit else nullcontext():
+                start = time.perf_counter()
+                async with session.get(
+                    mirror_url, headers=plan.headers, timeout=client_timeout
+                ) as response:
+                    logging.debug(f"URL = {mirror_url}, status = {response.status}")
+                    text = await response.text(encoding="utf-8")
+                    ok = not is_overload(response.status)
+                    scoreboard.record(mirror_url, time.perf_counter() - start, ok, len(text))
+                    found, data = plan.handle(response.status, response.headers, text)
+            if found:
+                await asyncio.to_thread(plan.store, response.status, response.headers, text)
+                return True, data
+        except (aiohttp.ClientError, asyncio.TimeoutError) as res_err:
+            scoreboard.record(mirror_url, time.perf_counter() - start, False)
+            logging.warning(f"URL: {mirror_url}; Request Error: {res_err!r}")
+            plan.network_error()
+        except ValueError as err:
+            logging.warning(f"URL: {mirror_url}; JSON Error: {err}")
+    return False, None
+
+
+async def _fetch_json(
+    session,
+    url: str,
+    headers: dict,
+    timeout: int,
+    cache: ResponseCache,
+    failover=True,
+    retry: RetryPolicy = None,
+    host_limit=None,
+):
+    # 与 fetch_file 相同的 FetchPlan；缓存文件的读写在线程中执行，不阻塞事件循环
+    # host_limit: 每个镜像主机的并发上限，见 _fetch_mirrors
+    plan = FetchPlan(url, headers, "json", cache, failover, retry)
+    found, data = await asyncio.to_thread(plan.load_cache)
+    if found:
+        return data
+    return await _run_plan(session, plan, timeout, host_limit)
+
+
+async def _run_plan(session, plan: FetchPlan, timeout, host_limit=None):
+    # 与 dl.run_plan 相同：已调用 load_cache() 且缓存无效时请求各镜像，失败时重试
+    while True:
+        found, data = await _fetch_mirrors(session, plan, timeout, host_limit)
+        if found:
+            return data
+        seconds = plan.retry_delay()
+        if seconds is None:
+            break
+        await asyncio.sleep(seconds)
+    return plan.stale()
+
+
+async def _fetch_hedged(
+    session,
+    url: str,
+    headers: dict,
+    timeout: int,
+    cache: ResponseCache,
+    tracker: LatencyTracker,
+    retry: RetryPolicy = None,
+    host_limit=None,
+):
+    """
+    与 hedged_fetch 相同的对冲规则（见 hedge_targets），取先返回的结果并取消另一个
+    缓存只读取一次，一次请求只计入一次重试预算；只有主请求会重试
+    """
+    plan = FetchPlan(url, headers, "json", cache, retry=retry)
+    found, data = await asyncio.to_thread(plan.load_cache)
+    if found:
+        return data
+
+    async def fetch(mirror_plan: FetchPlan):
+        start = time.perf_counter()
+        data = await _run_plan(session, mirror_plan, timeout, host_limit)
+        if data is not None:
+            tracker.record(time.perf_counter() - start)
+        return data
+
+    primary, backup, delay = hedge_targets(url, tracker)
+    tasks = {asyncio.create_task(fetch(plan.for_mirror(primary, True, retry)))}
+    if backup:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            logging.debug(f"hedge request after {delay:.3f}s: {backup}")
+            tasks.add(asyncio.create_task(fetch(plan.for_mirror(backup, False))))
+
+    try:
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if (data := task.result()) is not None:
+                    return data
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _resolve(
+    config_urls, extract_func, fetch_limit, host_limit, use_cache, hedge, on_resource
+):
+    """并发获取所有配置，每个配置返回后立即处理其中的资源"""
+    headers = get_headers()
+    timeout = 5
+    cache = get_cache() if use_cache else None
+    tracker = LatencyTracker()
+    retry = RetryPolicy()
+
+    async def fetch(session, url):
+        if hedge:
+            return await _fetch_hedged(
+                session, url, headers, timeout, cache, tracker, retry, host_limit
+            )
+        return await _fetch_json(
+            session, url, headers, timeout, cache, retry=retry, host_limit=host_limit
+        )
+
+    async def resolve_entry(session, entry):
+        # 备用链接只在前一个配置没有解析出资源时才请求
+        chain = _fallback_chain(entry)
+        for i, url in enumerate(chain):
+            if i > 0:
+                logging.debug(f"try backup URL = {url}")
+            data = await fetch(session, url)
+            resources, children = _process_config(entry, url, data, extract_func)
+            if resources or children:
+                return url, resources, children
+        return chain[0], [], []
+
+    async def resolve_one(session, entry):
+        # 单个配置出错时只记录日志，不影响其他配置
+        try:
+            url, resources, children = await resolve_entry(session, entry)
+        except Exception as e:
+            logging.error(f"处理URL失败: {e}")
+            return
+        # 分步解析：下一步的配置并发请求
+        await asyncio.gather(*[resolve_one(session, child) for child in children])
+        for title, resource_url, fix_resource_url in resources:
+            await on_resource([title, url, resource_url, fix_resource_url])
+
+    # 固定数量的worker按需读取 config_urls（可以是生成器），不一次创建全部任务
+    entries = iter(config_urls)
+
+    async def worker(session):
+        for entry in entries:
+            await resolve_one(session, entry)
+
+    connector = aiohttp.TCPConnector(limit=fetch_limit, limit_per_host=host_limit.per_host)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[worker(session) for _ in range(fetch_limit)])
+
+
+async def _download_async(
+    config_urls: list,
+    extract_func: Callable,
+    output_dir: str,
+    auth: str,
+    incremental: bool,
+    callback: Callable,
+    fetch_limit: int,
+    fetch_per_host: int,
+    download_limit: int,
+    per_host: int,
+    use_cache: bool,
+    adaptive: bool,
+    hedge: bool,
+    store: BlobStore,
+):
+    save_dir = Path(output_dir)
+    save_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest = DownloadManifest(save_dir) if incremental else None
+    loop = asyncio.get_running_loop()
+    # 线程池只用于下载文件，配置请求在事件循环中执行
+    executor = ThreadPoolExecutor(max_workers=download_limit)
+    # 解析出的资源放入有界队列，由固定数量的下载worker取出；队列满时解析暂停
+    resource_queue = asyncio.Queue(maxsize=download_limit)
+    host_limit = HostLimiter(fetch_per_host)
+    limiter = AdaptiveLimiter(min(per_host, download_limit), adaptive=adaptive)
+    retry = RetryPolicy()
+    tracker = ProgressTracker()
+    set_pool_size(download_limit * CONNECTIONS_PER_FILE)
+
+    resource_list = []
+    results = []
+    total = None
+
+    def notify(event, data):
+        if callback:
+            callback(event, data)
+
+    async def report():
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            notify("progress", tracker.snapshot(total))
+
+    async def download_worker():
+        # 每个主机的并发数由limiter自动调整
+        while (resource := await resource_queue.get()) is not None:
+            result = await loop.run_in_executor(
+                executor,
+                _download_limited,
+                limiter,
+                resource,
+                save_dir,
+                auth,
+                manifest,
+                retry,
+                store,
+                tracker,
+            )
+            results.append(result)
+            notify("result", result)
+
+    async def on_resource(resource):
+        resource_list.append(resource)
+        notify("resource", resource)
+        await resource_queue.put(resource)
+
+    async def produce():
+        nonlocal total
+        await _resolve(
+            config_urls,
+            extract_func,
+            fetch_limit,
+            host_limit,
+            use_cache,
+            hedge,
+            on_resource,
+        )
+        total = len(resource_list)
+        notify("resolved", total)
+        for _ in workers:
+            await resource_queue.put(None)
+
+    workers = [asyncio.create_task(download_worker()) for _ in range(download_limit)]
+    producer = asyncio.create_task(produce())
+    reporter = asyncio.create_task(report()) if callback else None
+    try:
+        await asyncio.gather(producer, *workers)
+        notify("progress", tracker.snapshot(total))
+    finally:
+        for task in [producer, *workers]:
+            task.cancel()
+        if reporter:
+            reporter.cancel()
+        executor.shutdown(wait=True)
+        if manifest:
+            manifest.close()
+    return resource_list, results
+
+
+def download_async(
+    config_urls: list,
+    extract_func: Callable,
+    output_dir: str,
+    auth: str = None,
+    incremental: bool = True,
+    callback: Callable = None,
+    fetch_limit: int = 200,
+    fetch_per_host: int = 100,
+    download_limit: int = 20,
+    per_host: int = 10,
+    use_cache: bool = True,
+    adaptive: bool = True,
+    hedge: bool = False,
+    store: BlobStore = None,
+) -> tuple[list, list]:
+    """
+    asyncio引擎：边解析边下载，返回 (资源列表, 下载结果列表)
+
+    fetch_limit: 同时进行的配置请求数；fetch_per_host: 每个主机同时进行的配置请求数
+    download_limit: 同时下载的文件数；per_host: 每个主机同时下载的文件数上限
+    adaptive: 按主机自动调整下载并发数（不超过per_host）
+    hedge: 配置请求超过近期p95仍未返回时向另一个镜像主机再发一次，默认关闭
+    store: 内容寻址存储，同一资源只下载、保存一份，硬链接到输出目录
+
+    未安装aiohttp时抛出ImportError，不会改用线程请求配置（见 is_available）
+    """
+    if not is_available():
+        raise ImportError("asyncio引擎需要安装aiohttp：pip install aiohttp")
+    return asyncio.run(
+        _download_async(
+            config_urls,
+            extract_func,
+            output_dir,
+            auth,
+            incremental,
+            callback,
+            fetch_limit,
+            fetch_per_host,
+            download_limit,
+            per_host,
+            use_cache,
+            adaptive,
+            hedge,
+            store,
+        )
+    )
@@ -0,0 +1,235 @@
+"""
+教材目录的二进制索引：字符串表 + 定长节点记录，mmap读取，按需访问节点
+
+文件结构（小端序）：
+    header  | MAGIC, 格式版本, 节点数, 书本数, 字符串数, 各段偏移, 数据版本签名(40字节)
+    nodes   | 每个节点 NODE_FORMAT：name, tag_id, tag_name, 首个子节点, 子节点数, 书本序号, 层级
+    books   | 每本书 BOOK_FORMAT：book_id, book_name, tag_path, tag_id
+    strings | 偏移数组(uint32 * (n+1)) + UTF-8字节
+
+同一节点的子节点连续存放（广度优先），所以只需记录首个子节点和数量
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import struct
+import time
+from pathlib import Path
+
+from .configs.conf import CACHE_PATH
+from .configs.tags import BookItem, strip, TagHierarchy
+
+MAGIC = b"SEDX"
+FORMAT_VERSION = 1
+HEADER_FORMAT = "<4sIIIIIII40s"
+NODE_FORMAT = "<IIIIIiI"
+BOOK_FORMAT = "<IIII"
+NONE_INDEX = 0xFFFFFFFF
+
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+NODE_SIZE = struct.calcsize(NODE_FORMAT)
+BOOK_SIZE = struct.calcsize(BOOK_FORMAT)
+
+
+def version_signature(version_data: dict) -> bytes:
+    # data_version.json 内容变化（module_version、urls）时重新生成索引
+    text = json.dumps(version_data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest().encode("ascii")
+
+
+def get_index_file(version_name: str) -> Path:
+    return Path(CACHE_PATH).expanduser() / "index" / f"{version_name.strip('/')}.idx"
+
+
+def build_index(tag_hier: TagHierarchy, version_data: dict, index_file: str | Path) -> Path:
+    """把TagHierarchy目录树编译成二进制索引文件"""
+    strings = {}
+
+    def intern(value):
+        if value is None:
+            return NONE_INDEX
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    # 广度优先，保证子节点连续
+    nodes = [tag_hier]
+    node_records = []
+    book_records = []
+    i = 0
+    while i < len(nodes):
+        node = nodes[i]
+        book_index = -1
+        if node.book_item is not None:
+            book = node.book_item
+            book_index = len(book_records)
+            book_record = (book.book_id, book.book_name, book.tag_path, book.tag_id)
+            book_records.append(tuple(intern(value) for value in book_record))
+        record = (
+            intern(node.name),
+            intern(node.tag_id),
+            intern(node.tag_name),
+            len(nodes),
+            len(node.children),
+            book_index,
+            node.level,
+        )
+        node_records.append(record)
+        nodes.extend(node.children)
+        i += 1
+
+    encoded = [value.encode("utf-8") for value in strings]
+    offsets = [0]
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+
+    nodes_offset = HEADER_SIZE
+    books_offset = nodes_offset + NODE_SIZE * len(node_records)
+    strings_offset = books_offset + BOOK_SIZE * len(book_records)
+    header = struct.pack(
+        HEADER_FORMAT,
+        MAGIC,
+        FORMAT_VERSION,
+        len(node_records),
+        len(book_records),
+        len(encoded),
+        nodes_offset,
+        books_offset,
+        strings_offset,
+        version_signature(version_data),
+    )
+
+    index_file = Path(index_file)
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = index_file.with_suffix(".tmp")
+    with open(temp_file, "wb") as f:
+        f.write(header)
+        for record in node_records:
+            f.write(struct.pack(NODE_FORMAT, *record))
+        for record in book_records:
+            f.write(struct.pack(BOOK_FORMAT, *record))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(b"".join(encoded))
+    temp_file.replace(index_file)
+    logging.debug(f"build index {index_file}, nodes={len(node_records)}, strings={len(encoded)}")
+    return index_file
+
+
+class CatalogueIndex:
+    """mmap打开的索引文件"""
+
+    def __init__(self, index_file: str | Path):
+        self.index_file = Path(index_file)
+        with open(self.index_file, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = struct.unpack_from(HEADER_FORMAT, self._mm, 0)
+        magic, version, self.node_count, self.book_count, self.string_count = header[:5]
+        self._nodes_offset, self._books_offset, strings_offset, self.signature = header[5:]
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Invalid index file: {self.index_file}")
+        self._string_offsets = strings_offset
+        self._string_data = strings_offset + 4 * (self.string_count + 1)
+
+    def string(self, index: int) -> str | None:
+        if index == NONE_INDEX:
+            return None
+        start, end = struct.unpack_from("<II", self._mm, self._string_offsets + 4 * index)
+        return self._mm[self._string_data + start : self._string_data + end].decode("utf-8")
+
+    def node(self, index: int) -> tuple:
+        return struct.unpack_from(NODE_FORMAT, self._mm, self._nodes_offset + NODE_SIZE * index)
+
+    def book(self, index: int) -> BookItem:
+        record = struct.unpack_from(BOOK_FORMAT, self._mm, self._books_offset + BOOK_SIZE * index)
+        return BookItem(*[self.string(value) for value in record])
+
+    def root(self) -> "IndexNode":
+        return IndexNode(self, 0)
+
+    def close(self):
+        self._mm.close()
+
+
+class IndexNode:
+    """与TagHierarchy接口一致（name、level、children、book_item、get_options等），按需读取"""
+
+    def __init__(self, index: CatalogueIndex, position: int):
+        self._index = index
+        self._position = position
+        record = index.node(position)
+        self._name, self._tag_id, self._tag_name = record[:3]
+        self._first_child, self._child_count, self._book, self.level = record[3:]
+        self._children = None
+
+    @property
+    def name(self):
+        return self._index.string(self._name)
+
+    @property
+    def tag_id(self):
+        return self._index.string(self._tag_id)
+
+    @property
+    def tag_name(self):
+        return self._index.string(self._tag_name)
+
+    @property
+    def children(self) -> list:
+        if self._children is None:
+            start = self._first_child
+            self._children = [
+                IndexNode(self._index, i) for i in range(start, start + self._child_count)
+            ]
+        return self._children
+
+    @property
+    def is_book(self) -> bool:
+        return self._book >= 0
+
+    @property
+    def book_item(self) -> BookItem | None:
+        return self._index.book(self._book) if self._book >= 0 else None
+
+    def get_options(self):
+        if self.children and self.children[0].is_book:
+            return True, [
+                (child.book_item.book_id, "《{}》".format(strip(child.book_item.book_name)))
+                for child in self.children
+            ]
+        else:
+            return False, [(child.tag_id, strip(child.tag_name)) for child in self.children]
+
+    def __repr__(self):
+        return (
+            f"IndexNode: level={self.level}, name={self.name}\n\ttag={self.tag_id}/{self.tag_name}"
+            f"\n\tchild={self._child_count}, book={self.book_item}"
+        )
+
+
+def load_index(index_file: str | Path, version_data: dict = None) -> IndexNode | None:
+    """
+    索引文件存在且与data_version.json一致时返回根节点，否则返回None
+    version_data为None（如离线时未能获取）时不检查数据版本，直接使用已有的索引
+    """
+    index_file = Path(index_file)
+    if not index_file.exists():
+        return None
+
+    start_time = time.time()
+    try:
+        index = CatalogueIndex(index_file)
+    except (OSError, ValueError, struct.error) as err:
+        logging.warning(f"Load index failed: {index_file}, {err}")
+        return None
+
+    if version_data is None:
+        logging.debug(f"index version not checked: {index_file}")
+    elif index.signature != version_signature(version_data):
+        logging.debug(f"index outdated: {index_file}")
+        index.close()
+        return None
+    logging.debug(f"load index {index_file}, elapsed = {time.time() - start_time:.4f}s")
+    return index.root()
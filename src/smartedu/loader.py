@@ -1,15 +1,47 @@
 import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 
 from .configs.resources import RESOURCE_DICT
 from .configs.tags import BookItem, TagHierarchy
+from .index import build_index, get_index_file, load_index
+from .utils.cache import get_cache
 from .utils.dl import fetch_file
 from .utils.misc import get_headers
+from .utils.session import set_pool_size
 
+# 界面中可以查询的目录：教材、课程教学
+# 课程教学（/syncClassroom）的书本ID是教材ID，需要先解析出各课时的资源才能下载，暂只支持浏览，
+# 见 parser.gen_url_from_tags
+CATALOGUES = ("/tchMaterial", "/syncClassroom")
+# 书本列表较大、按需加载的目录（part_*.json 只在进入需要书本的节点时读取）
+LAZY_CATALOGUES = ("/syncClassroom",)
+# 已有索引时检查数据版本的超时（秒），只请求一个镜像，离线时不会延迟启动
+VERSION_CHECK_TIMEOUT = 1
 
-def fetch_version_data_online(version_name: str) -> list:
-    """读取data_version.json等"""
+
+def _get_detail_urls(version_data: dict) -> list:
+    detail_urls = version_data.get("urls", []) if version_data else []
+    if isinstance(detail_urls, str):
+        detail_urls = detail_urls.split(",")
+    return detail_urls
+
+
+def _fetch_timed(url, headers, timeout, data_format, cache, failover=True):
+    start_time = time.time()
+    data = fetch_file(url, headers, timeout, data_format, cache=cache, failover=failover)
+    logging.debug(f"fetch data = {url}, elapsed = {time.time() - start_time:.2f}s")
+    return data
+
+
+def fetch_version_data_online(
+    version_name: str, use_cache: bool = True, max_workers: int = 5
+) -> list:
+    """读取data_version.json等；tag、version和所有part_*.json并发获取"""
     resources = RESOURCE_DICT[version_name]["resources"]
     tag_url = resources["tag"]
     version_url = resources["version"]
@@ -17,27 +49,34 @@ def fetch_version_data_online(version_name: str) -> list:
     headers = get_headers()
     timeout = 5
     data_format = "json"
+    cache = get_cache() if use_cache else None
+    fetch = partial(
+        _fetch_timed, headers=headers, timeout=timeout, data_format=data_format, cache=cache
+    )
+
+    start_time = time.time()
+    set_pool_size(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tag_future = executor.submit(fetch, tag_url)
+        version_future = executor.submit(fetch, version_url)
+
+        # part_*.json 的地址来自data_version.json，获得后立即并发下载（tag可能仍在下载）
+        version_data = version_future.result()
+        detail_urls = _get_detail_urls(version_data)
+        detail_futures = [executor.submit(fetch, detail_url) for detail_url in detail_urls]
+
+        output = [
+            (tag_url.split("/")[-1], tag_future.result()),
+            (version_url.split("/")[-1], version_data),
+        ]
+        detail_list = [
+            (detail_url.split("/")[-1], future.result())
+            for detail_url, future in zip(detail_urls, detail_futures)
+        ]
 
-    output = []
-    for url in [tag_url, version_url]:
-        name = url.split("/")[-1]
-        logging.debug(f"fetch data = {url}")
-        data = fetch_file(url, headers, timeout, data_format)
-        output.append((name, data))
-
-    version_data = output[-1][1]
-    detail_list = []
-    if version_data:
-        detail_urls = version_data.get("urls", [])
-        if isinstance(detail_urls, str):
-            detail_urls = detail_urls.split(",")
-        if detail_urls:
-            for detail_url in detail_urls:
-                logging.debug(f"fetch data = {detail_url}")
-                detail_name = detail_url.split("/")[-1]
-                out = fetch_file(detail_url, headers, timeout, data_format)
-                detail_list.append((detail_name, out))
     output.append(("details", detail_list))
+    elapsed = time.time() - start_time
+    logging.debug(f"fetch {version_name}: parts = {len(detail_list)}, elapsed = {elapsed:.2f}s")
     return output
 
 
@@ -61,9 +100,7 @@ def load_version_data_local(version_name: str, data_dir: str) -> list:
     version_data = output[-1][1]
     detail_list = []
     if version_data:
-        detail_urls = version_data.get("urls", [])
-        if isinstance(detail_urls, str):
-            detail_urls = detail_urls.split(",")
+        detail_urls = _get_detail_urls(version_data)
         if detail_urls:
             for detail_url in detail_urls:
                 detail_name = detail_url.split("/")[-1]
@@ -95,41 +132,170 @@ def save_version_data(name, save_dir):
 
 
 def update_hierarchies(tag_hier: TagHierarchy, tag_dict: dict, book_list: list[BookItem]):
+    # 按tag_path逐级查找子节点（字典索引），不存在时新建书本节点
     for book_item in book_list:
         tag_paths = book_item.tag_path.split("/")
-
-        prev_item = tag_hier
-        current_item = tag_hier
         if tag_paths[0] != tag_hier.tag_id:
             continue
 
-        for i in range(1, len(tag_paths)):
-            current_tag_id = tag_paths[i]
-            prev_item = current_item
+        current_item = tag_hier
+        for current_tag_id in tag_paths[1:]:
+            child = current_item.get_child(current_tag_id)
+            if child is None:
+                name = tag_dict[current_tag_id]
+                child = TagHierarchy(current_item.level + 1, name, current_tag_id, name)
+                child.set_book(book_item)
+                current_item.add_child(child)
+            current_item = child
 
-            # current_item = None
-            flag = False
-            if prev_item is not None:
-                for j, item in enumerate(prev_item.children):
-                    if item.tag_id == current_tag_id:
-                        current_item = prev_item.children[j]
-                        flag = True
-                        break
+    return tag_hier
 
-            if flag:
-                continue
 
-            name = tag_dict[current_tag_id]
-            new_tag = TagHierarchy(prev_item.level + 1, name, current_tag_id, name)
-            new_tag.set_book(book_item)
-            prev_item.add_child(new_tag)
+def _load_json(version_name: str, url: str, data_dir=None, local=False, timeout=5, failover=True):
+    # 在线优先，失败时读取本地 data_dir/版本名/文件名
+    data = None
+    if not local:
+        data = _fetch_timed(url, get_headers(), timeout, "json", get_cache(), failover)
+    if data is None and data_dir:
+        data_file = Path(data_dir, version_name.strip("/"), url.split("/")[-1])
+        if data_file.exists():
+            logging.debug(f"fetch data = {data_file}")
+            with open(data_file, encoding="utf-8") as f:
+                data = json.load(f)
+    return data
+
+
+def fetch_version_info(
+    version_name: str, data_dir=None, local=False, timeout=5, failover=True
+) -> dict | None:
+    """只读取data_version.json（在线优先，失败时读取本地）"""
+    version_url = RESOURCE_DICT[version_name]["resources"]["version"]
+    return _load_json(version_name, version_url, data_dir, local, timeout, failover)
+
+
+def attach_books(tag_hier: TagHierarchy, entries, leaves: set) -> int:
+    """
+    按tag_list逐级匹配目录（课程教学的part_*.json没有tag_paths），书本挂到匹配到的叶子节点下
+    停在中间节点的（目录中没有对应的版本、册次等）不显示，返回挂上的书本数
+    """
+    count = 0
+    for e in entries:
+        tag_ids = [tag["tag_id"] for tag in e.get("tag_list") or []]
+        current_item = tag_hier
+        tag_path = [tag_hier.tag_id]
+        while True:
+            child = next((c for t in tag_ids if (c := current_item.get_child(t))), None)
+            if child is None:
+                break
+            current_item = child
+            tag_path.append(child.tag_id)
+
+        if current_item not in leaves or current_item.get_child(e["id"]) is not None:
+            continue
+        book_item = BookItem(e["id"], e["title"], "/".join(tag_path), current_item.tag_id)
+        child = TagHierarchy(current_item.level + 1, e["title"], e["id"], e["title"])
+        child.set_book(book_item)
+        current_item.add_child(child)
+        count += 1
+    return count
+
+
+class ShardLoader:
+    """
+    目录树只用标签文件构建，书本所在的叶子节点延迟加载：
+    首次访问任一叶子节点的children时，并发读取全部part_*.json（按资源ID分片，任一叶子的书本
+    都可能分布在各分片中），挂上书本后编译索引，之后不再读取
+    """
+
+    def __init__(
+        self,
+        version_name: str,
+        tag_hier: TagHierarchy,
+        version_data: dict,
+        data_dir=None,
+        local=False,
+        index_file=None,
+        max_workers: int = 5,
+    ):
+        self.version_name = version_name
+        self.tag_hier = tag_hier
+        self.version_data = version_data
+        self.data_dir = data_dir
+        self.local = local
+        self.index_file = index_file
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+
+        # 标签文件中没有子节点的是叶子节点
+        self._leaves = set()
+        nodes = [tag_hier]
+        while nodes:
+            node = nodes.pop()
+            if node.children:
+                nodes.extend(node.children)
+            else:
+                node.set_loader(self)
+                self._leaves.add(node)
+
+    def __call__(self, node: TagHierarchy):
+        with self._lock:
+            if not self._leaves:
+                return  # 其他线程已加载
+
+            start_time = time.time()
+            detail_urls = _get_detail_urls(self.version_data)
+            load = partial(_load_json, self.version_name, data_dir=self.data_dir, local=self.local)
+            set_pool_size(self.max_workers)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                parts = list(executor.map(load, detail_urls))
+
+            entries = (e for part in parts if part for e in part)
+            count = attach_books(self.tag_hier, entries, self._leaves)
+            for leaf in self._leaves:
+                leaf.set_loader(None)
+            self._leaves = set()
+            elapsed = time.time() - start_time
+            logging.debug(f"load parts = {len(parts)}, books = {count}, elapsed = {elapsed:.2f}s")
+
+            # 分片都读取成功时才编译索引，避免缓存不完整的目录
+            if self.index_file and parts and all(parts):
+                try:
+                    build_index(self.tag_hier, self.version_data, self.index_file)
+                except OSError as err:
+                    logging.warning(f"Build index failed: {self.index_file}, {err}")
+
+
+def _fetch_metadata_lazy(name, data_dir, local, version_info, index_file):
+    # 只读取标签文件和data_version.json，part_*.json 由 ShardLoader 按需读取
+    resources = RESOURCE_DICT[name]["resources"]
+    tag_data = _load_json(name, resources["tag"], data_dir, local)
+    if not tag_data:
+        return None
+    version_info = version_info or fetch_version_info(name, data_dir, local)
 
-    return tag_hier
+    meta_data = TagHierarchy.from_dict(0, tag_data)
+    ShardLoader(name, meta_data, version_info, data_dir, local, index_file)
+    return meta_data
 
 
-def fetch_metadata(data_dir=None, local=False):
-    # 生成教材层级结构以及对应书名、ID等
-    name = "/tchMaterial"  # TODO 目前仅教材，待支持课件
+def fetch_metadata(data_dir=None, local=False, use_index=True, name="/tchMaterial"):
+    # 生成教材（/tchMaterial）、课程教学（/syncClassroom）的层级结构以及对应书名、ID等
+
+    # 数据版本未变化时直接使用编译好的索引，无需解析part_*.json
+    # 只用较短的超时请求一个镜像检查版本；获取不到（离线）时直接使用已有的索引
+    index_file = get_index_file(name)
+    version_info = None
+    if use_index and index_file.exists():
+        version_info = fetch_version_info(
+            name, data_dir if local else None, local, VERSION_CHECK_TIMEOUT, failover=False
+        )
+        meta_data = load_index(index_file, version_info)
+        if meta_data is not None:
+            return meta_data
+    if name in LAZY_CATALOGUES:
+        return _fetch_metadata_lazy(
+            name, data_dir, local, version_info, index_file if use_index else None
+        )
 
     version_data = None
     if not local:
@@ -150,12 +316,12 @@ def fetch_metadata(data_dir=None, local=False):
     tag_dict = {}
     book_list = []
     for e in parts_data:
-        for tag in e["tag_list"]:
+        for tag in e.get("tag_list") or []:
             tag_id = tag["tag_id"]
             if tag_id not in tag_dict:
                 tag_dict[tag_id] = tag["tag_name"]
 
-        for tag_path in e["tag_paths"]:
+        for tag_path in e.get("tag_paths") or []:
             tag_id = tag_path.split("/")[-1]
             book_item = BookItem(e["id"], e["title"], tag_path, tag_id)
             book_list.append(book_item)
@@ -163,9 +329,20 @@ def fetch_metadata(data_dir=None, local=False):
     # 专题*/电子教材
     meta_data = TagHierarchy.from_dict(0, tag_data)
     meta_data = update_hierarchies(meta_data, tag_dict, book_list)
+
+    if use_index and version_data[1][1]:
+        try:
+            build_index(meta_data, version_data[1][1], index_file)
+        except OSError as err:
+            logging.warning(f"Build index failed: {index_file}, {err}")
     return meta_data
 
 
+def catalogue_root(tag_hier: TagHierarchy, name: str = "/tchMaterial") -> TagHierarchy:
+    # 选择的起点：教材从「电子教材」开始，课程教学从学段开始
+    return tag_hier.children[0] if name == "/tchMaterial" else tag_hier
+
+
 def query_metadata(tag_hier: TagHierarchy, max_level: int = 5):
     # 获得下一级列表
     title = tag_hier.name
@@ -3,13 +3,14 @@ smartedu配置信息和解析
 """
 
 import logging
-import random
 import re
-
-from urllib.parse import parse_qs, urlparse
+from functools import partial
+from typing import Callable, Iterable, Iterator
+from urllib.parse import unquote_plus, urlsplit
 
 from .configs.resources import DOMAIN_REMAP_DICT, RESOURCE_TYPE_DICT, RESOURCE_DICT
-from .configs.resources import FORMATS_REMAP, ACCEPTED_FORMATS, SERVER_LIST
+from .configs.resources import FORMATS_REMAP, ACCEPTED_FORMATS, SAVE_FORMATS, SERVER_LIST
+from .utils.mirrors import get_scoreboard, ranked_urls
 
 
 def _convert_url(resource_url):
@@ -24,67 +25,194 @@ def _convert_url(resource_url):
     return new_url
 
 
+def _build_routes() -> dict:
+    # 导入时构建一次：路径 -> (参数名, {配置类型: 已填入server的模板})
+    routes = {}
+    for path, config_info in RESOURCE_DICT.items():
+        if "params" not in config_info or path in ["/tchMaterial", "/syncClassroom"]:
+            continue
+        templates = {
+            key: _fill_server(template) for key, template in config_info["resources"].items()
+        }
+        routes[path] = (tuple(config_info["params"]) + ("contentType",), templates)
+    return routes
+
+
+def _fill_server(template):
+    # 先用SERVER_LIST[0]，请求前再用 ranked_urls 选当前最快的s-file服务器
+    if isinstance(template, list):
+        return [_fill_server(t) for t in template]
+    return template.replace("{server}", SERVER_LIST[0])
+
+
+def _extract_params(query: str, params: tuple) -> dict:
+    # 只解析需要的参数，同名参数取第一个非空值（与 parse_qs(query)[key][0] 一致）
+    out = dict.fromkeys(params)
+    for pair in query.split("&"):
+        key, _, value = pair.partition("=")
+        if value and key in out and out[key] is None:
+            out[key] = unquote_plus(value)
+    return out
+
+
+_ROUTES = _build_routes()
+_VALID_HOSTS = frozenset(DOMAIN_REMAP_DICT) | frozenset(DOMAIN_REMAP_DICT.values())
+
+
+def _split_url(url: str) -> tuple[str, str, str]:
+    # "https://host/path?query#fragment" -> (host, path, query)，比urlsplit快，够用于校验
+    rest = url.partition("://")[2].partition("#")[0]
+    host, slash, rest = rest.partition("/")
+    path, _, query = rest.partition("?")
+    return host, slash + path, query
+
+
+def _match_route(url: str):
+    # 返回 (路径, 查询参数字符串), ""，无效时返回 None, 原因
+    if not url.startswith("http"):
+        return None, "不是http链接"
+
+    host, path, query = _split_url(url)
+    if host not in _VALID_HOSTS:
+        return None, f"不支持的域名 {host}"
+    if path not in _ROUTES:
+        return None, f"不支持的路径 {path}"
+    return (path, query), ""
+
+
 def validate_url(url: str):
     url = url.strip()
-    if not url.startswith("http"):
+    route, reason = _match_route(url)
+    if route is None:
+        logging.debug(f"Not valid URL = {url}, {reason}")
         return None
+    return urlsplit(url)
 
-    parse_result = urlparse(url)
-    host = parse_result.netloc
-    if not (host in DOMAIN_REMAP_DICT.keys() or host in DOMAIN_REMAP_DICT.values()):
-        logging.debug(f"Not valid host = {host}")
-        return None
 
-    path = parse_result.path
-    if path not in RESOURCE_DICT or path in ["/tchMaterial", "/syncClassroom"]:
-        logging.debug(f"Not valid path = {path}")
-        return None
-    return parse_result
+def iter_url_lines(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
+    """逐行读取URL（每行可有多个，逗号分隔），产出 (行号, URL)"""
+    for lineno, line in enumerate(lines, 1):
+        for url in line.split(","):
+            url = url.strip()
+            if url:
+                yield lineno, url
 
 
-def parse_urls(urls: list, formats: list, activate_backup: bool) -> list:
-    # 根据URL路径判断资源类型，获得临时的配置信息URL(config, 返回json数据)，再解析得到最终资源URL
-    config_urls = []
-    config_key = "default"
+def iter_config_urls(
+    items: Iterable[tuple],
+    formats: list,
+    activate_backup: bool,
+    on_error: Callable = None,
+    stats: dict = None,
+) -> Iterator:
+    """
+    单遍流式解析：校验、去重、生成配置URL，内存只随不重复的配置数增长
+
+    items: (标记, URL)，标记（如行号）原样传给 on_error(标记, URL, 原因)
+    stats: 传入时累计 valid/duplicate/invalid/configs 数量
+    启用备用链接时，对应项为列表 [主配置URL, 备用URL, ...]
+    体育、美育课程分两步解析，对应项为 {"url": 课程信息URL, "expand": 生成下一步配置的函数}
+    """
     config_key2 = "audio"
     config_key3 = "backup"
-    audio = False
-    for v in formats:
-        if v.strip().lower() in RESOURCE_TYPE_DICT["assets_audio"][1]:
-            audio = True
-            break
-
-    for url in set(urls):
-        parse_result = validate_url(url)
-        if parse_result is None:
+    audio = any(v.strip().lower() in RESOURCE_TYPE_DICT["assets_audio"][1] for v in formats)
+    stats = {} if stats is None else stats
+    for key in ["valid", "duplicate", "invalid", "configs"]:
+        stats.setdefault(key, 0)
+    # 按主配置URL去重：域名别名、参数顺序不同的链接对应同一个配置
+    seen = set()
+
+    def invalid(label, url, reason):
+        stats["invalid"] += 1
+        logging.debug(f"Not valid URL = {url}, {reason}")
+        if on_error:
+            on_error(label, url, reason)
+
+    for label, url in items:
+        url = url.strip()
+        route, reason = _match_route(url)
+        if route is None:
+            invalid(label, url, reason)
             continue
-        config_info = RESOURCE_DICT[parse_result.path]
-        queries = parse_qs(parse_result.query)
-
-        params = config_info["params"]
-        params += ["contentType"]
-        params_out = {}
-        for key in params:
-            params_out[key] = queries[key][0] if queries.get(key) else None
-        params_out["server"] = random.choice(SERVER_LIST)
-
-        contentType = params_out["contentType"]
-        if contentType == "thematic_course":
+        path, query = route
+        params, templates = _ROUTES[path]
+        params_out = _extract_params(query, params)
+        missing = [key for key in params[:-1] if params_out[key] is None]
+        if missing:
+            invalid(label, url, f"缺少参数 {','.join(missing)}")
+            continue
+
+        config_key = "default"
+        if params_out["contentType"] == "thematic_course" and "thematic_course" in templates:
             config_key = "thematic_course"
+        if "first" in templates and "second" in templates:
+            config_key = "first"
+        if config_key not in templates:
+            invalid(label, url, "暂不支持该类资源")
+            continue
 
-        config_url = config_info["resources"][config_key].format(**params_out)
-        config_urls.append(config_url)
-        if activate_backup:
-            backup_urls = config_info["resources"][config_key3]
-            backup_urls = [backup_url.format(**params_out) for backup_url in backup_urls]
+        config_url = templates[config_key].format_map(params_out)
+        if config_url in seen:
+            stats["duplicate"] += 1
+            continue
+        seen.add(config_url)
+        stats["valid"] += 1
+
+        # 选用当前最快的s-file服务器
+        config_url = ranked_urls(config_url)[0]
+        if config_key == "first":
+            # 先请求课程信息，得到各活动集后再并发请求活动集详情
+            yield {"url": config_url, "expand": partial(_expand_activity_sets, templates["second"])}
+        elif activate_backup and config_key3 in templates:
+            # 备用链接只在主配置没有解析出资源时才依次请求，见 downloader.iter_resources
+            backup_urls = [ranked_urls(t.format_map(params_out))[0] for t in templates[config_key3]]
             logging.debug(f"backup links = {backup_urls}")
-            config_urls.extend(backup_urls)
+            yield [config_url] + backup_urls
+        else:
+            yield config_url
+        stats["configs"] += 1
 
-        if audio and config_key2 in config_info["resources"]:
-            audio_url = config_info["resources"][config_key2].format(**params_out)
-            config_urls.append(audio_url)
+        if audio and config_key2 in templates:
+            audio_url = ranked_urls(templates[config_key2].format_map(params_out))[0]
             logging.debug(f"Add audio: {audio_url}")
+            yield audio_url
+            stats["configs"] += 1
+
+
+def _find_values(data, key: str) -> list:
+    # 递归查找所有名为key的字段值
+    if isinstance(data, dict):
+        values = [data[key]] if key in data else []
+        return values + [v for item in data.values() for v in _find_values(item, key)]
+    if isinstance(data, list):
+        return [v for item in data for v in _find_values(item, key)]
+    return []
+
+
+def collect_items(data) -> list:
+    """递归收集包含ti_items的资源项（活动集详情中资源嵌套在各层活动里）"""
+    if isinstance(data, dict):
+        if "ti_items" in data:
+            return [data]
+        return [v for item in data.values() for v in collect_items(item)]
+    if isinstance(data, list):
+        return [v for item in data for v in collect_items(item)]
+    return []
+
+
+def _expand_activity_sets(template: str, data) -> list:
+    # 课程信息(zh-CN.json) -> 各活动集详情(fulls.json)的配置，资源从中递归收集
+    activity_set_ids = dict.fromkeys(v for v in _find_values(data, "activity_set_id") if v)
+    logging.debug(f"activity sets = {list(activity_set_ids)}")
+    return [
+        {"url": ranked_urls(template.format(activity_set_id=i))[0], "transform": collect_items}
+        for i in activity_set_ids
+    ]
 
+
+def parse_urls(urls: list, formats: list, activate_backup: bool) -> list:
+    # 根据URL路径判断资源类型，获得临时的配置信息URL(config, 返回json数据)，再解析得到最终资源URL
+    config_urls = list(iter_config_urls(enumerate(urls, 1), formats, activate_backup))
     logging.debug(f"config urls = {len(config_urls)}")
     logging.debug(str(config_urls))
     return config_urls
@@ -110,14 +238,15 @@ def _extract_resource(data, suffix="pdf"):
         resource_url = None
         for item in entry["ti_items"]:
             if item["ti_format"].lower().strip() == suffix and item["ti_storages"]:
-                resource_url = random.choice(item["ti_storages"])
+                resource_url = get_scoreboard().rank(item["ti_storages"])[0]
                 break
 
         # jpg: entry["custom_properties"]["preview"]
         if resource_url:
-            save_name = f"{title}.{suffix}"
+            save_suffix = SAVE_FORMATS.get(suffix, suffix)
+            save_name = f"{title}.{save_suffix}"
             if save_name in name_dict:
-                save_name = f"{title} ({name_dict[save_name]}).{suffix}"
+                save_name = f"{title} ({name_dict[save_name]}).{save_suffix}"
                 name_dict[save_name] += 1
             else:
                 name_dict[save_name] = 1
@@ -139,19 +268,27 @@ def extract_resource_url(data: dict | list, suffix_list: list) -> list:
     return out
 
 
-def gen_url_from_tags(content_id_list):
-    # 转化成URL
-    name = "/tchMaterial"
-    resources = RESOURCE_DICT[name]["resources"]
-    example_url = resources["detail"]
-    urls = [example_url.format(contentId=cid) for cid in content_id_list]
+# 目录中的书本ID对应的详情页：(RESOURCE_DICT中的模板名, 参数名)
+_DETAIL_TEMPLATES = {
+    "/tchMaterial": ("detail", "contentId"),
+}
+
+
+def gen_url_from_tags(content_id_list, name="/tchMaterial"):
+    # 转化成URL：教材为教材详情页
+    if name not in _DETAIL_TEMPLATES:
+        catalogue = RESOURCE_DICT[name]["name"]
+        raise ValueError(f"{catalogue}暂不支持按书本下载课时资源，请复制课时页面的链接后下载")
+    template_key, param = _DETAIL_TEMPLATES[name]
+    example_url = RESOURCE_DICT[name]["resources"][template_key]
+    urls = [example_url.format(**{param: cid}) for cid in content_id_list]
     return urls
 
 
 def get_formats(formats):
     out = []
     if formats:
-        out = [v.strip() for v in formats.strip(",") if v.strip() in ACCEPTED_FORMATS]
+        out = [v.strip() for v in formats.split(",") if v.strip() in ACCEPTED_FORMATS]
     if len(out) == 0:
         out = ["pdf"]
     return out
@@ -0,0 +1,158 @@
+"""
+本地HTTP服务，用于单元测试和基准测试（模拟CDN/配置服务器）
+"""
+
+import hashlib
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_GET(self, head=False):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.connections.add(self.client_address)
+            server.ranges.append(self.headers.get("Range"))
+            overload = server.max_active and server.active >= server.max_active
+            server.active += 1
+            errors = server.errors.get(self.path.split("?")[0])
+            error = errors.pop(0) if errors else None
+        try:
+            if overload or error:
+                self.send_response(error or 429)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._respond(server, head)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _respond(self, server, head):
+        delay = server.delay() if callable(server.delay) else server.delay
+        if delay:
+            time.sleep(delay)
+        body = server.files.get(self.path.split("?")[0])
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest()) if server.etag else None
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start, end = 0, len(body) - 1
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+        if_range = self.headers.get("If-Range")
+        if match and server.accept_ranges and (not if_range or if_range == etag):
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else end
+            start = max(start - server.range_shift, 0)
+            end = min(end, len(body) - 1)
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+        else:
+            self.send_response(200)
+        if server.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if etag:
+            self.send_header("ETag", etag)
+        if server.last_modified:
+            self.send_header("Last-Modified", server.last_modified)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body[start : end + 1])
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端提前断开连接（未读取响应）时不打印异常
+        pass
+
+
+class LocalServer:
+    """在后台线程运行的本地HTTP服务，记录所有请求路径"""
+
+    def __init__(
+        self,
+        files: dict = None,
+        accept_ranges: bool = True,
+        delay=0,
+        max_active=0,
+        etag: bool = True,
+        last_modified: str = None,
+        range_shift: int = 0,
+    ):
+        self.httpd = _Server(("127.0.0.1", 0), _Handler)
+        self.httpd.files = files or {}
+        self.httpd.requests = []
+        self.httpd.connections = set()
+        self.httpd.ranges = []
+        self.httpd.accept_ranges = accept_ranges
+        self.httpd.delay = delay  # 模拟网络延迟（秒），可以是返回延迟的函数
+        self.httpd.max_active = max_active  # 同时处理的请求数超过该值时返回429（限流）
+        self.httpd.active = 0
+        self.httpd.errors = {}  # 路径 -> 依次返回的错误状态码，用完后正常响应
+        self.httpd.etag = etag  # 是否返回ETag（按内容计算）
+        self.httpd.last_modified = last_modified  # 返回的Last-Modified，不处理条件请求
+        self.httpd.range_shift = range_shift  # Range请求返回的起点提前的字节数（模拟返回错误范围）
+        self.httpd.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def files(self) -> dict:
+        return self.httpd.files
+
+    @property
+    def requests(self) -> list:
+        return self.httpd.requests
+
+    @property
+    def errors(self) -> dict:
+        return self.httpd.errors
+
+    @property
+    def ranges(self) -> list:
+        return self.httpd.ranges
+
+    @property
+    def connections(self) -> set:
+        return self.httpd.connections
+
+    def url(self, path: str) -> str:
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}{path}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
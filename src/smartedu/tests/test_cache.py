@@ -0,0 +1,130 @@
+import asyncio
+import json
+import threading
+from functools import partial
+from pathlib import Path
+
+from .. import downloader_async
+from ..downloader import fetch_resources
+from ..parser import extract_resource_url
+from ..utils import cache as cache_module
+from ..utils.cache import normalize_url, ResponseCache
+from ..utils.dl import fetch_file
+from .server import LocalServer
+from .test_downloader import make_files
+
+
+def test_normalize_url():
+    url = "https://s-file-2.ykt.cbern.com.cn/zxx/ndrv2/resources/tch_material/details/1.json"
+    assert normalize_url(url) == url.replace("s-file-2", "{server}")
+    url2 = url.replace("s-file-2", "s-file-3")
+    assert normalize_url(url) == normalize_url(url2)
+
+
+def test_fetch_file_cache(tmp_path):
+    data = {"id": "1", "ti_items": []}
+    with LocalServer({"/details/1.json": json.dumps(data).encode()}) as server:
+        url = server.url("/details/1.json")
+        cache = ResponseCache(tmp_path)
+        assert fetch_file(url, {}, cache=cache) == data
+        assert fetch_file(url, {}, cache=cache) == data
+        assert len(server.requests) == 1
+
+        # 过期后条件请求，返回304
+        cache = ResponseCache(tmp_path / "expired", ttl=0)
+        assert fetch_file(url, {}, cache=cache) == data
+        assert fetch_file(url, {}, cache=cache) == data
+        assert len(server.requests) == 3
+        assert cache.get(url)["etag"]
+
+
+def test_fetch_json_cache(tmp_path, monkeypatch):
+    aiohttp = downloader_async.aiohttp
+    # 缓存文件的读写不在事件循环线程中执行
+    threads = set()
+    for name in ("get", "put", "refresh"):
+        method = getattr(ResponseCache, name)
+
+        def record(self, *args, _method=method):
+            threads.add(threading.current_thread())
+            return _method(self, *args)
+
+        monkeypatch.setattr(ResponseCache, name, record)
+
+    async def fetch_twice(url, cache):
+        async with aiohttp.ClientSession() as session:
+            first = await downloader_async._fetch_json(session, url, {}, 5, cache)
+            second = await downloader_async._fetch_json(session, url, {}, 5, cache)
+            return first, second
+
+    data = {"id": "1", "ti_items": []}
+    with LocalServer({"/details/1.json": json.dumps(data).encode()}) as server:
+        url = server.url("/details/1.json")
+        assert asyncio.run(fetch_twice(url, ResponseCache(tmp_path))) == (data, data)
+        assert len(server.requests) == 1
+
+        # 过期后条件请求，返回304
+        cache = ResponseCache(tmp_path / "expired", ttl=0)
+        assert asyncio.run(fetch_twice(url, cache)) == (data, data)
+        assert len(server.requests) == 3
+    assert threads and threading.main_thread() not in threads
+
+
+def test_cache_evict(tmp_path):
+    cache = ResponseCache(tmp_path, max_size=3000)
+    for i in range(10):
+        cache.put(f"https://s-file-1.ykt.cbern.com.cn/{i}.json", "x" * 1000)
+    assert len(list(tmp_path.glob("*.json"))) == 2
+    assert cache.get("https://s-file-3.ykt.cbern.com.cn/9.json")["text"] == "x" * 1000
+
+
+def test_cache_evict_incremental(tmp_path, monkeypatch):
+    cache = ResponseCache(tmp_path, max_size=3000)
+    scans = []
+    scan = cache._scan
+    monkeypatch.setattr(cache, "_scan", lambda: scans.append(1) or scan())
+
+    # 未超过上限时只累计大小，不扫描目录；覆盖同一URL只计算差值
+    for _ in range(3):
+        cache.put("https://s-file-1.ykt.cbern.com.cn/0.json", "x" * 1000)
+    cache.put("https://s-file-1.ykt.cbern.com.cn/1.json", "x" * 1000)
+    assert not scans
+    assert cache._total_size == sum(f.stat().st_size for f in tmp_path.glob("*.json"))
+
+    # 超过上限时扫描一次并淘汰
+    cache.put("https://s-file-1.ykt.cbern.com.cn/2.json", "x" * 1000)
+    assert len(scans) == 1
+    assert cache._total_size == sum(f.stat().st_size for f in tmp_path.glob("*.json")) <= 3000
+
+    # 重新打开时从目录统计已有大小
+    assert ResponseCache(tmp_path, max_size=3000)._total_size == cache._total_size
+
+
+
+def test_cache_write_error(tmp_path, monkeypatch):
+    # 写缓存失败（如磁盘已满）时只记录警告，仍返回已获取的数据
+    def disk_full(self, target):
+        raise OSError(28, "No space left on device")
+
+    cache = ResponseCache(tmp_path)
+    with LocalServer({"/a.json": b'{"x": 1}'}) as server:
+        url = server.url("/a.json")
+        monkeypatch.setattr(Path, "replace", disk_full)
+        assert fetch_file(url, {}, cache=cache) == {"x": 1}
+        assert not list(tmp_path.iterdir())
+        assert cache._total_size == 0
+
+
+def test_cache_dir_error(tmp_path, monkeypatch):
+    # 缓存目录无法创建时不使用缓存
+    (tmp_path / "home").write_text("")
+    monkeypatch.setattr(cache_module, "CACHE_PATH", str(tmp_path / "home" / "cache"))
+    monkeypatch.setattr(cache_module, "_default_cache", None)
+    monkeypatch.setattr(cache_module, "_default_failed", False)
+    assert cache_module.get_cache() is None
+
+    with LocalServer() as server:
+        server.files.update(make_files(server.url, 2))
+        config_urls = [server.url(f"/details/{i}.json") for i in range(2)]
+        extract_func = partial(extract_resource_url, suffix_list=["pdf"])
+        assert len(fetch_resources(config_urls, extract_func)) == 2
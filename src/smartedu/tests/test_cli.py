@@ -0,0 +1,57 @@
+from .. import loader
+from ..loader import fetch_metadata
+from ..ui import cli
+
+
+def test_interactive_mode1_lazy(monkeypatch):
+    # 交互模式逐级选择课程教学目录，进入书本所在的节点时才读取分片
+    loaded = []
+    load_json = loader._load_json
+
+    def spy(version_name, url, *args, **kwargs):
+        loaded.append(url.split("/")[-1])
+        return load_json(version_name, url, *args, **kwargs)
+
+    monkeypatch.setattr(loader, "_load_json", spy)
+    meta_data = fetch_metadata("../data/v2/", True, False, name="/syncClassroom")
+
+    answers = []
+    current = meta_data
+    for tag_name in ["小学", "一年级", "语文", "统编版", "上册", "新教材"]:
+        index = next(i for i, c in enumerate(current.children) if c.tag_name == tag_name)
+        answers.append(str(index + 1))
+        current = current.children[index]
+    assert len(loaded) == 2
+
+    loaded_at_prompt = []
+
+    def prompt(*args, **kwargs):
+        loaded_at_prompt.append(len(loaded))
+        return answers[len(loaded_at_prompt) - 1]
+
+    messages = []
+    monkeypatch.setattr(cli.click, "prompt", prompt)
+    monkeypatch.setattr(cli.click, "secho", lambda message, **kwargs: messages.append(message))
+    urls = cli._interactive_mode1(meta_data, "/syncClassroom")
+
+    assert loaded_at_prompt == [2] * len(answers)
+    assert sorted(loaded[2:]) == ["part_100.json", "part_101.json", "part_102.json"]
+    # 课时资源暂不能按书本下载，提示后不返回链接
+    assert urls == []
+    assert any("暂不支持" in message for message in messages)
+
+
+def test_interactive_mode2_single_pass(tmp_path, monkeypatch, caplog):
+    # 手动输入的URL不预先校验，无效链接在下载时按序号报告
+    url = "https://basic.smartedu.cn/tchMaterial/detail?contentType=assets_document&contentId=1"
+    monkeypatch.setattr(cli.click, "prompt", lambda *args, **kwargs: f"{url}, not-a-url")
+    urls = cli._interactive_mode2()
+    assert urls == [url, "not-a-url"]
+
+    def download(config_urls, *args, **kwargs):
+        return [], list(config_urls)
+
+    monkeypatch.setattr(cli, "download_pipeline", download)
+    with caplog.at_level("WARNING"):
+        assert cli.simple_download(enumerate(urls, 1), tmp_path, ["pdf"]) == 1
+    assert "无效链接 [2]: not-a-url" in caplog.text
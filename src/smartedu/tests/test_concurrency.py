@@ -0,0 +1,69 @@
+import threading
+import time
+
+from ..utils.concurrency import AdaptiveLimiter
+
+URL = "https://r1-ndr.ykt.cbern.com.cn/a.pdf"
+
+
+def run_round(limiter, code=200, size=1024, elapsed=0.0):
+    starts = [limiter.acquire(URL) for _ in range(limiter.limit(URL))]
+    time.sleep(elapsed)
+    for start in starts:
+        limiter.release(URL, start, code, size)
+
+
+def test_limiter_additive_increase():
+    limiter = AdaptiveLimiter(ceiling=6, initial=2)
+    run_round(limiter, size=1024, elapsed=0.01)
+    assert limiter.limit(URL) == 3
+    run_round(limiter, size=1024 * 1024, elapsed=0.01)
+    assert limiter.limit(URL) == 4
+    for i in range(5):
+        run_round(limiter, size=1024 * 1024 * 4**i, elapsed=0.01)
+    assert limiter.limit(URL) == 6
+
+
+def test_limiter_multiplicative_decrease():
+    limiter = AdaptiveLimiter(ceiling=16, initial=8)
+    run_round(limiter, code=503)
+    assert limiter.limit(URL) == 4
+    run_round(limiter, code=429)
+    assert limiter.limit(URL) == 2
+    run_round(limiter, code=-1)
+    run_round(limiter, code=-1)
+    assert limiter.limit(URL) == 1
+    # 其他主机不受影响
+    assert limiter.limit("https://r2-ndr.ykt.cbern.com.cn/a.pdf") == 8
+
+
+def test_limiter_latency_decrease():
+    limiter = AdaptiveLimiter(ceiling=16, initial=4)
+    run_round(limiter, size=1024 * 1024)
+    assert limiter.limit(URL) == 5
+    # 吞吐不变而耗时变长：过载
+    run_round(limiter, size=1024, elapsed=0.05)
+    assert limiter.limit(URL) == 4
+
+
+def test_limiter_fixed():
+    limiter = AdaptiveLimiter(ceiling=3, adaptive=False)
+    run_round(limiter, code=503)
+    run_round(limiter, size=1024 * 1024)
+    assert limiter.limit(URL) == 3
+
+
+def test_limiter_blocks_at_limit():
+    limiter = AdaptiveLimiter(ceiling=2, adaptive=False)
+    starts = [limiter.acquire(URL), limiter.acquire(URL)]
+    acquired = threading.Event()
+
+    def worker():
+        limiter.release(URL, limiter.acquire(URL), 200, 1)
+        acquired.set()
+
+    threading.Thread(target=worker, daemon=True).start()
+    assert not acquired.wait(0.1)
+    limiter.release(URL, starts[0], 200, 1)
+    assert acquired.wait(1)
+    limiter.release(URL, starts[1], 200, 1)
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+from ..utils.dl import download_file, fetch_file
+from .server import LocalServer
+
+
+def test_download_file_single_request(tmp_path):
+    data = b"%PDF-1.4" + bytes(100 * 1024)
+    with LocalServer({"/book.pdf": data}) as server:
+        file_path = Path(tmp_path, "book.pdf")
+        out = download_file(file_path, server.url("/book.pdf"), {}, 5, True, 8192)
+
+        assert out["status"] == "success"
+        assert out["size"] == len(data)
+        assert file_path.read_bytes() == data
+        assert server.requests == ["/book.pdf"]
+
+
+def test_download_file_not_found(tmp_path):
+    with LocalServer() as server:
+        out = download_file(Path(tmp_path, "none.pdf"), server.url("/none.pdf"), {}, 5)
+        assert out["status"] == "failed"
+        assert len(server.requests) == 1
+
+
+def test_session_keep_alive(tmp_path):
+    files = {f"/details/{i}.json": b'{"id": %d}' % i for i in range(5)}
+    with LocalServer(files) as server:
+        for i in range(5):
+            assert fetch_file(server.url(f"/details/{i}.json"), {}) == {"id": i}
+        assert len(server.requests) == 5
+        assert len(server.connections) == 1
+
+
+def test_download_file_resume(tmp_path):
+    data = bytes(range(256)) * 1024
+    with LocalServer({"/book.pdf": data}) as server:
+        url = server.url("/book.pdf")
+        file_path = Path(tmp_path, "book.pdf")
+        assert download_file(file_path, url, {})["status"] == "success"
+
+        # 模拟中断：只保留一半数据
+        file_path.replace(f"{file_path}.part")
+        with open(f"{file_path}.part", "r+b") as f:
+            f.truncate(len(data) // 2)
+        etag = '"{}"'.format(hashlib.md5(data).hexdigest())
+        journal = {"url": url, "size": len(data), "etag": etag, "last_modified": None}
+        Path(f"{file_path}.part.json").write_text(json.dumps(journal))
+
+        out = download_file(file_path, url, {})
+        assert out["status"] == "success" and out["code"] == 206
+        assert file_path.read_bytes() == data
+        assert server.ranges[-1] == f"bytes={len(data) // 2}-"
+        assert not Path(f"{file_path}.part").exists()
+        assert not Path(f"{file_path}.part.json").exists()
+
+
+def test_download_file_resume_ignored(tmp_path):
+    data = bytes(range(256)) * 64
+    with LocalServer({"/book.pdf": data}, accept_ranges=False) as server:
+        url = server.url("/book.pdf")
+        file_path = Path(tmp_path, "book.pdf")
+        Path(f"{file_path}.part").write_bytes(b"x" * 100)
+        journal = {"url": url, "size": len(data), "etag": None, "last_modified": None}
+        Path(f"{file_path}.part.json").write_text(json.dumps(journal))
+
+        out = download_file(file_path, url, {})
+        assert out["status"] == "success" and out["code"] == 200
+        assert file_path.read_bytes() == data
+
+
+def test_download_file_resume_wrong_range(tmp_path):
+    # 续传时服务器返回的范围起点不对：丢弃.part文件，不使用Range从头下载
+    data = bytes(range(256)) * 64
+    with LocalServer({"/book.pdf": data}, range_shift=100) as server:
+        url = server.url("/book.pdf")
+        file_path = Path(tmp_path, "book.pdf")
+        Path(f"{file_path}.part").write_bytes(data[:1000])
+        journal = {"url": url, "size": len(data), "etag": None, "last_modified": None}
+        Path(f"{file_path}.part.json").write_text(json.dumps(journal))
+
+        out = download_file(file_path, url, {})
+        assert out["status"] == "success" and out["code"] == 200
+        assert file_path.read_bytes() == data
+        assert server.ranges == ["bytes=1000-", None]
+        assert not Path(f"{file_path}.part.json").exists()
+
+
+def test_download_file_resume_shrunk(tmp_path):
+    # 服务器上的文件变小，续传返回416：删除.part文件后从头下载
+    data = bytes(range(256)) * 16
+    with LocalServer({"/book.pdf": data}, etag=False) as server:
+        url = server.url("/book.pdf")
+        file_path = Path(tmp_path, "book.pdf")
+        Path(f"{file_path}.part").write_bytes(b"x" * (len(data) + 100))
+        journal = {"url": url, "size": len(data) * 2, "etag": None, "last_modified": None}
+        Path(f"{file_path}.part.json").write_text(json.dumps(journal))
+
+        out = download_file(file_path, url, {})
+        assert out["status"] == "success" and out["code"] == 200
+        assert file_path.read_bytes() == data
+        assert server.ranges == [f"bytes={len(data) + 100}-", None]
+        assert not Path(f"{file_path}.part").exists()
+        assert not Path(f"{file_path}.part.json").exists()
+
+
+def test_download_file_segmented(tmp_path):
+    data = bytes(range(256)) * 4096  # 1M
+    with LocalServer({"/video.mp4": data}) as server:
+        file_path = Path(tmp_path, "video.mp4")
+        out = download_file(file_path, server.url("/video.mp4"), {}, segment_size=100 * 1024)
+
+        assert out["status"] == "success" and out["size"] == len(data)
+        assert file_path.read_bytes() == data
+        assert len(server.requests) == 11
+        assert not Path(f"{file_path}.part.json").exists()
+
+
+def test_download_file_segmented_threshold(tmp_path):
+    data = bytes(range(256)) * 4096  # 1M
+    with LocalServer({"/video.mp4": data, "/book.pdf": data[:300 * 1024]}) as server:
+        # 超过阈值的文件按segment_size分段，第一段来自探测请求
+        file_path = Path(tmp_path, "video.mp4")
+        url = server.url("/video.mp4")
+        segments = {"segment_size": 256 * 1024, "segment_threshold": 512 * 1024}
+        out = download_file(file_path, url, {}, **segments)
+        assert out["status"] == "success" and file_path.read_bytes() == data
+        assert server.ranges[0] == "bytes=0-"
+        expected = [f"bytes={i * 256 * 1024}-{(i + 1) * 256 * 1024 - 1}" for i in range(1, 4)]
+        assert sorted(server.ranges[1:]) == expected
+
+        # 不超过阈值的文件由探测请求一次读完
+        server.ranges.clear()
+        file_path = Path(tmp_path, "book.pdf")
+        url = server.url("/book.pdf")
+        segments["segment_size"] = 100 * 1024
+        out = download_file(file_path, url, {}, **segments)
+        assert out["status"] == "success" and file_path.read_bytes() == data[:300 * 1024]
+        assert server.ranges == ["bytes=0-"]
+
+
+def test_download_file_segmented_resume(tmp_path):
+    data = bytes(range(256)) * 4096
+    segment_size = 256 * 1024
+    with LocalServer({"/video.mp4": data}) as server:
+        url = server.url("/video.mp4")
+        file_path = Path(tmp_path, "video.mp4")
+        part_file = Path(f"{file_path}.part")
+        part_file.write_bytes(data[:segment_size] + bytes(len(data) - segment_size))
+        segments = {"size": segment_size, "workers": 2, "done": [0]}
+        journal = {"url": url, "size": len(data), "etag": None, "segments": segments}
+        Path(f"{file_path}.part.json").write_text(json.dumps(journal))
+
+        out = download_file(file_path, url, {}, segment_size=segment_size)
+        assert out["status"] == "success"
+        assert file_path.read_bytes() == data
+        expected = [f"bytes={i * segment_size}-{(i + 1) * segment_size - 1}" for i in range(1, 4)]
+        assert sorted(server.ranges) == expected
+
+
+def test_download_file_segmented_ignored(tmp_path):
+    data = bytes(range(256)) * 4096
+    with LocalServer({"/video.mp4": data}, accept_ranges=False) as server:
+        file_path = Path(tmp_path, "video.mp4")
+        out = download_file(file_path, server.url("/video.mp4"), {}, segment_size=100 * 1024)
+
+        assert out["status"] == "success" and out["code"] == 200
+        assert file_path.read_bytes() == data
+        assert len(server.requests) == 1
+
+
+class CancelAfter(threading.Event):
+    """检查count次后取消"""
+
+    def __init__(self, count):
+        super().__init__()
+        self.count = count
+        self.lock = threading.Lock()
+
+    def is_set(self):
+        with self.lock:
+            self.count -= 1
+            if self.count < 0:
+                self.set()
+        return super().is_set()
+
+
+def test_download_file_cancel(tmp_path):
+    data = bytes(range(256)) * 1024
+    with LocalServer({"/book.pdf": data}) as server:
+        url = server.url("/book.pdf")
+        file_path = Path(tmp_path, "book.pdf")
+        out = download_file(file_path, url, {}, chunk_size=8192, cancel=CancelAfter(4))
+        # 取消时保留已下载的部分和记录
+        assert out["status"] == "cancelled"
+        assert not file_path.exists()
+        assert Path(f"{file_path}.part").stat().st_size == 4 * 8192
+        assert Path(f"{file_path}.part.json").exists()
+
+        out = download_file(file_path, url, {})
+        assert out["status"] == "success" and out["code"] == 206
+        assert server.ranges[-1] == f"bytes={4 * 8192}-"
+        assert file_path.read_bytes() == data
+
+
+def test_download_file_segmented_cancel(tmp_path):
+    data = bytes(range(256)) * 4096
+    segment_size = 100 * 1024
+    with LocalServer({"/video.mp4": data}) as server:
+        url = server.url("/video.mp4")
+        file_path = Path(tmp_path, "video.mp4")
+        cancel = CancelAfter(30)
+        out = download_file(file_path, url, {}, segment_size=segment_size, cancel=cancel)
+        assert out["status"] == "cancelled"
+        journal = json.loads(Path(f"{file_path}.part.json").read_text())
+        assert 0 < len(journal["segments"]["done"]) < 11
+
+        server.ranges.clear()
+        out = download_file(file_path, url, {}, segment_size=segment_size)
+        assert out["status"] == "success"
+        assert file_path.read_bytes() == data
+        # 只下载未完成的分段
+        assert len(server.ranges) == 11 - len(journal["segments"]["done"])
@@ -0,0 +1,330 @@
+import asyncio
+import inspect
+import json
+import threading
+import time
+from functools import partial
+
+import pytest
+
+from .. import downloader_async, parser
+from ..downloader import download_pipeline, fetch_resources, iter_resources
+from ..parser import extract_resource_url, parse_urls
+from ..utils import dl
+from ..utils.concurrency import DEFAULT_CEILING
+from .server import LocalServer
+from .test_dl import CancelAfter
+
+
+def make_files(server_url, count):
+    files = {}
+    for i in range(count):
+        pdf_url = server_url(f"/assets/{i}/pdf.pdf")
+        ti_items = [{"ti_format": "pdf", "ti_storages": [pdf_url]}]
+        config = {"title": f"book-{i}", "ti_items": ti_items}
+        files[f"/details/{i}.json"] = json.dumps(config).encode()
+        files[f"/assets/{i}/pdf.pdf"] = b"%PDF" + bytes(1000 * i)
+    return files
+
+
+def test_download_pipeline(tmp_path):
+    with LocalServer() as server:
+        server.files.update(make_files(server.url, 6))
+        config_urls = [server.url(f"/details/{i}.json") for i in range(6)]
+        events = []
+
+        resource_list, results = download_pipeline(
+            config_urls,
+            lambda data: extract_resource_url(data, ["pdf"]),
+            tmp_path,
+            max_workers=2,
+            callback=lambda event, data: events.append(event),
+            use_cache=False,
+        )
+
+        assert len(resource_list) == 6
+        assert sorted(r["status"] for r in results) == ["success"] * 6
+        assert sorted(p.name for p in tmp_path.glob("*.pdf")) == [f"book-{i}.pdf" for i in range(6)]
+        assert events.count("resource") == 6 and events.count("result") == 6
+        assert events.count("resolved") == 1
+
+
+def test_download_pipeline_cancel(tmp_path):
+    with LocalServer(delay=0.05) as server:
+        server.files.update(make_files(server.url, 20))
+        config_urls = [server.url(f"/details/{i}.json") for i in range(20)]
+        cancel = threading.Event()
+
+        def callback(event, data):
+            if event == "result":
+                cancel.set()
+
+        resource_list, results = download_pipeline(
+            config_urls,
+            lambda data: extract_resource_url(data, ["pdf"]),
+            tmp_path,
+            max_workers=1,
+            callback=callback,
+            cancel=cancel,
+            use_cache=False,
+        )
+
+        # 取消后其余的不再下载
+        statuses = [r["status"] for r in results]
+        assert len(results) == len(resource_list) < 20
+        assert set(statuses) == {"success", "cancelled"} and statuses.count("success") <= 2
+        assert len(list(tmp_path.glob("*.pdf"))) == statuses.count("success")
+
+
+def test_download_pipeline_cancel_in_flight(tmp_path):
+    # 正在下载的文件也停止，保留.part文件，再次下载时续传
+    data = bytes(range(256)) * 4096
+    with LocalServer() as server:
+        ti_items = [{"ti_format": "pdf", "ti_storages": [server.url("/assets/pdf.pdf")]}]
+        config = {"title": "book", "ti_items": ti_items}
+        server.files["/details/0.json"] = json.dumps(config).encode()
+        server.files["/assets/pdf.pdf"] = data
+        pipeline = partial(
+            download_pipeline,
+            [server.url("/details/0.json")],
+            lambda data: extract_resource_url(data, ["pdf"]),
+            tmp_path,
+            use_cache=False,
+        )
+
+        _, results = pipeline(cancel=CancelAfter(10))
+        assert [r["status"] for r in results] == ["cancelled"]
+        size = (tmp_path / "book.pdf.part").stat().st_size
+        assert 0 < size < len(data)
+
+        _, results = pipeline()
+        assert [r["status"] for r in results] == ["success"]
+        assert server.ranges[-1] == f"bytes={size}-"
+        assert (tmp_path / "book.pdf").read_bytes() == data
+
+
+def test_download_pipeline_empty(tmp_path):
+    with LocalServer() as server:
+        resource_list, results = download_pipeline(
+            [server.url("/details/none.json")], lambda data: [], tmp_path, use_cache=False
+        )
+        assert resource_list == [] and results == []
+
+
+def test_download_async(tmp_path):
+    with LocalServer() as server:
+        server.files.update(make_files(server.url, 20))
+        config_urls = [server.url(f"/details/{i}.json") for i in range(20)]
+        resource_list, results = downloader_async.download_async(
+            config_urls,
+            lambda data: extract_resource_url(data, ["pdf"]),
+            tmp_path,
+            download_limit=4,
+            per_host=4,
+            use_cache=False,
+        )
+
+        assert len(resource_list) == 20
+        assert sorted(r["status"] for r in results) == ["success"] * 20
+        assert len(list(tmp_path.glob("*.pdf"))) == 20
+
+
+def test_download_async_host_limit(monkeypatch):
+    # 配置请求按实际请求的镜像主机占用并发名额
+    acquired = []
+
+    class RecordingLimiter(downloader_async.HostLimiter):
+        def __call__(self, url):
+            acquired.append(url)
+            return super().__call__(url)
+
+    with LocalServer() as down, LocalServer({"/details/1.json": b'{"id": 1}'}) as up:
+        down.errors["/details/1.json"] = [503]
+        urls = [down.url("/details/1.json"), up.url("/details/1.json")]
+        monkeypatch.setattr(dl, "ranked_urls", lambda url: urls)
+
+        async def fetch():
+            async with downloader_async.aiohttp.ClientSession() as session:
+                host_limit = RecordingLimiter(1)
+                return await downloader_async._fetch_json(
+                    session, urls[0], {}, 5, None, host_limit=host_limit
+                )
+
+        assert asyncio.run(fetch()) == {"id": 1}
+        assert acquired == urls
+
+
+def test_download_async_requires_aiohttp(tmp_path, monkeypatch):
+    # 未安装aiohttp时明确报错，不改用线程请求配置
+    monkeypatch.setattr(downloader_async, "aiohttp", None)
+    assert not downloader_async.is_available()
+    with pytest.raises(ImportError):
+        downloader_async.download_async([], lambda data: [], tmp_path)
+
+
+def test_download_async_bounded(tmp_path, monkeypatch):
+    # 下载阻塞时，解析只领先有界队列的长度，不为每个资源创建任务
+    release = threading.Event()
+
+    def blocked_download(limiter, resource, *args):
+        release.wait(5)
+        return {"url": resource[2], "status": "success", "code": 200}
+
+    monkeypatch.setattr(downloader_async, "_download_limited", blocked_download)
+    resolved = []
+    pending = []
+
+    def unblock():
+        pending.append(len(resolved))
+        release.set()
+
+    def callback(event, data):
+        if event == "resource":
+            resolved.append(data)
+
+    timer = threading.Timer(0.5, unblock)
+    with LocalServer() as server:
+        server.files.update(make_files(server.url, 20))
+        config_urls = [server.url(f"/details/{i}.json") for i in range(20)]
+        timer.start()
+        _, results = downloader_async.download_async(
+            config_urls,
+            lambda data: extract_resource_url(data, ["pdf"]),
+            tmp_path,
+            callback=callback,
+            fetch_limit=2,
+            download_limit=2,
+            use_cache=False,
+        )
+
+    # 2个下载中、2个在队列中、每个解析worker最多再等待放入1个
+    assert pending[0] <= 6
+    assert len(results) == 20
+
+
+def test_download_async_errors(tmp_path, monkeypatch):
+    # 单个配置处理出错时，其他配置照常解析、下载
+    process_config = downloader_async._process_config
+
+    def failing(entry, url, data, extract_func):
+        if url.endswith("/3.json"):
+            raise RuntimeError("broken config")
+        return process_config(entry, url, data, extract_func)
+
+    monkeypatch.setattr(downloader_async, "_process_config", failing)
+    with LocalServer() as server:
+        server.files.update(make_files(server.url, 5))
+        config_urls = [server.url(f"/details/{i}.json") for i in range(5)]
+        resource_list, results = downloader_async.download_async(
+            config_urls,
+            lambda data: extract_resource_url(data, ["pdf"]),
+            tmp_path,
+            use_cache=False,
+        )
+
+    assert len(resource_list) == 4
+    assert sorted(r["status"] for r in results) == ["success"] * 4
+
+
+def test_parse_urls_backup():
+    url = "https://basic.smartedu.cn/tchMaterial/detail?contentType=assets_document&contentId=1"
+    assert all(isinstance(u, str) for u in parse_urls([url], ["pdf"], False))
+    config_urls = parse_urls([url], ["pdf"], True)
+    assert len(config_urls) == 1 and len(config_urls[0]) == 4
+
+
+@pytest.mark.parametrize("engine", ["thread", "async"])
+def test_backup_fallback(tmp_path, engine):
+    with LocalServer() as server:
+        files = make_files(server.url, 2)
+        # 0号主配置不存在，使用第一个可用的备用配置
+        files["/backup/0.json"] = files.pop("/details/0.json")
+        files["/backup2/0.json"] = files["/backup/0.json"]
+        server.files.update(files)
+        config_urls = [
+            [server.url(f"/details/{i}.json"), server.url(f"/backup/{i}.json")]
+            + [server.url(f"/backup2/{i}.json")]
+            for i in range(2)
+        ]
+        extract_func = lambda data: extract_resource_url(data, ["pdf"])
+
+        if engine == "thread":
+            resource_list = fetch_resources(config_urls, extract_func, use_cache=False)
+        else:
+            resource_list, _ = downloader_async.download_async(
+                config_urls, extract_func, tmp_path, use_cache=False
+            )
+
+        assert sorted(r[1] for r in resource_list) == [
+            server.url("/backup/0.json"),
+            server.url("/details/1.json"),
+        ]
+        config_requests = [p for p in server.requests if p.endswith(".json")]
+        assert sorted(config_requests) == ["/backup/0.json", "/details/0.json", "/details/1.json"]
+
+
+def test_iter_resources_lazy():
+    with LocalServer() as server:
+        server.files.update(make_files(server.url, 50))
+        consumed = []
+
+        def config_urls():
+            for i in range(50):
+                consumed.append(i)
+                yield server.url(f"/details/{i}.json")
+
+        extract_func = lambda data: extract_resource_url(data, ["pdf"])
+        resources = iter_resources(config_urls(), extract_func, max_workers=2, use_cache=False)
+        next(resources)
+        # 同时进行的请求不超过 max_workers * 2 个
+        assert len(consumed) <= 8
+        assert len(list(resources)) == 49
+
+
+def test_parse_urls_staged():
+    url = "https://basic.smartedu.cn/sport/courseDetail?courseId=1&tag=篮球"
+    config_urls = parse_urls([url], ["pdf"], False)
+    assert config_urls[0]["url"].endswith("/business_courses/1/course_relative_infos/zh-CN.json")
+    children = config_urls[0]["expand"]({"a": [{"activity_set_id": "x"}, {"activity_set_id": "x"}]})
+    assert [c["url"].split("/")[-2] for c in children] == ["x"]
+
+
+@pytest.mark.parametrize("engine", ["thread", "async"])
+def test_staged_resolve(tmp_path, engine):
+    count = 5
+    with LocalServer(delay=0.2) as server:
+        course = {"nodes": [{"child": {"activity_set_id": f"set-{i}"}} for i in range(count)]}
+        server.files["/course/zh-CN.json"] = json.dumps(course).encode()
+        for i in range(count):
+            pdf_url = server.url(f"/assets/{i}/pdf.pdf")
+            ti_items = [{"ti_format": "pdf", "ti_storages": [pdf_url]}]
+            item = {"title": f"doc-{i}", "ti_items": ti_items}
+            fulls = {"activities": [{"resources": [item]}]}
+            server.files[f"/sets/set-{i}/fulls.json"] = json.dumps(fulls).encode()
+            server.files[f"/assets/{i}/pdf.pdf"] = b"%PDF" + bytes(100)
+
+        template = server.url("/sets/{activity_set_id}/fulls.json")
+        expand = partial(parser._expand_activity_sets, template)
+        config_urls = [{"url": server.url("/course/zh-CN.json"), "expand": expand}]
+        extract_func = lambda data: extract_resource_url(data, ["pdf"])
+
+        start = time.perf_counter()
+        if engine == "thread":
+            resource_list = fetch_resources(config_urls, extract_func, use_cache=False, hedge=False)
+        else:
+            resource_list, _ = downloader_async.download_async(
+                config_urls, extract_func, tmp_path, use_cache=False, hedge=False
+            )
+        # 活动集详情并发请求
+        assert time.perf_counter() - start < 0.2 * (count + 1)
+        assert sorted(r[0] for r in resource_list) == [f"doc-{i}.pdf" for i in range(count)]
+
+
+def test_fetch_workers_default():
+    # 未指定时配置请求的并发数与下载并发上限相同，不再固定为5
+    for func, name in [
+        (iter_resources, "max_workers"),
+        (fetch_resources, "max_workers"),
+        (download_pipeline, "fetch_workers"),
+    ]:
+        assert inspect.signature(func).parameters[name].default == DEFAULT_CEILING
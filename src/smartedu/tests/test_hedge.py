@@ -0,0 +1,87 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import downloader_async
+from ..utils import dl, hedge
+from ..utils.cache import ResponseCache
+from ..utils.retry import RetryPolicy
+from .server import LocalServer
+
+
+def test_latency_tracker():
+    tracker = hedge.LatencyTracker()
+    for i in range(hedge.MIN_SAMPLES - 1):
+        tracker.record(0.01)
+    assert tracker.delay() is None
+
+    for i in range(100):
+        tracker.record(i / 100)
+    assert 0.9 <= tracker.delay() <= 0.95
+
+
+def test_hedged_fetch(monkeypatch):
+    files = {"/details/1.json": b'{"id": 1}'}
+    with LocalServer(files, delay=2) as slow, LocalServer(files) as fast:
+        slow_url, fast_url = slow.url("/details/1.json"), fast.url("/details/1.json")
+        monkeypatch.setattr(hedge, "ranked_urls", lambda url: [slow_url, fast_url])
+        tracker = hedge.LatencyTracker()
+        for _ in range(hedge.MIN_SAMPLES):
+            tracker.record(0.05)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            start = time.perf_counter()
+            data = hedge.hedged_fetch(slow_url, {}, 5, "json", None, executor, tracker)
+            assert data == {"id": 1}
+            assert time.perf_counter() - start < 1
+            assert fast.requests == ["/details/1.json"]
+
+
+def test_hedged_fetch_no_samples(monkeypatch):
+    files = {"/details/1.json": b'{"id": 1}'}
+    with LocalServer(files) as primary, LocalServer(files) as backup:
+        urls = [primary.url("/details/1.json"), backup.url("/details/1.json")]
+        monkeypatch.setattr(hedge, "ranked_urls", lambda url: urls)
+
+        tracker = hedge.LatencyTracker()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            data = hedge.hedged_fetch(urls[0], {}, 5, "json", None, executor, tracker)
+            assert data == {"id": 1}
+            assert backup.requests == []
+
+
+def test_hedged_fetch_cache_once(tmp_path, monkeypatch):
+    # 对冲请求只读取一次缓存、只计入一次重试预算，同步和asyncio引擎相同
+    files = {"/details/1.json": b'{"id": 1}'}
+    with LocalServer(files, delay=1) as slow, LocalServer(files) as fast:
+        urls = [slow.url("/details/1.json"), fast.url("/details/1.json")]
+        monkeypatch.setattr(hedge, "ranked_urls", lambda url: urls)
+        monkeypatch.setattr(dl, "ranked_urls", lambda url: urls)
+
+        lookups = []
+        cache = ResponseCache(tmp_path)
+        get = cache.get
+        monkeypatch.setattr(cache, "get", lambda url: lookups.append(url) or get(url))
+        tracker = hedge.LatencyTracker()
+        for _ in range(hedge.MIN_SAMPLES):
+            tracker.record(0.05)
+
+        policy = RetryPolicy()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            data = hedge.hedged_fetch(urls[0], {}, 5, "json", cache, executor, tracker, policy)
+        assert data == {"id": 1}
+        assert len(lookups) == 1 and policy.budget.requests == 1
+
+        async def fetch(url):
+            async with downloader_async.aiohttp.ClientSession() as session:
+                return await downloader_async._fetch_hedged(
+                    session, url, {}, 5, cache, tracker, policy
+                )
+
+        # 另一个未缓存的配置
+        lookups.clear()
+        policy = RetryPolicy()
+        files["/details/2.json"] = b'{"id": 2}'
+        urls[:] = [slow.url("/details/2.json"), fast.url("/details/2.json")]
+        assert asyncio.run(fetch(urls[0])) == {"id": 2}
+        assert len(lookups) == 1 and policy.budget.requests == 1
@@ -0,0 +1,161 @@
+import json
+import random
+from pathlib import Path
+
+from .. import downloader
+from ..parser import extract_resource_url, get_formats
+from ..utils.dl import check_modified
+from ..utils.file import gen_filename, release_filename
+from ..utils.hls import download_hls, parse_playlist
+from .server import LocalServer
+from .test_dl import CancelAfter
+
+MASTER = b"""#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=400000,RESOLUTION=640x360,CODECS="avc1,mp4a"
+low/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=1200000,RESOLUTION=1280x720
+high/index.m3u8
+"""
+
+
+def make_files(count):
+    segments = [f"#EXTINF:10.0,\nseg-{i}.ts" for i in range(count)]
+    files = {
+        "/video/master.m3u8": MASTER,
+        "/video/high/index.m3u8": "\n".join(["#EXTM3U", *segments, "#EXT-X-ENDLIST"]).encode(),
+        "/video/low/index.m3u8": b"#EXTM3U\n#EXTINF:10.0,\nlow.ts\n",
+    }
+    for i in range(count):
+        files[f"/video/high/seg-{i}.ts"] = f"<segment {i}>".encode() * 100
+    return files
+
+
+def test_parse_playlist():
+    playlist = parse_playlist(MASTER.decode(), "https://a/video/master.m3u8")
+    assert playlist["variants"] == [
+        (400000, "https://a/video/low/index.m3u8"),
+        (1200000, "https://a/video/high/index.m3u8"),
+    ]
+    text = '#EXTM3U\n#EXT-X-KEY:METHOD=AES-128,URI="k"\n#EXT-X-MAP:URI="init.mp4"\n/s/1.m4s\n'
+    playlist = parse_playlist(text, "https://a/v/index.m3u8")
+    assert playlist["encrypted"] and playlist["init"] == "https://a/v/init.mp4"
+    assert playlist["segments"] == ["https://a/s/1.m4s"]
+
+
+def test_download_hls(tmp_path):
+    files = make_files(50)
+    expected = b"".join(files[f"/video/high/seg-{i}.ts"] for i in range(50))
+    with LocalServer(files, delay=lambda: random.random() * 0.01) as server:
+        out = download_hls(tmp_path / "a.ts", server.url("/video/master.m3u8"), {})
+        assert out["status"] == "success" and out["size"] == len(expected)
+        assert (tmp_path / "a.ts").read_bytes() == expected
+        assert "/video/low/low.ts" not in server.requests
+
+
+def test_download_hls_unchanged(tmp_path):
+    # 没有ETag时按播放列表（而不是拼接后视频）的大小和Last-Modified判断是否有更新
+    files = make_files(5)
+    last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+    with LocalServer(files, etag=False, last_modified=last_modified) as server:
+        url = server.url("/video/master.m3u8")
+        out = download_hls(tmp_path / "a.ts", url, {})
+        assert out["status"] == "success" and out["last_modified"] == last_modified
+        assert out["remote_size"] == len(MASTER) != out["size"]
+        assert not check_modified(url, {}, out)
+
+        server.files["/video/master.m3u8"] = MASTER + b"\n"
+        assert check_modified(url, {}, out)
+
+
+def test_download_hls_fmp4(tmp_path):
+    # 带 #EXT-X-MAP 的fMP4：初始化段在前，保存为.mp4
+    segments = [f"#EXTINF:4.0,\nseg-{i}.m4s" for i in range(3)]
+    playlist = ["#EXTM3U", '#EXT-X-MAP:URI="init.mp4"', *segments, "#EXT-X-ENDLIST"]
+    files = {"/video/index.m3u8": "\n".join(playlist).encode(), "/video/init.mp4": b"<init>"}
+    for i in range(3):
+        files[f"/video/seg-{i}.m4s"] = f"<fragment {i}>".encode()
+    expected = b"<init>" + b"".join(files[f"/video/seg-{i}.m4s"] for i in range(3))
+    with LocalServer(files) as server:
+        (tmp_path / "a.mp4").write_bytes(b"other")
+        out = download_hls(tmp_path / "a.ts", server.url("/video/index.m3u8"), {})
+        assert out["status"] == "success"
+        # 不覆盖已有的同名文件
+        assert out["file"] == str(tmp_path / "a(1).mp4")
+        assert (tmp_path / "a(1).mp4").read_bytes() == expected
+        assert (tmp_path / "a.mp4").read_bytes() == b"other"
+        assert not list(tmp_path.glob("a.ts*"))
+
+
+def test_download_hls_fmp4_claim(tmp_path, monkeypatch):
+    # 写入.mp4之前文件名一直被占用，同时下载的其他文件不会选中同一个文件名
+    files = {
+        "/video/index.m3u8": b'#EXTM3U\n#EXT-X-MAP:URI="init.mp4"\n#EXTINF:4.0,\nseg.m4s\n',
+        "/video/init.mp4": b"<init>",
+        "/video/seg.m4s": b"<fragment>",
+    }
+    replace, others = Path.replace, []
+
+    def replace_spy(self, target):
+        others.append(gen_filename(None, "a.mp4", tmp_path))
+        release_filename(others[-1])
+        return replace(self, target)
+
+    monkeypatch.setattr(Path, "replace", replace_spy)
+    with LocalServer(files) as server:
+        out = download_hls(tmp_path / "a.ts", server.url("/video/index.m3u8"), {})
+    assert out["status"] == "success" and out["file"] == str(tmp_path / "a.mp4")
+    assert others == [tmp_path / "a(1).mp4"]
+    # 完成后释放文件名
+    (tmp_path / "a.mp4").unlink()
+    assert gen_filename(None, "a.mp4", tmp_path) == tmp_path / "a.mp4"
+    release_filename(tmp_path / "a.mp4")
+
+
+def test_download_hls_resume(tmp_path):
+    files = make_files(50)
+    with LocalServer(files) as server:
+        url = server.url("/video/master.m3u8")
+        server.errors["/video/high/seg-30.ts"] = [500] * 3
+        out = download_hls(tmp_path / "a.ts", url, {})
+        assert out["status"] == "failed" and out["code"] == -1
+        assert (tmp_path / "a.ts.part.json").exists()
+
+        # 续传时不再请求已写入的分片
+        server.requests.clear()
+        out = download_hls(tmp_path / "a.ts", url, {})
+        assert out["status"] == "success"
+        assert "/video/high/seg-29.ts" not in server.requests
+        assert "/video/high/seg-30.ts" in server.requests
+        expected = b"".join(files[f"/video/high/seg-{i}.ts"] for i in range(50))
+        assert (tmp_path / "a.ts").read_bytes() == expected
+        assert not (tmp_path / "a.ts.part.json").exists()
+
+
+def test_download_hls_cancel(tmp_path):
+    files = make_files(50)
+    with LocalServer(files) as server:
+        url = server.url("/video/master.m3u8")
+        out = download_hls(tmp_path / "a.ts", url, {}, cancel=CancelAfter(10))
+        assert out["status"] == "cancelled"
+        journal = json.loads((tmp_path / "a.ts.part.json").read_text())
+        assert journal["written"] == 10
+
+        server.requests.clear()
+        out = download_hls(tmp_path / "a.ts", url, {})
+        assert out["status"] == "success"
+        assert "/video/high/seg-9.ts" not in server.requests
+        expected = b"".join(files[f"/video/high/seg-{i}.ts"] for i in range(50))
+        assert (tmp_path / "a.ts").read_bytes() == expected
+
+
+def test_video_resource(tmp_path):
+    assert get_formats("pdf,mp4") == ["pdf", "mp4"]
+    with LocalServer(make_files(5)) as server:
+        ti_items = [{"ti_format": "m3u8", "ti_storages": [server.url("/video/master.m3u8")]}]
+        resources = extract_resource_url({"title": "第一课", "ti_items": ti_items}, ["mp4"])
+        assert [r[0] for r in resources] == ["第一课.ts"]
+
+        name, resource_url, fix_url = resources[0]
+        out = downloader._download_file(resource_url, name, tmp_path, "", fix_url)
+        assert out["status"] == "success"
+        assert (tmp_path / "第一课.ts").stat().st_size == out["size"]
@@ -0,0 +1,52 @@
+import json
+
+from ..configs.tags import BookItem, TagHierarchy
+from ..index import build_index, load_index
+from ..loader import update_hierarchies
+
+DATA_DIR = "../data/v2/tchMaterial"
+
+
+def load_hierarchy():
+    with open(f"{DATA_DIR}/tch_material_tag.json", encoding="utf-8") as f:
+        tag_data = json.load(f)
+    with open(f"{DATA_DIR}/part_103.json", encoding="utf-8") as f:
+        parts_data = json.load(f)
+
+    tag_dict = {tag["tag_id"]: tag["tag_name"] for e in parts_data for tag in e["tag_list"]}
+    book_list = [
+        BookItem(e["id"], e["title"], tag_path, tag_path.split("/")[-1])
+        for e in parts_data
+        for tag_path in e["tag_paths"]
+    ]
+    tag_hier = TagHierarchy.from_dict(0, tag_data)
+    return update_hierarchies(tag_hier, tag_dict, book_list)
+
+
+def assert_same(node, index_node):
+    assert node.level == index_node.level
+    assert (node.name, node.tag_id, node.tag_name) == (
+        index_node.name,
+        index_node.tag_id,
+        index_node.tag_name,
+    )
+    assert node.get_options() == index_node.get_options()
+    assert len(node.children) == len(index_node.children)
+    if node.book_item:
+        assert index_node.book_item.book_id == node.book_item.book_id
+        assert index_node.book_item.tag_path == node.book_item.tag_path
+    for child, index_child in zip(node.children, index_node.children):
+        assert_same(child, index_child)
+
+
+def test_build_and_load_index(tmp_path):
+    tag_hier = load_hierarchy()
+    version = {"module_version": 1, "urls": "part_103.json"}
+    index_file = tmp_path / "tchMaterial.idx"
+    build_index(tag_hier, version, index_file)
+
+    index_root = load_index(index_file, version)
+    assert_same(tag_hier, index_root)
+
+    # 数据版本变化时索引失效
+    assert load_index(index_file, {"module_version": 2, "urls": "part_103.json"}) is None
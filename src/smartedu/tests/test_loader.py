@@ -1,4 +1,7 @@
-from ..loader import fetch_metadata
+from .. import loader
+from ..configs.tags import TagHierarchy
+from ..index import build_index
+from ..loader import fetch_metadata, query_metadata
 
 
 def test_fetch_metadata():
@@ -22,3 +25,53 @@ def test_fetch_metadata():
             assert current.book_item.book_name == book
             break
         current = current.children[index]
+
+
+def test_fetch_metadata_lazy(monkeypatch):
+    loaded = []
+    load_json = loader._load_json
+
+    def spy(version_name, url, *args, **kwargs):
+        loaded.append(url.split("/")[-1])
+        return load_json(version_name, url, *args, **kwargs)
+
+    monkeypatch.setattr(loader, "_load_json", spy)
+    meta_data = fetch_metadata("../data/v2/", True, False, name="/syncClassroom")
+    assert meta_data.name == "学段"
+
+    # 中间层级只用标签文件构建，不读取分片
+    current = meta_data
+    for tag_name in ["小学", "一年级", "语文", "统编版", "上册", "新教材"]:
+        parent = current
+        current = next(child for child in current.children if child.tag_name == tag_name)
+    assert loaded == ["national_lesson_tag.json", "data_version.json"]
+
+    title, options, children, is_book = query_metadata(current)
+    assert is_book
+    assert options == [(children[0].book_item.book_id, "《新教材-小学语文统编版一年级上册》")]
+    assert children[0].book_item.tag_path.startswith(meta_data.tag_id + "/")
+    assert sorted(loaded[2:]) == ["part_100.json", "part_101.json", "part_102.json"]
+
+    # 分片只读取一次
+    for leaf in parent.children:
+        query_metadata(leaf)
+    assert len(loaded) == 5
+
+
+def test_fetch_metadata_index_offline(tmp_path, monkeypatch):
+    # 已有索引时只用较短的超时请求一个镜像检查版本，离线时直接使用索引
+    index_file = tmp_path / "tchMaterial.idx"
+    monkeypatch.setattr(loader, "get_index_file", lambda name: index_file)
+    tag_hier = TagHierarchy.from_dict(0, {"tag_path": "root", "hierarchies": []})
+    build_index(tag_hier, {"module_version": 1}, index_file)
+
+    requests = []
+
+    def offline(url, headers, timeout, data_format, cache, failover=True):
+        requests.append((url.split("/")[-1], timeout, failover))
+        return None
+
+    monkeypatch.setattr(loader, "_fetch_timed", offline)
+    meta_data = fetch_metadata()
+    assert meta_data.tag_id == "root"
+    assert requests == [("data_version.json", loader.VERSION_CHECK_TIMEOUT, False)]
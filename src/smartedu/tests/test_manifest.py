@@ -0,0 +1,48 @@
+import sqlite3
+
+from ..downloader import download_files
+from ..utils.manifest import DownloadManifest, MANIFEST_NAME
+from .server import LocalServer
+
+CONTENT_ID = "1c73b348-e8b6-47d6-84b0-6dbacbe28268"
+
+
+def test_incremental_download(tmp_path):
+    files = {"/a/pdf.pdf": b"%PDF-a" * 1000, "/b/pdf.pdf": b"%PDF-b" * 1000}
+    with LocalServer(files) as server:
+        raw_url = f"https://s-file-1.ykt.cbern.com.cn/details/{CONTENT_ID}.json"
+        url_list = [
+            [f"{path[1]}.pdf", raw_url, server.url(path), server.url(path)] for path in files
+        ]
+        results = download_files(url_list, tmp_path)
+        assert sorted(r["status"] for r in results) == ["success", "success"]
+
+        # 再次下载，未变化的文件跳过，不产生新文件
+        server.files["/b/pdf.pdf"] = b"%PDF-B" * 1000
+        results = download_files(url_list, tmp_path)
+        status = {r["url"].split("/")[-2]: r["status"] for r in results}
+        assert status == {"a": "skipped", "b": "success"}
+        assert (tmp_path / "b.pdf").read_bytes() == files["/b/pdf.pdf"]
+        assert sorted(p.name for p in tmp_path.glob("*.pdf")) == ["a.pdf", "b.pdf"]
+
+
+def test_manifest_upgrade(tmp_path):
+    # 旧版本的下载记录没有remote_size列，打开时添加，旧记录按文件大小判断
+    conn = sqlite3.connect(tmp_path / MANIFEST_NAME)
+    conn.execute(
+        "CREATE TABLE resources (content_id TEXT NOT NULL, url TEXT NOT NULL, file TEXT NOT NULL, "
+        "size INTEGER, etag TEXT, last_modified TEXT, sha256 TEXT, updated REAL, "
+        "PRIMARY KEY (content_id, url))"
+    )
+    conn.execute("INSERT INTO resources VALUES ('1', '/a.pdf', 'a.pdf', 3, NULL, NULL, '', 0)")
+    conn.commit()
+    conn.close()
+    (tmp_path / "a.pdf").write_bytes(b"abc")
+
+    manifest = DownloadManifest(tmp_path)
+    assert manifest.get("1", "https://r1-ndr.ykt.cbern.com.cn/a.pdf")["remote_size"] == 3
+    (tmp_path / "b.ts").write_bytes(b"video")
+    result = {"file": str(tmp_path / "b.ts"), "size": 5, "remote_size": 1}
+    manifest.update("2", "https://a/b.m3u8", result)
+    assert manifest.get("2", "https://a/b.m3u8")["remote_size"] == 1
+    manifest.close()
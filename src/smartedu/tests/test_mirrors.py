@@ -0,0 +1,103 @@
+from .. import downloader
+from ..utils import dl
+from ..utils.concurrency import AdaptiveLimiter
+from ..utils.mirrors import MirrorScoreboard, mirror_urls
+from .server import LocalServer
+
+
+def test_mirror_urls():
+    url = "https://s-file-2.ykt.cbern.com.cn/zxx/ndrv2/resources/tch_material/details/1.json"
+    assert [u.split(".")[0] for u in mirror_urls(url)] == [
+        "https://s-file-1",
+        "https://s-file-2",
+        "https://s-file-3",
+    ]
+    url = "https://r3-ndr-private.ykt.cbern.com.cn/edu_product/esp/assets/1.pkg/a.pdf"
+    assert mirror_urls(url)[0] == url.replace("r3-", "r1-")
+    assert len(mirror_urls(url)) == 3
+    assert mirror_urls("https://basic.smartedu.cn/tchMaterial") == [
+        "https://basic.smartedu.cn/tchMaterial"
+    ]
+
+
+def test_scoreboard_rank():
+    scoreboard = MirrorScoreboard()
+    urls = ["https://a/x", "https://b/x", "https://c/x"]
+    scoreboard.record("https://a/y", 0.5, True, 1024)
+    scoreboard.record("https://b/y", 0.1, True, 1024)
+    scoreboard.record("https://c/y", 0.05, False)
+    assert scoreboard.rank(urls) == ["https://b/x", "https://a/x", "https://c/x"]
+
+    # 未测量的主机优先尝试
+    assert scoreboard.rank(urls + ["https://d/x"])[0] == "https://d/x"
+
+    # 持续出错后排到最后
+    for _ in range(5):
+        scoreboard.record("https://b/y", 0.1, False)
+    assert scoreboard.rank(urls)[-1] == "https://b/x"
+
+
+def test_fetch_file_failover(monkeypatch):
+    with LocalServer() as down_server:
+        down_url = down_server.url("/details/1.json")
+
+    scoreboard = MirrorScoreboard()
+    with LocalServer({"/details/1.json": b'{"id": 1}'}) as server:
+        url = server.url("/details/1.json")
+        monkeypatch.setattr(dl, "get_scoreboard", lambda: scoreboard)
+        monkeypatch.setattr(dl, "ranked_urls", lambda u: [down_url, url])
+        assert dl.fetch_file(url, {}, timeout=1) == {"id": 1}
+        assert scoreboard.rank([down_url, url]) == [url, down_url]
+
+        # 之后直接请求可用的主机
+        monkeypatch.setattr(dl, "ranked_urls", lambda u: scoreboard.rank([down_url, url]))
+        assert dl.fetch_file(url, {}, timeout=1) == {"id": 1}
+        assert len(server.requests) == 2
+
+
+def test_download_failover(tmp_path, monkeypatch):
+    with LocalServer() as down_server:
+        down_url = down_server.url("/a.pdf")
+
+    with LocalServer({"/a.pdf": b"%PDF" + bytes(1000)}) as server:
+        url = server.url("/a.pdf")
+        monkeypatch.setattr(downloader, "ranked_urls", lambda u: [down_url, url])
+
+        out = downloader._download_file(down_url, "a.pdf", tmp_path, "", down_url)
+        assert out["status"] == "success" and out["url"] == url
+        assert (tmp_path / "a.pdf").stat().st_size == 1004
+
+
+def test_download_failover_limiter(tmp_path, monkeypatch):
+    # 并发名额按实际请求的镜像主机占用，换镜像前先释放
+    class RecordingLimiter(AdaptiveLimiter):
+        def __init__(self):
+            super().__init__(ceiling=1, adaptive=False)
+            self.calls = []
+
+        def acquire(self, url):
+            self.calls.append(("acquire", url))
+            return super().acquire(url)
+
+        def release(self, url, start, code, size=0):
+            self.calls.append(("release", url, code))
+            super().release(url, start, code, size)
+
+    with LocalServer() as down_server:
+        down_url = down_server.url("/a.pdf")
+
+    with LocalServer({"/a.pdf": b"%PDF" + bytes(1000)}) as server:
+        url = server.url("/a.pdf")
+        monkeypatch.setattr(downloader, "ranked_urls", lambda u: [down_url, url])
+        limiter = RecordingLimiter()
+
+        out = downloader._download_file(
+            down_url, "a.pdf", tmp_path, "", down_url, limiter=limiter
+        )
+        assert out["status"] == "success"
+        assert limiter.calls == [
+            ("acquire", down_url),
+            ("release", down_url, -1),
+            ("acquire", url),
+            ("release", url, out["code"]),
+        ]
@@ -0,0 +1,80 @@
+import pytest
+
+from ..configs.resources import RESOURCE_DICT
+from ..parser import _extract_params, gen_url_from_tags, iter_config_urls, iter_url_lines
+from ..parser import parse_urls, validate_url
+
+
+def test_parse_urls_no_mutation():
+    url = "https://basic.smartedu.cn/tchMaterial/detail?contentType=assets_document&contentId=1"
+    params = list(RESOURCE_DICT["/tchMaterial/detail"]["params"])
+    for _ in range(3):
+        config_urls = parse_urls([url], ["pdf"], False)
+        assert len(config_urls) == 1 and config_urls[0].endswith("/details/1.json")
+    assert RESOURCE_DICT["/tchMaterial/detail"]["params"] == params
+
+
+def test_parse_urls_thematic_course():
+    # contentType 只影响对应的URL
+    urls = [
+        "https://basic.smartedu.cn/schoolService/detail?contentType=thematic_course&contentId=1",
+        "https://basic.smartedu.cn/tchMaterial/detail?contentType=thematic_course&contentId=2",
+        "https://basic.smartedu.cn/schoolService/detail?contentId=3",
+    ]
+    config_urls = parse_urls(urls, ["pdf"], False)
+    assert "/thematic_course/1/" in config_urls[0]
+    assert "/tch_material/details/2.json" in config_urls[1]
+    assert "/thematic_course/" not in config_urls[2]
+
+
+def test_extract_params():
+    query = "contentType=&contentId=a%2Bb&contentId=c&x=1"
+    assert _extract_params(query, ("contentId", "contentType")) == {
+        "contentId": "a+b",
+        "contentType": None,
+    }
+
+
+def test_gen_url_from_tags():
+    urls = gen_url_from_tags(["1"])
+    assert urls == [
+        "https://basic.smartedu.cn/tchMaterial/detail?contentType=assets_document&contentId=1"
+    ]
+    assert validate_url(urls[0])
+    # 课程教学的书本是教材ID，不能直接生成课时资源的链接
+    with pytest.raises(ValueError):
+        gen_url_from_tags(["2"], "/syncClassroom")
+
+
+def test_validate_url():
+    assert validate_url(" https://web-bd.ykt.eduyun.cn/tchMaterial/detail?contentId=1 ")
+    assert validate_url("https://basic.smartedu.cn/tchMaterial") is None
+    assert validate_url("https://example.com/tchMaterial/detail?contentId=1") is None
+
+
+def test_iter_config_urls():
+    lines = [
+        "https://basic.smartedu.cn/tchMaterial/detail?contentId=1,"
+        " https://web-bd.ykt.eduyun.cn/tchMaterial/detail?contentId=1&x=2\n",
+        "\n",
+        "https://basic.smartedu.cn/syncClassroom/prepare/detail?resourceId=2\n",
+        "https://example.com/a, https://basic.smartedu.cn/tchMaterial/detail?contentType=x\n",
+    ]
+    errors = []
+    stats = {}
+    config_urls = iter_config_urls(
+        iter_url_lines(lines), ["pdf"], False, lambda *args: errors.append(args), stats
+    )
+    assert len(list(config_urls)) == 2
+    assert stats == {"valid": 2, "duplicate": 1, "invalid": 2, "configs": 2}
+    assert [(lineno, reason.split()[0]) for lineno, _, reason in errors] == [
+        (4, "不支持的域名"),
+        (4, "缺少参数"),
+    ]
+
+
+def test_iter_config_urls_lazy():
+    url = "https://basic.smartedu.cn/tchMaterial/detail?contentId={}"
+    items = ((i, url.format(i)) for i in range(10**9))
+    config_urls = iter_config_urls(items, ["pdf"], False)
+    assert next(config_urls).endswith("/details/0.json")
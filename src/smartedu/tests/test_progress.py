@@ -0,0 +1,69 @@
+import pytest
+
+from .. import downloader
+from ..downloader import download_pipeline
+from ..parser import extract_resource_url
+from ..utils.progress import format_eta, format_speed, ProgressTracker
+from .server import LocalServer
+from .test_downloader import make_files
+
+
+def test_tracker():
+    tracker = ProgressTracker()
+    first = tracker.start("a.pdf")
+    first.begin(1000, 200)  # 续传：已保存200字节
+    counter = first.counter()
+    counter.add(300)
+    assert (first.done, first.transferred) == (500, 300)
+
+    snapshot = tracker.snapshot(3)
+    assert snapshot["bytes"] == 300 and snapshot["in_flight"] == 1
+    assert snapshot["files"][0]["done"] == 500 and snapshot["files"][0]["size"] == 1000
+
+    # 重新开始（如换镜像后续传）时按新的偏移计算
+    first.begin(1000, 400)
+    counter.add(600)
+    assert (first.done, first.transferred) == (1000, 900)
+    tracker.finish(first)
+
+    snapshot = tracker.snapshot(3)
+    assert snapshot["bytes"] == 900 and snapshot["in_flight"] == 0 and snapshot["finished"] == 1
+    # 剩余2个文件按已下载文件的平均大小估计
+    assert snapshot["speed"] > 0
+    assert snapshot["eta"] == pytest.approx(2000 / snapshot["speed"])
+    assert tracker.snapshot(None)["eta"] is None
+
+    assert format_speed(1.5 * 1024 * 1024) == "1.50 MB/s"
+    assert format_eta(None) == "--:--" and format_eta(75.4) == "01:15"
+    assert format_eta(3725) == "1:02:05"
+
+
+@pytest.mark.parametrize("segment_size", [0, 4096])
+def test_pipeline_progress(tmp_path, monkeypatch, segment_size):
+    # segment_size > 0 时大文件分段并发下载，各分段线程分别计数
+    monkeypatch.setattr(downloader, "SEGMENT_SIZE", segment_size)
+    monkeypatch.setattr(downloader, "SEGMENT_THRESHOLD", segment_size)
+    with LocalServer(delay=0.05) as server:
+        files = make_files(server.url, 12)
+        server.files.update(files)
+        config_urls = [server.url(f"/details/{i}.json") for i in range(12)]
+        snapshots = []
+
+        def callback(event, data):
+            if event == "progress":
+                snapshots.append(data)
+
+        _, results = download_pipeline(
+            config_urls,
+            lambda data: extract_resource_url(data, ["pdf"]),
+            tmp_path,
+            max_workers=2,
+            callback=callback,
+            use_cache=False,
+        )
+
+        assert sorted(r["status"] for r in results) == ["success"] * 12
+        total_bytes = sum(len(body) for path, body in files.items() if path.endswith(".pdf"))
+        assert snapshots[-1]["bytes"] == total_bytes
+        assert snapshots[-1]["finished"] == 12 and snapshots[-1]["in_flight"] == 0
+        assert [s["bytes"] for s in snapshots] == sorted(s["bytes"] for s in snapshots)
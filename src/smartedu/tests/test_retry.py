@@ -0,0 +1,74 @@
+from email.utils import formatdate
+import time
+
+from .. import downloader
+from ..utils.concurrency import AdaptiveLimiter
+from ..utils.dl import fetch_file, FetchPlan
+from ..utils.retry import parse_retry_after, RetryBudget, RetryPolicy
+from .server import LocalServer
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert 8 <= parse_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+
+
+def test_retry_policy():
+    policy = RetryPolicy(budget=RetryBudget(ratio=0, min_retries=100))
+    assert policy.should_retry(0, -1) and policy.should_retry(0, 429)
+    assert policy.should_retry(1, 503) and not policy.should_retry(2, 503)
+    assert not policy.should_retry(0, 404)
+    assert policy.delay(0, retry_after=2) == 2
+    assert all(0 <= policy.delay(i) <= policy.max_delay for i in range(10))
+
+
+def test_retry_budget():
+    policy = RetryPolicy(budget=RetryBudget(ratio=0.5, min_retries=1))
+    for _ in range(4):
+        policy.budget.record_request()
+    assert [policy.should_retry(0, -1) for _ in range(4)] == [True, True, True, False]
+
+
+def test_fetch_plan():
+    # fetch_file 和asyncio引擎共用的响应处理和重试决定
+    policy = RetryPolicy(budget=RetryBudget(ratio=0, min_retries=100))
+    plan = FetchPlan("https://s-file-1.ykt.cbern.com.cn/a.json", {}, retry=policy)
+    assert plan.load_cache() == (False, None)
+    assert len(plan.mirrors()) == 3
+
+    assert plan.handle(429, {"retry-after": "1"}, "") == (False, None)
+    assert plan.retry_delay() == 1
+    assert plan.handle(503, {}, "") == (False, None)
+    assert plan.retry_delay() is not None
+    assert plan.handle(404, {}, "") == (True, None)
+    assert plan.handle(200, {}, '{"id": 1}') == (True, {"id": 1})
+
+    plan.network_error()
+    assert plan.retry_delay() is not None
+    assert plan.retry_delay() is None  # 新的一轮还没有错误
+    assert FetchPlan("https://example.com/a.json", {}, failover=False).retry_delay() is None
+
+
+def test_fetch_file_retry():
+    with LocalServer({"/details/1.json": b'{"id": 1}'}) as server:
+        server.errors["/details/1.json"] = [503, 429]
+        url = server.url("/details/1.json")
+        assert fetch_file(url, {}) is None
+
+        server.errors["/details/1.json"] = [503, 429]
+        assert fetch_file(url, {}, retry=RetryPolicy()) == {"id": 1}
+        assert len(server.requests) == 4
+
+
+def test_download_retry(tmp_path):
+    with LocalServer({"/a.pdf": b"%PDF" + bytes(1000)}) as server:
+        server.errors["/a.pdf"] = [500, 502]
+        url = server.url("/a.pdf")
+        resource = ["a.pdf", "", url, url]
+        result = downloader._download_limited(
+            AdaptiveLimiter(), resource, tmp_path, retry=RetryPolicy()
+        )
+        assert result["status"] == "success" and result["retries"] == 2
+        assert (tmp_path / "a.pdf").exists()
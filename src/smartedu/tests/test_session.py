@@ -0,0 +1,25 @@
+from ..utils.session import SessionPool
+from .server import LocalServer
+
+
+def test_resize_closes_old_adapters():
+    with LocalServer({"/a.json": b"{}"}) as server:
+        url = server.url("/a.json")
+        pool = SessionPool(pool_size=2)
+        session = pool.get(url)
+        assert session.get(url).status_code == 200
+        old_adapter = session.get_adapter(url)
+        old_pools = old_adapter.poolmanager.pools
+        assert len(old_pools) == 1
+
+        pool.resize(8)
+        adapter = session.get_adapter(url)
+        assert adapter is not old_adapter and adapter._pool_maxsize == 8
+        # 旧的连接池已关闭，不再保留空闲连接
+        assert len(old_pools) == 0
+        assert session.get(url).status_code == 200
+
+        # 缩小时不替换
+        pool.resize(4)
+        assert session.get_adapter(url) is adapter
+        pool.close()
@@ -0,0 +1,155 @@
+import stat
+from pathlib import Path
+
+from ..downloader import download_files
+from ..utils import store as store_module
+from ..utils.store import blob_key, BlobStore
+from .server import LocalServer
+
+
+def test_blob_key():
+    url = "https://r2-ndr-private.ykt.cbern.com.cn/edu_product/esp/assets/1.pkg/数学.pdf"
+    assert blob_key(url) == "https://r1-ndr.ykt.cbern.com.cn/edu_product/esp/assets/1.pkg/数学.pdf"
+    assert blob_key(url + "?x=1") == blob_key(url.replace("r2-", "r3-"))
+    # 同一目录下不同的文档不能共用一个key
+    assert blob_key(url) != blob_key(url.replace("数学", "语文"))
+
+
+def test_store_across_dirs(tmp_path):
+    store = BlobStore(tmp_path / "store")
+    files = {"/a/pdf.pdf": b"%PDF-a" * 1000}
+    with LocalServer(files) as server:
+        url = server.url("/a/pdf.pdf")
+        # 同一批中重复的资源只下载一次
+        url_list = [["a.pdf", "", url, url], ["b.pdf", "", url, url]]
+        results = download_files(url_list, tmp_path / "1", store=store)
+        assert sorted(r["status"] for r in results) == ["linked", "success"]
+        assert server.requests.count("/a/pdf.pdf") == 2  # GET + HEAD
+
+        # 其他目录直接链接已保存的文件
+        results = download_files(url_list[:1], tmp_path / "2", incremental=False, store=store)
+        assert results[0]["status"] == "linked"
+        assert server.requests.count("/a/pdf.pdf") == 3
+
+    inodes = {p.stat().st_ino for p in tmp_path.glob("[12]/*.pdf")}
+    assert len(inodes) == 1
+    assert (tmp_path / "2" / "a.pdf").read_bytes() == files["/a/pdf.pdf"]
+
+
+def test_store_same_content(tmp_path):
+    # 不同URL、内容相同的文件只保留一份
+    store = BlobStore(tmp_path / "store")
+    files = {"/a/pdf.pdf": b"%PDF" * 1000, "/b/pdf.pdf": b"%PDF" * 1000}
+    with LocalServer(files) as server:
+        url_list = [[f"{p[1]}.pdf", "", server.url(p), server.url(p)] for p in files]
+        results = download_files(url_list, tmp_path, max_workers=1, store=store)
+        assert [r["status"] for r in results] == ["success", "success"]
+
+    assert (tmp_path / "a.pdf").stat().st_ino == (tmp_path / "b.pdf").stat().st_ino
+    assert len(list((tmp_path / "store" / "blobs").glob("*/*"))) == 1
+
+
+def add_file(store, tmp_path, name, data):
+    file_path = tmp_path / name
+    file_path.write_bytes(data)
+    result = {"file": file_path, "size": len(data)}
+    return store.add(f"https://r1-ndr.ykt.cbern.com.cn/{name}", result)
+
+
+def test_store_readonly_and_evict(tmp_path):
+    store = BlobStore(tmp_path / "store", max_size=2500)
+    add_file(store, tmp_path, "a.pdf", b"a" * 1000)
+    sha_b = add_file(store, tmp_path, "b.pdf", b"b" * 1000)
+    # 保存的文件只读，不能在输出目录中直接修改
+    assert store.blob_path(sha_b).stat().st_mode & stat.S_IWUSR == 0
+
+    # 超过上限时删除最久未用的a，输出目录中的文件不受影响
+    assert store.get("https://r1-ndr.ykt.cbern.com.cn/b.pdf") is not None
+    add_file(store, tmp_path, "c.pdf", b"c" * 1000)
+    assert store.get("https://r1-ndr.ykt.cbern.com.cn/a.pdf") is None
+    assert store.get("https://r1-ndr.ykt.cbern.com.cn/b.pdf") is not None
+    assert (tmp_path / "a.pdf").read_bytes() == b"a" * 1000
+    assert len(list((tmp_path / "store" / "blobs").glob("*/*"))) == 2
+
+    # 使用后不保留每个URL的锁
+    with store.lock("https://r1-ndr.ykt.cbern.com.cn/a.pdf"):
+        assert len(store._url_locks) == 1
+    assert store._url_locks == {}
+
+
+def test_store_no_hardlink(tmp_path, monkeypatch):
+    # 不支持硬链接（如不在同一文件系统）时不保存，也不复制
+    def link(src, dst):
+        raise OSError("Invalid cross-device link")
+
+    monkeypatch.setattr(store_module.os, "link", link)
+    store = BlobStore(tmp_path / "store")
+    assert add_file(store, tmp_path, "a.pdf", b"a" * 1000) is None
+    assert store.get("https://r1-ndr.ykt.cbern.com.cn/a.pdf") is None
+    assert list((tmp_path / "store").glob("blobs/*/*")) == []
+    assert (tmp_path / "a.pdf").read_bytes() == b"a" * 1000
+
+
+def writable(path):
+    return bool(Path(path).stat().st_mode & stat.S_IWUSR)
+
+
+_replace, _unlink = Path.replace, Path.unlink
+
+
+def win_replace(self, target):
+    # 模拟Windows：只读文件不能删除或被替换
+    if Path(target).exists() and not writable(target):
+        raise PermissionError(13, "Access is denied", str(target))
+    return _replace(self, target)
+
+
+def win_unlink(self, missing_ok=False):
+    if self.exists() and not writable(self):
+        raise PermissionError(13, "Access is denied", str(self))
+    return _unlink(self, missing_ok)
+
+
+def test_store_evict_readonly(tmp_path, monkeypatch):
+    # 删除只读的blob时先去掉只读属性，超过上限后仍能继续保存
+    monkeypatch.setattr(Path, "unlink", win_unlink)
+    store = BlobStore(tmp_path / "store", max_size=2500)
+    for name in "abcd":
+        assert add_file(store, tmp_path, f"{name}.pdf", name.encode() * 1000) is not None
+    assert store.get("https://r1-ndr.ykt.cbern.com.cn/b.pdf") is None
+    assert len(list((tmp_path / "store" / "blobs").glob("*/*"))) == 2
+    assert store._total_size == 2000
+
+    # 删除失败时保留该文件和记录，不影响保存
+    def busy_unlink(self, missing_ok=False):
+        if "blobs" in self.parts and self.suffix != ".link":
+            raise PermissionError(32, "The process cannot access the file", str(self))
+        return _unlink(self, missing_ok)
+
+    monkeypatch.setattr(Path, "unlink", busy_unlink)
+    assert add_file(store, tmp_path, "e.pdf", b"e" * 1000) is not None
+    assert store.get("https://r1-ndr.ykt.cbern.com.cn/c.pdf") is not None
+    assert store._total_size == 3000
+
+
+def test_store_update_readonly(tmp_path, monkeypatch):
+    # 资源更新后覆盖输出目录中的只读链接（模拟Windows）
+    store = BlobStore(tmp_path / "store")
+    with LocalServer({"/a/pdf.pdf": b"%PDF-1" * 1000}) as server:
+        url = server.url("/a/pdf.pdf")
+        url_list = [["a.pdf", "", url, url]]
+        out_file = tmp_path / "out" / "a.pdf"
+        assert download_files(url_list, tmp_path / "out", store=store)[0]["status"] == "success"
+        old_blob = Path(store.get(url)["blob"])
+        assert not writable(out_file)
+
+        monkeypatch.setattr(Path, "replace", win_replace)
+        monkeypatch.setattr(Path, "unlink", win_unlink)
+        server.files["/a/pdf.pdf"] = b"%PDF-2" * 1000
+        results = download_files(url_list, tmp_path / "out", store=store)
+        assert results[0]["status"] == "success"
+        assert out_file.read_bytes() == b"%PDF-2" * 1000
+
+    # 旧文件仍在存储中且保持只读
+    assert old_blob.exists() and not writable(old_blob)
+    assert out_file.stat().st_ino != old_blob.stat().st_ino
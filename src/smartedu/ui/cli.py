@@ -1,6 +1,7 @@
 import logging
 import sys
 import time
+from functools import partial
 from pathlib import Path
 
 import click
@@ -11,9 +12,15 @@ from rich.table import Table
 
 from ..configs.conf import ZERO_KEY, ALL_KEY, EXIT_KEY, FIRST_KEY
 from ..configs.logo import DESCRIBES, LOGO_TEXT2
-from ..downloader import download_files, fetch_resources
-from ..loader import fetch_metadata, query_metadata
-from ..parser import extract_resource_url, parse_urls, validate_url, gen_url_from_tags
+from ..configs.resources import RESOURCE_DICT
+from ..downloader import download_pipeline
+from ..utils.concurrency import DEFAULT_CEILING
+from ..downloader_async import download_async
+from ..loader import catalogue_root, CATALOGUES, fetch_metadata, query_metadata
+from ..parser import extract_resource_url, iter_config_urls, iter_url_lines
+from ..parser import gen_url_from_tags
+from ..utils.progress import format_eta, format_speed
+from ..utils.store import get_store
 
 logger = logging.getLogger(__name__)
 
@@ -99,11 +106,17 @@ def display_results(console: Console, results: list, elapsed_time: float):
     # 创建总体统计表格
     summary_table = Table(title="下载统计", show_header=False, title_style="bold yellow")
     success_count = sum(1 for r in results if r["status"] == "success")
-    failed_count = len(results) - success_count
+    skipped_count = sum(1 for r in results if r["status"] == "skipped")
+    linked_count = sum(1 for r in results if r["status"] == "linked")
+    failed_count = len(results) - success_count - skipped_count - linked_count
+    retry_count = sum(r.get("retries", 0) for r in results)
 
     summary_table.add_row("总计文件", str(len(results)))
     summary_table.add_row("成功下载", f"[green]{success_count}[/green]")
+    summary_table.add_row("未变跳过", f"[blue]{skipped_count}[/blue]")
+    summary_table.add_row("复用已有", f"[cyan]{linked_count}[/cyan]")
     summary_table.add_row("下载失败", f"[red]{failed_count}[/red]")
+    summary_table.add_row("重试次数", f"[yellow]{retry_count}[/yellow]")
     summary_table.add_row("总计用时", f"{elapsed_time:.2f}秒")
 
     console.print("\n")
@@ -119,11 +132,16 @@ def display_results(console: Console, results: list, elapsed_time: float):
 
         for i, res in enumerate(results, 1):
             # status_style = "green" if res["status"] == "success" else "red"
-            status = (
-                f"[green]成功（{res['code']}）[/green]"
-                if res["status"] == "success"
-                else f"[red]失败（{res['code']}）[/red]"
-            )
+            if res["status"] == "success":
+                status = f"[green]成功（{res['code']}）[/green]"
+            elif res["status"] == "skipped":
+                status = "[blue]跳过（未变化）[/blue]"
+            elif res["status"] == "linked":
+                status = "[cyan]复用（已下载过）[/cyan]"
+            else:
+                status = f"[red]失败（{res['code']}）[/red]"
+            if res.get("retries"):
+                status += f"\n[yellow]重试{res['retries']}次[/yellow]"
             file_path = res.get("file", "---")
             url = res.get("raw", res["url"])
             result_table.add_row(str(i), url, status, file_path)
@@ -149,81 +167,121 @@ def display_stats(console: Console, resource_list: list):
 
 
 def preprocess(list_file, urls):
-    # 获取预定义URL
-    predefined_urls = []
+    """按需读取 -f 文件和 -u 中的URL，产出 (位置, URL)，不会一次读入整个文件"""
     if list_file:
         try:
             with open(list_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        more_urls = [url.strip() for url in line.split(",") if url.strip()]
-                        predefined_urls.extend(more_urls)
+                for lineno, url in iter_url_lines(f):
+                    yield f"{list_file}:{lineno}", url
         except Exception as e:
             logger.error(f"读取文件失败: {list_file}, error={e}", exc_info=True)
 
     if urls:
-        predefined_urls.extend(url.strip() for url in urls.split(",") if url.strip())
-    urls = [url for url in predefined_urls if validate_url(url)]
-    return urls
+        for _, url in iter_url_lines([urls]):
+            yield "-u", url
+
+
+def simple_download(
+    urls,
+    save_path,
+    formats,
+    auth=None,
+    activate_backup=False,
+    engine="thread",
+    workers=DEFAULT_CEILING,
+    adaptive=True,
+    dedup=False,
+    hedge=False,
+) -> int:
+    """
+    urls: (位置, URL) 的可迭代对象，边读取边校验、去重、解析、下载
+    返回有效链接数
+    """
+    click.echo(f"\n将保存到目录【{click.style(str(save_path), fg='yellow')} 】")
+
+    def on_error(label, url, reason):
+        logger.warning(f"无效链接 [{label}]: {url}（{reason}）")
+
+    stats = {"valid": 0, "duplicate": 0, "invalid": 0, "configs": 0}
+    config_urls = iter_config_urls(urls, formats, activate_backup, on_error, stats)
 
+    console = Console()
 
-def simple_download(urls, save_path, formats, auth=None, activate_backup=False):
-    click.echo(
-        f"\n共选择 {click.style(str(len(urls)), fg='yellow')} 项资源，"
-        f"将保存到目录【{click.style(str(save_path), fg='yellow')} 】"
-    )
+    # 开始下载：边解析配置边下载文件
+    start_time = time.time()
+    click.echo("\n开始解析并下载文件...")
 
-    config_urls = parse_urls(urls, formats, activate_backup)
-    logger.debug("config_urls:")
-    for i, url in enumerate(config_urls):
-        logger.debug(f"{i+1}. {url}")
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TaskProgressColumn(),
+        TextColumn("{task.fields[rate]}"),
+        console=console,
+    ) as progress:
+        download_task = progress.add_task("正在下载文件...", total=None, rate="")
+        found = 0
+
+        def update_progress(event, data):
+            # 解析完成前资源总数持续增加
+            nonlocal found
+            if event == "resource":
+                found += 1
+                progress.update(download_task, total=found)
+            elif event == "resolved":
+                progress.update(download_task, total=data)
+            elif event == "result":
+                progress.advance(download_task)
+            elif event == "progress":
+                # 总速度、进行中的文件数和预计剩余时间
+                rate = f"{format_speed(data['speed'])} 下载中 {data['in_flight']} 个"
+                progress.update(download_task, rate=f"{rate} 剩余 {format_eta(data['eta'])}")
+
+        if engine == "async":
+            download_func = partial(download_async, download_limit=workers)
+        else:
+            download_func = partial(download_pipeline, max_workers=workers)
+        resource_list, results = download_func(
+            config_urls,
+            lambda data: extract_resource_url(data, formats),
+            save_path,
+            auth=auth,
+            callback=update_progress,
+            adaptive=adaptive,
+            store=get_store() if dedup else None,
+            hedge=hedge,
+        )
 
-    resource_list = fetch_resources(config_urls, lambda data: extract_resource_url(data, formats))
     total = len(resource_list)
     click.echo(
-        f"\n输入的有效链接共 {click.style(str(len(urls)), fg='yellow')} 个；"
-        f"\n解析得配置链接共 {click.style(str(len(config_urls)), fg='yellow')} 个；"
+        f"\n输入的有效链接共 {click.style(str(stats['valid']), fg='yellow')} 个"
+        f"（重复 {stats['duplicate']} 个，无效 {stats['invalid']} 个）；"
+        f"\n解析得配置链接共 {click.style(str(stats['configs']), fg='yellow')} 个；"
         f"\n最终的资源文件共 {click.style(str(total), fg='yellow')} 个。"
     )
 
     if total == 0:
         click.echo("\n没有找到资源文件（PDF/MP3等）。结束下载")
-        return
+        return stats["valid"]
 
-    console = Console()
     display_stats(console, resource_list)
 
-    # 开始下载
-    start_time = time.time()
-    click.echo("\n开始下载文件...")
-
-    # 下载文件
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TaskProgressColumn(),
-        console=console,
-    ) as progress:
-        download_task = progress.add_task("正在下载文件...", total=total)
-        results = download_files(resource_list, save_path, auth=auth)
-        progress.update(download_task, completed=total)
-
     # 显示统计信息
     elapsed_time = time.time() - start_time
     display_results(console, results, elapsed_time)
+    return stats["valid"]
 
 
-def _interactive_mode1(book_base, retry=3):
-    book_history = [book_base.children[0]]
+def _interactive_mode1(book_base, name="/tchMaterial", retry=3):
+    # name: 目录，见 loader.CATALOGUES
+    book_history = [catalogue_root(book_base, name)]
     options = []
     urls_to_process = []
     flag = True
 
     while flag:
         current_book = book_history[-1]
-        step = current_book.level
+        step = len(book_history)
         title, options, children, is_book = query_metadata(current_book)
         if step > 1 and is_book:
             break
@@ -258,7 +316,7 @@ def _interactive_mode1(book_base, retry=3):
                 click.secho(f"输入不合法，请重新输入（第{i + 1}/{retry}次）", fg="red")
         else:
             logging.debug("错误次数过多，重置")
-            book_history = [book_base.children[0]]
+            book_history = [catalogue_root(book_base, name)]
 
     if options:
         selected_option = "教材课本"
@@ -266,7 +324,10 @@ def _interactive_mode1(book_base, retry=3):
         option_names = [op[1] for op in options]
         note_title = f"当前选择的【{selected_option}】共{len(options)}项，如下"
         display_entries(option_names, note_title, name2)
-        urls_to_process = gen_url_from_tags([cid for cid, _ in options])
+        try:
+            urls_to_process = gen_url_from_tags([cid for cid, _ in options], name)
+        except ValueError as e:
+            click.secho(str(e), fg="yellow")
 
     return urls_to_process
 
@@ -276,15 +337,16 @@ def _interactive_mode2(retry=3):
         note = click.style("「smartedu.cn」", fg="blue", bold=True)
         click.echo(f"\n请输入包含{note}资源的URL（逗号分隔）：")
         input_urls = click.prompt("")
-        input_urls = input_urls.strip().lower()
-        if input_urls == EXIT_KEY:  # 退出
+        input_urls = input_urls.strip()
+        if input_urls.lower() == EXIT_KEY:  # 退出
             return []
 
-        urls_to_process = [url.strip() for url in input_urls.split(",") if validate_url(url)]
+        # 只拆分，校验和去重在下载时由 iter_config_urls 完成，无效链接按序号报告
+        urls_to_process = [url for _, url in iter_url_lines([input_urls])]
         if urls_to_process:
-            display_entries(urls_to_process, "已输入列表", "有效URL")
+            display_entries(urls_to_process, "已输入列表", "URL")
             break
-        click.secho(f"未输入有效URL，请重新输入（第{i + 1}/{retry}次）", fg="red")
+        click.secho(f"未输入URL，请重新输入（第{i + 1}/{retry}次）", fg="red")
     return urls_to_process
 
 
@@ -332,13 +394,20 @@ def interactive_download(
     auth: str = None,
     activate_backup: bool = False,
     data_dir: str = None,
+    engine: str = "thread",
+    workers: int = DEFAULT_CEILING,
+    adaptive: bool = True,
+    dedup: bool = False,
+    hedge: bool = False,
 ):
     """交互式下载流程"""
 
-    book_base = None
+    book_bases = {}  # 目录 -> 目录树
     mode_options = [
-        ["1", "查询教材列表"],
-        ["2", "手动输入URL"],
+        [str(i), f"查询{RESOURCE_DICT[name]['name']}列表"] for i, name in enumerate(CATALOGUES, 1)
+    ]
+    mode_options += [
+        [str(len(CATALOGUES) + 1), "手动输入URL"],
         [ZERO_KEY, f"退出（或{EXIT_KEY}）"],
     ]
     while True:
@@ -349,21 +418,23 @@ def interactive_download(
         choice = click.prompt("请选择", type=click.Choice(choice_values), show_choices=True)
         choice = choice.strip().lower()
 
-        if choice in choice_values[2:]:
+        if choice in choice_values[len(CATALOGUES) + 1 :]:
             click.echo("\n退出程序")
             sys.exit(0)
 
         # 获取URL列表
         urls_to_process = []
-        if choice == choice_values[0]:
-            if book_base is None:
-                click.echo("\n联网查询教材数据中……")
-                book_base = fetch_metadata(data_dir)
+        if choice in choice_values[: len(CATALOGUES)]:
+            name = CATALOGUES[choice_values.index(choice)]
+            if book_bases.get(name) is None:
+                click.echo(f"\n联网查询{RESOURCE_DICT[name]['name']}数据中……")
+                book_bases[name] = fetch_metadata(data_dir, name=name)
+            book_base = book_bases[name]
             if book_base is None or len(book_base.children) == 0:
                 click.secho("获取数据失败，请稍后再试", fg="red")
                 continue
-            urls_to_process = _interactive_mode1(book_base)
-        elif choice == choice_values[1]:
+            urls_to_process = _interactive_mode1(book_base, name)
+        else:
             urls_to_process = _interactive_mode2()
 
         if not urls_to_process:
@@ -378,7 +449,18 @@ def interactive_download(
         save_path = _interactive_path(default_output)
 
         # 开始下载
-        simple_download(resource_urls, save_path, audio, auth, activate_backup)
+        simple_download(
+            enumerate(resource_urls, 1),
+            save_path,
+            audio,
+            auth,
+            activate_backup,
+            engine,
+            workers,
+            adaptive,
+            dedup,
+            hedge,
+        )
 
         # 询问是否继续
         if not click.confirm("\n是否继续下载?", default=True, show_default=True):
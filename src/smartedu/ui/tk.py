@@ -1,4 +1,6 @@
 import logging
+import queue
+import threading
 import time
 import tkinter as tk
 import tkinter.font as tkFont
@@ -9,20 +11,33 @@ from tkinter import filedialog, messagebox, ttk
 from ..configs.logo import DESCRIBES, LOGO_TEXT
 from ..configs.resources import RESOURCE_DICT
 from ..configs.conf import RESOURCE_FORMATS, RESOURCE_NAMES
-from ..downloader import fetch_resources, download_files_tk
-from ..loader import fetch_metadata, query_metadata
+from ..downloader import download_pipeline
+from ..loader import catalogue_root, CATALOGUES, fetch_metadata, query_metadata
 from ..parser import extract_resource_url, parse_urls, gen_url_from_tags
+from ..utils.progress import format_eta, format_speed
+from ..utils.store import get_store
+
+PROGRESS_INTERVAL = 100  # 毫秒：后台下载的进度事件按此间隔批量刷新界面
+BASE_PROGRESS = 10  # 解析URL阶段的进度
 
 
 def display_results(results: list, elapsed_time: float):
     """展示下载结果统计"""
     success_count = sum(1 for r in results if r["status"] == "success")
-    failed_count = len(results) - success_count
+    skipped_count = sum(1 for r in results if r["status"] == "skipped")
+    linked_count = sum(1 for r in results if r["status"] == "linked")
+    cancelled_count = sum(1 for r in results if r["status"] == "cancelled")
+    failed_count = len(results) - success_count - skipped_count - linked_count - cancelled_count
+    retry_count = sum(r.get("retries", 0) for r in results)
 
     messages = [
         ["总计文件", str(len(results))],
         ["成功下载", f"{success_count}"],
+        ["未变跳过", f"{skipped_count}"],
+        ["复用已有", f"{linked_count}"],
         ["下载失败", f"{failed_count}"],
+        ["已取消", f"{cancelled_count}"],
+        ["重试次数", f"{retry_count}"],
         ["总用时", f"{elapsed_time:.1f}秒"],
     ]
     return "\n".join([": ".join(v) for v in messages])
@@ -59,7 +74,9 @@ class BookSelectorFrame(ttk.Frame):
 
         # 初始化属性
         self.frame_names = ["选择课本", "选择教材"]
-        self.book_base = None  # 教材目录树
+        self.catalogue = CATALOGUES[0]  # 当前查询的目录，见 loader.CATALOGUES
+        self.book_bases = {}  # 目录 -> 目录树
+        self.book_base = None
         self.book_history = []
 
         self.selected_items = set()  # 多选框选中的条目
@@ -138,12 +155,23 @@ class BookSelectorFrame(ttk.Frame):
         self.query_btn = ttk.Button(query_btn_frame, text="查询", command=self.query_data)
         self.query_btn.pack(side=tk.RIGHT)
 
+        # 选择查询的目录：教材、课程教学
+        catalogue_names = [RESOURCE_DICT[name]["name"] for name in CATALOGUES]
+        self.catalogue_cb = ttk.Combobox(
+            query_btn_frame, state="readonly", values=catalogue_names, width=8
+        )
+        self.catalogue_cb.current(0)
+        self.catalogue_cb.pack(side=tk.RIGHT, padx=self.padx)
+
     def query_data(self):
         """查询数据并更新下拉框"""
         # 获取第一级数据
-        if self.book_base is None:
-            self.hierarchy_frame.configure(text="联网查询教材数据中……")
-            self.book_base = fetch_metadata(data_dir=None)
+        self.catalogue = CATALOGUES[max(self.catalogue_cb.current(), 0)]
+        if self.book_bases.get(self.catalogue) is None:
+            name = RESOURCE_DICT[self.catalogue]["name"]
+            self.hierarchy_frame.configure(text=f"联网查询{name}数据中……")
+            self.book_bases[self.catalogue] = fetch_metadata(data_dir=None, name=self.catalogue)
+        self.book_base = self.book_bases[self.catalogue]
 
         if self.book_base:
             self.hierarchy_frame.configure(text="查询完成")
@@ -161,7 +189,7 @@ class BookSelectorFrame(ttk.Frame):
         if index < 0:
             return
 
-        self.book_history = [self.book_base.children[0]]
+        self.book_history = [catalogue_root(self.book_base, self.catalogue)]
         current_book = self.book_history[-1]  # [index]
         title, options, children, is_book = query_metadata(current_book)
 
@@ -175,7 +203,7 @@ class BookSelectorFrame(ttk.Frame):
         frame = ttk.Frame(self.combo_frame)
         frame.pack(fill=tk.X, side=tk.TOP, expand=True, padx=self.padx, pady=self.pady)
 
-        level_count = self.book_history[-1].level
+        level_count = len(self.book_history)
         label = ttk.Label(frame, text=f"{level_count}. 【{name}】", font=("bold",))
         label.pack(fill=tk.X, expand=True, padx=self.padx * 2)
 
@@ -292,7 +320,7 @@ class BookSelectorFrame(ttk.Frame):
         """获取选中的URL列表"""
         items = list(self.selected_items)
         logging.debug(f"items = {len(items)}, {items}")
-        return gen_url_from_tags(items)
+        return gen_url_from_tags(items, self.catalogue)
 
 
 class InputURLAreaFrame(ttk.Frame):
@@ -398,7 +426,13 @@ class BasicDownloadApp(tk.Tk):
         self.fonts, default_size = self.setup_fonts()
         self.font_size = int(default_size * min((1.1 + (scale - 1) * 0.3), 1.5))
 
+        # 后台下载：进度事件放入队列，主线程用after()定时取出
+        self.event_queue = queue.Queue()
+        self.cancel_event = None
+        self.progress = {}
+
         self.setup_ui()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def setup_ui(self):
         """初始化UI: 标题、目录+下载按钮、单选按钮、内容区域、进度条"""
@@ -522,8 +556,6 @@ class BasicDownloadApp(tk.Tk):
             value, state = False, "enable"
             if suffix == RESOURCE_FORMATS[0]:
                 value = True
-            if suffix == RESOURCE_FORMATS[-2]:
-                state = "disabled"
             var.set(value)
             text = f"{name}({suffix})" if name in ["文档", "音频"] else name
             checkbutton = ttk.Checkbutton(
@@ -550,6 +582,10 @@ class BasicDownloadApp(tk.Tk):
         self.download_button.pack(side=tk.LEFT, padx=self.padx * 2)
         self.download_button.configure(command=self.start_download)
 
+        self.cancel_button = ttk.Button(download_frame, text="取消下载")
+        self.cancel_button.pack(side=tk.LEFT, padx=self.padx)
+        self.cancel_button.configure(command=self.cancel_download, state=tk.DISABLED)
+
         # 登录和备用
         extra_frame = ttk.Frame(main_frame)
         extra_frame.pack(fill=tk.X, pady=self.pady, expand=True)
@@ -572,6 +608,14 @@ class BasicDownloadApp(tk.Tk):
         backup_cb.pack(side=tk.RIGHT)
         backup_label.pack(side=tk.RIGHT)
 
+        # 相同资源去重（默认关闭） 复选框
+        self.dedup_var = tk.BooleanVar()
+        self.dedup_var.set(False)
+        dedup_cb = ttk.Checkbutton(backup_frame, variable=self.dedup_var)
+        dedup_label = ttk.Label(backup_frame, text="相同资源去重")
+        dedup_cb.pack(side=tk.RIGHT, padx=(0, self.padx * 2))
+        dedup_label.pack(side=tk.RIGHT)
+
         # 底部添加进度条区域
         self.progress_frame = ttk.Frame(main_frame)
         self.progress_frame.pack(fill=tk.X, pady=self.pady)
@@ -618,7 +662,11 @@ class BasicDownloadApp(tk.Tk):
         current_tab = self.mode_var.get()
         urls = []
         if current_tab == self.tab_titles[0]:
-            urls = self.selector_frame.get_selected_urls()
+            try:
+                urls = self.selector_frame.get_selected_urls()
+            except ValueError as e:
+                messagebox.showinfo("提示", str(e))
+                return
         elif current_tab == self.tab_titles[1]:
             urls = self.inputs_frame.get_urls()
         logging.debug(f"tab name = {current_tab}, urls = {len(urls)}")
@@ -637,67 +685,112 @@ class BasicDownloadApp(tk.Tk):
         # if not messagebox.askyesno("确认下载", f"将下载 {len(urls)} 个资源到目录：\n{save_dir}\n\n是否继续？"):
         #     return
         self.download_button.configure(state=tk.DISABLED)
-        try:
-            # 显示进度条
-            self.progress_var.set(0)
-            self.progress_label.configure(text="准备开始下载...")
-            self.update()
-            result, elapsed_time = self.simple_download(urls, suffix_list)
-            self.progress_label.configure(text="下载完成。")
-
-            if result:
-                message = display_results(result, elapsed_time)
-            else:
-                message = "下载列表为空"
-            messagebox.showinfo("下载结果", message)
-
-        except Exception as e:
-            messagebox.showerror("错误", f"下载失败：{str(e)}")
-        finally:
-            self.download_button.configure(state=tk.NORMAL)
+        self.cancel_button.configure(state=tk.NORMAL)
+        self.progress_var.set(BASE_PROGRESS)
+        self.progress_label.configure(text="正在解析URL...")
 
-    def simple_download(self, urls, suffix_list):
+        # 界面变量只在主线程读取；解析、下载都在后台线程中执行，界面不会卡住
         save_path = self.dir_var.get()
-        logging.debug(f"\n共选择 {len(urls)} 项目，将保存到 {save_path} 目录，类型 {suffix_list}")
-
         auth = self.auth_var.get().strip()
         activate_backup = self.backup_var.get()
-        logging.debug(f"\nauth = {auth}, backup={activate_backup}")
-
-        # 更新进度显示
-        self.progress_label.configure(text="正在解析URL...")
-        base_progress = 10
-        self.progress_var.set(base_progress)
-        self.update()
-
-        config_urls = parse_urls(urls, suffix_list, activate_backup)
-        resource_list = fetch_resources(
-            config_urls, lambda data: extract_resource_url(data, suffix_list)
-        )
-
-        total = len(resource_list)
-        self.progress_label.configure(
-            text=f"共找到配置链接 {len(config_urls)} 项，资源文件 {total} 项"
-        )
-        base_progress = 20
-        self.progress_var.set(base_progress)
-        self.update()
-
-        if total == 0:
-            logging.warning(f"没有找到资源文件（{'/'.join(suffix_list)}等）。结束下载")
-            return None, None
-
-        # 开始下载
-        start_time = time.time()
+        dedup = self.dedup_var.get()
+        self.cancel_event = threading.Event()
+        self.progress = {"total": 0, "resolved": False, "finished": 0, "snapshot": None}
+        args = (urls, suffix_list, save_path, auth, activate_backup, dedup, self.cancel_event)
+        threading.Thread(target=self.simple_download, args=args, daemon=True).start()
+        self.after(PROGRESS_INTERVAL, self.poll_progress)
+
+    def cancel_download(self):
+        """取消下载：停止解析，未开始的资源不再下载；正在下载的文件也停止，下次续传"""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        self.cancel_button.configure(state=tk.DISABLED)
+
+    def on_close(self):
+        self.cancel_download()
+        self.destroy()
+
+    def poll_progress(self):
+        """主线程：取出队列中的全部事件，每次只刷新一次界面"""
+        progress = self.progress
+        finished = None
+        while True:
+            try:
+                event, data = self.event_queue.get_nowait()
+            except queue.Empty:
+                break
+            # 边解析边下载，解析完成前总数持续增加
+            if event == "resource":
+                progress["total"] += 1
+            elif event == "resolved":
+                progress["resolved"] = True
+            elif event == "result":
+                progress["finished"] += 1
+            elif event == "progress":
+                progress["snapshot"] = data
+            elif event in ["done", "error"]:
+                finished = (event, data)
+
+        total, count = progress["total"], progress["finished"]
+        if self.cancel_event.is_set():
+            note = "（正在取消）"
+        else:
+            note = "" if progress["resolved"] else "（解析中）"
+        text = f"已经下载 {count} / {total} 项资源{note}..."
+        if progress["snapshot"]:
+            snapshot = progress["snapshot"]
+            text += f" {format_speed(snapshot['speed'])}，剩余 {format_eta(snapshot['eta'])}"
+        self.progress_label.configure(text=text)
+        if total > 0:
+            self.progress_var.set(BASE_PROGRESS + (count / total) * (100 - BASE_PROGRESS))
+
+        if finished is None:
+            self.after(PROGRESS_INTERVAL, self.poll_progress)
+        else:
+            self.finish_download(*finished)
+
+    def finish_download(self, event, data):
+        self.download_button.configure(state=tk.NORMAL)
+        self.cancel_button.configure(state=tk.DISABLED)
+        if event == "error":
+            self.progress_label.configure(text="下载失败。")
+            messagebox.showerror("错误", f"下载失败：{data}")
+            return
 
-        # 更新进度显示
-        self.progress_label.configure(text=f"开始下载 {total} 项资源...")
-        self.update()
-        results = download_files_tk(self, base_progress, resource_list, save_path, auth=auth)
+        results, elapsed_time = data
+        if self.cancel_event.is_set():
+            self.progress_label.configure(text="已取消下载。")
+        else:
+            self.progress_label.configure(text="下载完成。")
+            self.progress_var.set(100)
 
-        # 更新进度显示
-        self.progress_var.set(100)
-        self.update()
+        if results:
+            message = display_results(results, elapsed_time)
+        else:
+            message = "下载列表为空"
+        messagebox.showinfo("下载结果", message)
 
-        elapsed_time = time.time() - start_time
-        return results, elapsed_time
+    def simple_download(self, urls, suffix_list, save_path, auth, activate_backup, dedup, cancel):
+        """后台线程：解析并下载，进度和结果放入 self.event_queue"""
+        logging.debug(f"\n共选择 {len(urls)} 项目，将保存到 {save_path} 目录，类型 {suffix_list}")
+        logging.debug(f"\nauth = {auth}, backup={activate_backup}, dedup={dedup}")
+        post = self.event_queue.put
+        try:
+            config_urls = parse_urls(urls, suffix_list, activate_backup)
+            start_time = time.time()
+            resource_list, results = download_pipeline(
+                config_urls,
+                lambda data: extract_resource_url(data, suffix_list),
+                save_path,
+                auth=auth,
+                callback=lambda event, data: post((event, data)),
+                store=get_store() if dedup else None,
+                cancel=cancel,
+            )
+            if len(resource_list) == 0:
+                logging.warning(f"没有找到资源文件（{'/'.join(suffix_list)}等）。结束下载")
+                results = None
+            post(("done", (results, time.time() - start_time)))
+        except Exception as e:
+            logging.error(f"下载失败：{e}")
+            post(("error", str(e)))
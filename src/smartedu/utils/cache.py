@@ -0,0 +1,162 @@
+"""
+配置JSON的本地HTTP缓存：有效期内直接使用，过期后用If-None-Match/If-Modified-Since重新验证
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from ..configs.conf import CACHE_PATH
+from ..configs.resources import SERVER_LIST
+
+DEFAULT_TTL = 3600  # 1小时
+DEFAULT_MAX_SIZE = 200 * 1024 * 1024  # 200M
+EVICT_INTERVAL = 1000  # 每写入1000次重新统计一次目录，校正其他进程写入造成的偏差
+
+_server_pattern = re.compile(r"//({})\.".format("|".join(map(re.escape, SERVER_LIST))))
+
+
+def normalize_url(url: str) -> str:
+    # s-file-1/2/3 内容一致，缓存时统一替换为 {server}
+    return _server_pattern.sub("//{server}.", url, count=1)
+
+
+class ResponseCache:
+    """按URL保存响应文本和验证信息，超过max_size时按最近访问时间（LRU）淘汰"""
+
+    def __init__(self, cache_dir: str | Path, ttl: int = DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # 缓存总大小在内存中累计，只在超过上限或每隔EVICT_INTERVAL次写入时扫描目录
+        self._writes = 0
+        self._total_size = sum(st.st_size for st, _ in self._scan())
+
+    def _path(self, url: str) -> Path:
+        key = hashlib.sha1(normalize_url(url).encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, url: str) -> dict | None:
+        """返回缓存条目，fresh表示是否在有效期内"""
+        cache_file = self._path(url)
+        try:
+            with open(cache_file, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(cache_file)  # 更新访问时间，用于LRU
+        except OSError:
+            pass
+        entry["fresh"] = entry.get("expires", 0) > time.time()
+        return entry
+
+    def conditional_headers(self, entry: dict) -> dict:
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url: str, text: str, etag: str = None, last_modified: str = None):
+        entry = {
+            "url": normalize_url(url),
+            "etag": etag,
+            "last_modified": last_modified,
+            "expires": time.time() + self.ttl,
+            "text": text,
+        }
+        if not self._write(url, entry):
+            return
+        with self._lock:
+            self._writes += 1
+            if self._total_size <= self.max_size and self._writes < EVICT_INTERVAL:
+                return
+        self.evict()
+
+    def refresh(self, url: str, entry: dict):
+        # 304 Not Modified：延长有效期
+        entry = {k: v for k, v in entry.items() if k != "fresh"}
+        entry["expires"] = time.time() + self.ttl
+        self._write(url, entry)
+
+    def _write(self, url: str, entry: dict) -> bool:
+        # 写入失败（如磁盘已满、目录只读）时只记录警告，不影响已获取的数据
+        cache_file = self._path(url)
+        temp_file = cache_file.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            size = temp_file.stat().st_size
+            try:
+                size -= cache_file.stat().st_size  # 覆盖已有条目时只累计差值
+            except OSError:
+                pass
+            temp_file.replace(cache_file)
+        except OSError as err:
+            logging.warning(f"Write cache failed: {url}, {err}")
+            temp_file.unlink(missing_ok=True)
+            return False
+        with self._lock:
+            self._total_size += size
+        return True
+
+    def _scan(self) -> list:
+        files = []
+        for cache_file in self.cache_dir.glob("*.json"):
+            try:
+                files.append((cache_file.stat(), cache_file))
+            except OSError:
+                continue
+        return files
+
+    def evict(self):
+        """重新统计缓存目录，超过max_size时删除最久未访问的条目"""
+        with self._lock:
+            self._writes = 0
+            files = self._scan()
+            total = sum(st.st_size for st, _ in files)
+            if total > self.max_size:
+                for st, cache_file in sorted(files, key=lambda x: x[0].st_mtime):
+                    logging.debug(f"evict cache {cache_file}")
+                    try:
+                        cache_file.unlink(missing_ok=True)
+                    except OSError as err:
+                        logging.warning(f"Evict cache failed: {cache_file}, {err}")
+                        continue
+                    total -= st.st_size
+                    if total <= self.max_size:
+                        break
+            self._total_size = total
+
+    def clear(self):
+        with self._lock:
+            for cache_file in self.cache_dir.glob("*.json"):
+                cache_file.unlink(missing_ok=True)
+            self._total_size = 0
+
+
+_default_cache = None
+_default_failed = False
+_default_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache | None:
+    """默认缓存；缓存目录无法创建时返回None（不使用缓存），只尝试一次"""
+    global _default_cache, _default_failed
+    with _default_lock:
+        if _default_cache is None and not _default_failed:
+            try:
+                _default_cache = ResponseCache(Path(CACHE_PATH).expanduser())
+            except OSError as err:
+                logging.warning(f"Cache disabled: {CACHE_PATH}, {err}")
+                _default_failed = True
+    return _default_cache
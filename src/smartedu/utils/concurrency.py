@@ -0,0 +1,113 @@
+"""
+按主机自适应调整下载并发数（AIMD）：吞吐提升时加1，延迟变长且吞吐不增时减1，429/5xx/超时时减半
+"""
+
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+# 原来固定为5个线程；自适应后默认上限为16，每个主机从4个开始按实际情况增减
+DEFAULT_CEILING = 16
+DEFAULT_INITIAL = 4
+ERROR_RATE = 0.1  # 一轮中超过10%失败视为过载
+GAIN = 1.1  # 吞吐提升10%以上才继续增加
+LATENCY_GROWTH = 1.2  # 平均耗时增加20%以上且吞吐不增时减少
+
+
+def is_overload(code: int) -> bool:
+    # 限流、服务端错误、连接异常/超时（code = -1）
+    return code == 429 or code >= 500 or code == -1
+
+
+class _HostState:
+    __slots__ = ("limit", "in_flight", "count", "errors", "bytes", "elapsed")
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+
+
+class AdaptiveLimiter:
+    """
+    每个主机一个并发上限，下载前acquire，结束后release上报状态码和字节数
+
+    每完成limit个请求为一轮，与上一轮比较吞吐和平均耗时后调整上限；
+    吞吐按 字节数 / 累计耗时 * 并发数 估算，不受一轮起止时间的影响；
+    adaptive=False时固定为ceiling
+    """
+
+    def __init__(
+        self, ceiling: int = DEFAULT_CEILING, initial: int = DEFAULT_INITIAL, adaptive=True
+    ):
+        self.ceiling = max(1, ceiling)
+        self.initial = min(initial, self.ceiling) if adaptive else self.ceiling
+        self.adaptive = adaptive
+        self._hosts = {}
+        self._previous = {}  # host -> (吞吐, 平均耗时)
+        self._cond = threading.Condition()
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.initial)
+        return state
+
+    def limit(self, url: str) -> int:
+        with self._cond:
+            return self._state(urlparse(url).netloc).limit
+
+    def acquire(self, url: str) -> float:
+        """等待空闲名额，返回开始时间"""
+        host = urlparse(url).netloc
+        with self._cond:
+            state = self._state(host)
+            while state.in_flight >= state.limit:
+                self._cond.wait()
+            state.in_flight += 1
+        return time.perf_counter()
+
+    def release(self, url: str, start: float, code: int, size: int = 0):
+        host = urlparse(url).netloc
+        with self._cond:
+            state = self._state(host)
+            state.in_flight -= 1
+            state.count += 1
+            state.elapsed += time.perf_counter() - start
+            if is_overload(code):
+                state.errors += 1
+            elif size > 0:
+                state.bytes += size
+            if self.adaptive and state.count >= state.limit:
+                self._adjust(host, state)
+            self._cond.notify_all()
+
+    def _adjust(self, host: str, state: _HostState):
+        latency = max(state.elapsed / state.count, 1e-6)
+        throughput = state.bytes / state.count / latency * state.limit
+        old_limit = state.limit
+        previous = self._previous.get(host)
+
+        if state.errors > state.count * ERROR_RATE:
+            # 过载的一轮不作为比较基准，减半后重新加性增长
+            state.limit = max(1, state.limit // 2)
+            self._previous.pop(host, None)
+        elif previous is None or throughput > previous[0] * GAIN:
+            state.limit = min(self.ceiling, state.limit + 1)
+        elif latency > previous[1] * LATENCY_GROWTH:
+            state.limit = max(1, state.limit - 1)
+
+        if state.limit != old_limit:
+            logging.debug(
+                f"host = {host}, limit {old_limit} -> {state.limit}, "
+                f"throughput = {throughput / 1024:.0f} KB/s, latency = {latency:.3f}s, "
+                f"errors = {state.errors}/{state.count}"
+            )
+        if not state.errors:
+            self._previous[host] = (throughput, latency)
+        state.count = state.errors = state.bytes = 0
+        state.elapsed = 0.0
@@ -2,29 +2,227 @@
 使用requests库下载文件
 """
 
+import json
 import logging
+import re
+import threading
+import time
+from concurrent.futures import as_completed, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from typing import Any
 
 import requests
 
+from .cache import ResponseCache
+from .concurrency import is_overload
+from .mirrors import get_scoreboard, mirror_urls, ranked_urls
+from .progress import FileProgress
+from .retry import parse_retry_after, RetryPolicy
+from .session import get_session
 
-def fetch_file(url: str, headers: dict, timeout: int = 5, data_format: str = "json") -> Any:
-    # 获取json配置
-    try:
-        response = requests.get(url, timeout=timeout, headers=headers)
-        logging.debug(f"URL = {url}, status = {response.status_code}")
-        if response.ok:
-            return response.json() if data_format == "json" else response.text
 
-    except requests.exceptions.RequestException as res_err:
-        logging.warning(f"URL: {url}; Request Error: {res_err}")
-    except IOError as io_err:
-        logging.warning(f"URL: {url}; IO Error: {io_err}")
+class DownloadCancelled(Exception):
+    """下载被取消：已写入的.part文件和记录保留，再次下载时续传"""
+
+
+class RangeMismatch(Exception):
+    """续传时服务器返回的范围与.part文件不一致或不能满足（416）：丢弃.part文件和记录，从头下载"""
+
+
+def check_cancel(cancel: threading.Event = None):
+    if cancel is not None and cancel.is_set():
+        raise DownloadCancelled()
+
+
+def _parse_data(text: str, data_format: str) -> Any:
+    return json.loads(text) if data_format == "json" else text
+
+
+class FetchPlan:
+    """
+    一次配置请求的策略：缓存、镜像顺序、响应的处理和重试；fetch_file 和asyncio引擎共用，只有I/O不同
+
+    依次调用：load_cache()；每轮按 mirrors() 请求，handle() 处理响应，得到结果时 store()；
+    所有镜像都失败时 retry_delay() 决定是否等待后再试一轮；最后 stale() 使用过期的缓存
+    load_cache()、store() 读写缓存文件，asyncio引擎在线程中调用
+    对冲请求只调用一次 load_cache()，主请求和对冲请求由 for_mirror() 生成
+    """
+
+    def __init__(
+        self,
+        url: str,
+        headers: dict,
+        data_format: str = "json",
+        cache: ResponseCache = None,
+        failover: bool = True,
+        retry: RetryPolicy = None,
+    ):
+        self.url = url
+        self.headers = headers
+        self.data_format = data_format
+        self.cache = cache
+        self.failover = failover
+        self.retry = retry
+        self.entry = None
+        self.retries = 0
+        self.code, self.retry_after = 0, None  # 本轮最后的错误码和Retry-After
+
+    def load_cache(self) -> tuple[bool, Any]:
+        """有效期内返回 (True, 缓存的数据)；否则返回 (False, None)，过期的缓存改为条件请求"""
+        self.entry = self.cache.get(self.url) if self.cache else None
+        if self.entry and self.entry["fresh"]:
+            logging.debug(f"URL = {self.url}, cache hit")
+            return True, _parse_data(self.entry["text"], self.data_format)
+        if self.entry:
+            self.headers = {**self.headers, **self.cache.conditional_headers(self.entry)}
+        if self.retry:
+            self.retry.budget.record_request()
+        return False, None
+
+    def for_mirror(self, mirror_url: str, failover: bool, retry: RetryPolicy = None) -> "FetchPlan":
+        """向 mirror_url 发出的请求：共用已读取的缓存条目和条件请求头，不再读取缓存、计入重试预算"""
+        plan = FetchPlan(mirror_url, self.headers, self.data_format, self.cache, failover, retry)
+        plan.entry = self.entry
+        return plan
+
+    def mirrors(self) -> list:
+        # failover时按镜像记分依次尝试各主机（s-file-1/2/3）
+        return ranked_urls(self.url) if self.failover else [self.url]
+
+    def handle(self, status: int, headers, text: str) -> tuple[bool, Any]:
+        """
+        一个镜像的响应：429/5xx返回 (False, None)，换下一个镜像；
+        其他返回 (True, 数据)：304为缓存的数据，2xx为解析后的响应，4xx等为None
+        """
+        if is_overload(status):
+            self.code = status
+            self.retry_after = parse_retry_after(headers.get("retry-after"))
+            return False, None
+        if self.entry and status == 304:
+            return True, _parse_data(self.entry["text"], self.data_format)
+        if 200 <= status < 300:
+            return True, _parse_data(text, self.data_format)
+        return True, None
+
+    def network_error(self):
+        self.code = -1
+
+    def store(self, status: int, headers, text: str):
+        # 304延长缓存有效期，2xx保存响应和验证信息
+        if self.cache is None:
+            return
+        if self.entry and status == 304:
+            self.cache.refresh(self.url, self.entry)
+        elif 200 <= status < 300:
+            etag = headers.get("etag")
+            last_modified = headers.get("last-modified")
+            self.cache.put(self.url, text, etag, last_modified)
+
+    def retry_delay(self) -> float | None:
+        """所有镜像都失败后，按重试策略再试一轮前等待的秒数；不再重试时返回None"""
+        if self.retry is None or not self.retry.should_retry(self.retries, self.code):
+            return None
+        seconds = self.retry.delay(self.retries, self.retry_after)
+        logging.debug(f"retry {self.retries + 1} after {seconds:.2f}s")
+        self.retries += 1
+        self.code, self.retry_after = 0, None
+        return seconds
+
+    def stale(self) -> Any:
+        # 网络错误时使用过期的缓存
+        if self.entry:
+            logging.debug(f"URL = {self.url}, use stale cache")
+            return _parse_data(self.entry["text"], self.data_format)
+        return None
+
+
+def _fetch_mirrors(plan: FetchPlan, timeout, session) -> tuple[bool, Any]:
+    """依次请求各镜像，返回 (是否得到结果, 数据)"""
+    scoreboard = get_scoreboard()
+    for mirror_url in plan.mirrors():
+        start = time.perf_counter()
+        try:
+            response = (session or get_session(mirror_url)).get(
+                mirror_url, timeout=timeout, headers=plan.headers
+            )
+            logging.debug(f"URL = {mirror_url}, status = {response.status_code}")
+            ok = not is_overload(response.status_code)
+            scoreboard.record(mirror_url, time.perf_counter() - start, ok, len(response.content))
+            found, data = plan.handle(response.status_code, response.headers, response.text)
+            if found:
+                plan.store(response.status_code, response.headers, response.text)
+                return True, data
+
+        except requests.exceptions.RequestException as res_err:
+            scoreboard.record(mirror_url, time.perf_counter() - start, False)
+            logging.warning(f"URL: {mirror_url}; Request Error: {res_err}")
+            plan.network_error()
+        except IOError as io_err:
+            logging.warning(f"URL: {mirror_url}; IO Error: {io_err}")
+        except Exception as err:
+            logging.error(f"Download failed: {mirror_url}, 错误: {err}")
+    return False, None
+
+
+def fetch_file(
+    url: str,
+    headers: dict,
+    timeout: int = 5,
+    data_format: str = "json",
+    session: requests.Session = None,
+    cache: ResponseCache = None,
+    failover: bool = True,
+    retry: RetryPolicy = None,
+) -> Any:
+    # 获取json配置；使用cache时，有效期内直接返回，过期后条件请求重新验证
+    # failover时按镜像记分依次尝试各主机（s-file-1/2/3），429/5xx/网络错误时换下一个
+    # retry时所有主机都失败后，按重试策略等待后再试一轮；规则见 FetchPlan
+    plan = FetchPlan(url, headers, data_format, cache, failover, retry)
+    found, data = plan.load_cache()
+    if found:
+        return data
+    return run_plan(plan, timeout, session)
+
+
+def run_plan(plan: FetchPlan, timeout: int = 5, session: requests.Session = None) -> Any:
+    """已调用 load_cache() 且缓存无效时，按 plan 请求各镜像，失败时重试，最后使用过期的缓存"""
+    while True:
+        found, data = _fetch_mirrors(plan, timeout, session)
+        if found:
+            return data
+        seconds = plan.retry_delay()
+        if seconds is None:
+            break
+        time.sleep(seconds)
+    return plan.stale()
+
+
+def _load_journal(journal_file: Path, url: str) -> dict:
+    # 读取未完成下载的记录（URL、文件大小、ETag等），URL不一致时视为无效（镜像主机可以不同）
+    if not journal_file.exists():
+        return {}
+    try:
+        with open(journal_file, encoding="utf-8") as f:
+            journal = json.load(f)
+        if journal.get("url") in mirror_urls(url):
+            return journal
     except Exception as err:
-        logging.error(f"Download failed: {url}, 错误: {err}")
+        logging.debug(f"Invalid journal: {journal_file}, {err}")
+    return {}
+
+
+def _save_journal(journal_file: Path, journal: dict):
+    with open(journal_file, "w", encoding="utf-8") as f:
+        json.dump(journal, f, ensure_ascii=False)
+
 
-    return None
+def _parse_content_range(value: str) -> tuple[int, int]:
+    # "bytes 100-199/1000" -> (100, 1000)
+    match = re.match(r"bytes (\d+)-\d+/(\d+)", value or "")
+    if not match:
+        return -1, 0
+    return int(match.group(1)), int(match.group(2))
 
 
 def download_file(
@@ -34,50 +232,375 @@ def download_file(
     timeout: int = 5,
     stream: bool = True,
     chunk_size: int = 8192,
+    session: requests.Session = None,
+    resume: bool = True,
+    segment_size: int = 0,
+    segment_workers: int = 4,
+    segment_threshold: int = 0,
+    progress: FileProgress = None,
+    cancel: threading.Event = None,
 ):
-    """下载单个文件"""
+    """下载单个文件，先写入.part文件，中断后再次下载时用Range续传
+
+    segment_size > 0 时，大于 segment_threshold（默认等于segment_size）的文件
+    按segment_size的字节范围分段，由segment_workers个线程并发下载
+    progress: 累加已下载的字节数，见 utils.progress
+    cancel: 设置后在下一个数据块处停止，返回 "cancelled"，保留.part文件以便续传
+    """
+    session = session or get_session(url)
+    segment_threshold = segment_threshold or segment_size
+    request_headers = headers
     out = {"url": url, "status": "failed", "code": -1, "file": str(file_path), "size": -1}
+    start_time = time.perf_counter()
+
+    file_path = Path(file_path)
+    part_file = Path(f"{file_path}.part")
+    journal_file = Path(f"{file_path}.part.json")
+    journal = _load_journal(journal_file, url) if resume and part_file.exists() else {}
+    offset = part_file.stat().st_size if journal else 0
+
+    headers = dict(headers)
+    if journal:
+        validator = journal.get("etag") or journal.get("last_modified")
+        if validator:
+            headers["If-Range"] = validator
+    if offset > 0:
+        headers["Range"] = f"bytes={offset}-"
+        logging.debug(f"resume download: {url}, offset = {offset}")
+    elif segment_size > 0:
+        # 请求整个文件的Range，从响应中获得文件大小以及服务器是否支持Range：
+        # 不超过阈值时直接读完，否则只读取第一段，其余分段并发下载
+        headers["Range"] = "bytes=0-"
+
     try:
-        with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
-            # response.raise_for_status()
-            logging.debug(f"download url = {url}, status = {response.status_code}")
-            status_code, total_size = stream_download(
-                url, file_path, headers, stream, timeout, chunk_size
+        if journal.get("segments"):
+            # 上次分段下载未完成，只下载缺失的分段
+            status_code, total_size = segmented_download(
+                None,
+                part_file,
+                url,
+                headers,
+                timeout,
+                chunk_size,
+                session,
+                journal_file,
+                journal,
+                progress,
+                cancel,
             )
-            out["code"] = status_code
-            out["size"] = total_size
-            if status_code == 200 and total_size > 0:
-                out["status"] = "success"
-            logging.debug(f"Download success: {url} -> {file_path}")
-            return out
+        elif offset > 0 and offset == journal.get("size"):
+            # 上次已下载完整，只差重命名
+            status_code, total_size = 206, offset
+            if progress:
+                progress.begin(offset, offset)
+        else:
+            # 状态码、文件大小校验和数据读取共用同一个请求
+            with session.get(url, headers=headers, stream=stream, timeout=timeout) as response:
+                logging.debug(f"download url = {url}, status = {response.status_code}")
+                if response.status_code == 416:
+                    # 记录失效（如服务器上的文件变小），续传时从头下载，否则删除后下次重新下载
+                    if offset > 0:
+                        raise RangeMismatch(f"Range not satisfiable, offset = {offset}")
+                    part_file.unlink(missing_ok=True)
+                    journal_file.unlink(missing_ok=True)
+                if not response.ok:
+                    out["code"] = response.status_code
+                    out["retry_after"] = parse_retry_after(response.headers.get("retry-after"))
 
+                start, total_size = _parse_content_range(response.headers.get("content-range"))
+                segmented = total_size > segment_threshold > 0
+                if offset == 0 and response.status_code == 206 and start == 0 and segmented:
+                    journal = {
+                        "url": url,
+                        "size": total_size,
+                        "etag": response.headers.get("etag"),
+                        "last_modified": response.headers.get("last-modified"),
+                        "segments": {"size": segment_size, "workers": segment_workers, "done": []},
+                    }
+                    status_code, total_size = segmented_download(
+                        response,
+                        part_file,
+                        url,
+                        headers,
+                        timeout,
+                        chunk_size,
+                        session,
+                        journal_file,
+                        journal,
+                        progress,
+                        cancel,
+                    )
+                else:
+                    status_code, total_size = stream_download(
+                        response,
+                        part_file,
+                        stream,
+                        chunk_size,
+                        offset,
+                        journal_file,
+                        url,
+                        progress,
+                        cancel,
+                        journal.get("size", 0),
+                    )
+
+        validators = _load_journal(journal_file, url)
+        part_file.replace(file_path)
+        journal_file.unlink(missing_ok=True)
+        out["code"] = status_code
+        out["size"] = total_size
+        out["remote_size"] = total_size
+        out["etag"] = validators.get("etag")
+        out["last_modified"] = validators.get("last_modified")
+        if status_code in [200, 206] and total_size > 0:
+            out["status"] = "success"
+        logging.debug(f"Download success: {url} -> {file_path}")
+        elapsed = time.perf_counter() - start_time
+        get_scoreboard().record(url, elapsed, True, total_size - offset)
+        return out
+
+    except DownloadCancelled:
+        logging.debug(f"Download cancelled: {url} -> {part_file}")
+        out["status"] = "cancelled"
+        return out
+    except RangeMismatch as err:
+        if offset == 0 and "Range" not in headers:
+            logging.warning(f"URL: {url}; {err}")
+            return out
+        # 不使用Range从头下载一次（不分段），避免续传出截断或错位的文件
+        logging.debug(f"URL: {url}; {err}, restart")
+        part_file.unlink(missing_ok=True)
+        journal_file.unlink(missing_ok=True)
+        return download_file(
+            file_path,
+            url,
+            request_headers,
+            timeout,
+            stream,
+            chunk_size,
+            session,
+            resume=False,
+            progress=progress,
+            cancel=cancel,
+        )
     except requests.exceptions.RequestException as res_err:
         logging.warning(f"URL: {url}; Request Error: {res_err}")
     except IOError as io_err:
         logging.warning(f"URL: {url}; IO Error: {io_err}")
     except Exception as err:
         logging.error(f"Download failed: {url}, 错误: {err}")
+    if is_overload(out["code"]):
+        get_scoreboard().record(url, time.perf_counter() - start_time, False)
     return out
 
 
+def check_modified(
+    url: str,
+    headers: dict,
+    record: dict,
+    timeout: int = 5,
+    session: requests.Session = None,
+) -> bool:
+    """
+    用HEAD条件请求确认远程文件相对record（etag/last_modified/remote_size）是否有变化，无法确认时视为有变化
+    remote_size 为下载时服务器上的大小（HLS为播放列表的大小），没有时使用size
+    """
+    session = session or get_session(url)
+    headers = dict(headers)
+    if record.get("etag"):
+        headers["If-None-Match"] = record["etag"]
+    if record.get("last_modified"):
+        headers["If-Modified-Since"] = record["last_modified"]
+
+    try:
+        response = session.head(url, headers=headers, timeout=timeout, allow_redirects=True)
+        logging.debug(f"HEAD url = {url}, status = {response.status_code}")
+        if response.status_code == 304:
+            return False
+        if not response.ok:
+            return True
+
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        size = int(response.headers.get("content-length", -1))
+        if etag and record.get("etag"):
+            return etag != record["etag"]
+        if size != record.get("remote_size", record.get("size")):
+            return True
+        return not (last_modified and last_modified == record.get("last_modified"))
+    except requests.exceptions.RequestException as res_err:
+        logging.warning(f"URL: {url}; Request Error: {res_err}")
+    return True
+
+
+def _write_segment(
+    response, file_path: Path, start: int, end: int, chunk_size, progress=None, cancel=None
+):
+    # 按位置写入预分配文件中的[start, end]区间；响应更长时（如探测请求）只读取该区间
+    counter = progress.counter() if progress else None
+    remaining = end - start + 1
+    with open(file_path, "r+b") as fw:
+        fw.seek(start)
+        for data in response.iter_content(chunk_size=chunk_size):
+            check_cancel(cancel)
+            data = data[:remaining]
+            fw.write(data)
+            remaining -= len(data)
+            if counter:
+                counter.add(len(data))
+            if remaining == 0:
+                break
+    if remaining != 0:
+        raise RuntimeError(f"Segment size mismatch: {start}-{end}, missing {remaining}")
+
+
+def _download_segment(
+    url, headers, timeout, chunk_size, session, progress, cancel, file_path, start, end
+):
+    check_cancel(cancel)
+    headers = dict(headers)
+    headers["Range"] = f"bytes={start}-{end}"
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        range_start, _ = _parse_content_range(response.headers.get("content-range"))
+        if response.status_code == 200:
+            # If-Range不匹配（文件已更新）或服务器不再支持Range
+            raise ValueError(f"Range ignored: {start}-{end}")
+        if response.status_code != 206 or range_start != start:
+            status_code = response.status_code
+            raise RuntimeError(f"Range not satisfied: {start}-{end}, status = {status_code}")
+        _write_segment(response, file_path, start, end, chunk_size, progress, cancel)
+
+
+def segmented_download(
+    response: requests.Response,
+    file_path: Path,
+    url: str,
+    headers: dict,
+    timeout: int,
+    chunk_size: int,
+    session: requests.Session,
+    journal_file: Path,
+    journal: dict,
+    progress: FileProgress = None,
+    cancel: threading.Event = None,
+):
+    """分段并发下载到预分配文件中，每完成一段更新记录，中断后只需下载缺失分段"""
+    total_size = journal["size"]
+    segment_size = journal["segments"]["size"]
+    workers = journal["segments"]["workers"]
+    done = set(journal["segments"]["done"])
+    ranges = [
+        (i, start, min(start + segment_size, total_size) - 1)
+        for i, start in enumerate(range(0, total_size, segment_size))
+    ]
+    logging.debug(f"segmented download: {url}, size = {total_size}, segments = {len(ranges)}")
+
+    if progress:
+        progress.begin(total_size, sum(end - start + 1 for i, start, end in ranges if i in done))
+    lock = threading.Lock()
+
+    def mark_done(index):
+        with lock:
+            done.add(index)
+            journal["segments"]["done"] = sorted(done)
+            _save_journal(journal_file, journal)
+
+    if response is not None:
+        # 预分配文件，第一段直接来自探测请求，占用一个并发名额
+        with open(file_path, "wb") as fw:
+            fw.truncate(total_size)
+        _save_journal(journal_file, journal)
+        workers = max(workers - 1, 1)
+
+    fetch = partial(
+        _download_segment, url, headers, timeout, chunk_size, session, progress, cancel, file_path
+    )
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # 先提交其余分段，再在当前线程读取探测请求的第一段，各分段同时下载
+            futures = {
+                executor.submit(fetch, start, end): index
+                for index, start, end in ranges
+                if index not in done and not (index == 0 and response is not None)
+            }
+            try:
+                if response is not None:
+                    _, start, end = ranges[0]
+                    _write_segment(response, file_path, start, end, chunk_size, progress, cancel)
+                    mark_done(0)
+                for future in as_completed(futures):
+                    future.result()
+                    mark_done(futures[future])
+            except BaseException:
+                # 出错或取消时，尚未开始的分段不再下载
+                for future in futures:
+                    future.cancel()
+                raise
+    except ValueError:
+        # 已下载的分段失效，删除记录后下次重新下载
+        journal_file.unlink(missing_ok=True)
+        raise
+
+    if len(done) != len(ranges) or file_path.stat().st_size != total_size:
+        raise RuntimeError("Could not download file")
+    return 206, total_size
+
+
 def stream_download(
-    url: str, file_path: str | Path, headers: dict, stream: bool, timeout: int, chunk_size: int
+    response: requests.Response,
+    file_path: str | Path,
+    stream: bool,
+    chunk_size: int,
+    offset: int = 0,
+    journal_file: str | Path = None,
+    url: str = None,
+    progress: FileProgress = None,
+    cancel: threading.Event = None,
+    expected_size: int = 0,
 ):
-    """下载单个文件"""
-    with requests.get(url, headers=headers, stream=stream, timeout=timeout) as response:
-        status_code = response.status_code
+    """
+    从已建立的响应中读取数据并写入文件；服务器不支持Range时从头写入
+    206响应的起点不是offset，或文件大小与记录的expected_size不同时抛出RangeMismatch
+    """
+    status_code = response.status_code
+    start, total_size = _parse_content_range(response.headers.get("content-range"))
+    if status_code == 206:
+        if start != offset or expected_size and total_size != expected_size:
+            content_range = response.headers.get("content-range")
+            raise RangeMismatch(f"Content-Range = {content_range}, offset = {offset}")
+        mode = "ab" if offset > 0 else "wb"
+    else:
+        offset = 0
+        mode = "wb"
         total_size = int(response.headers.get("content-length", 0))
-        logging.debug(f"download url = {url}, status = {status_code}, size= {total_size}")
-
-        if response.ok and total_size > 0:
-            with open(file_path, "wb") as fw:
-                if stream:
-                    for data in response.iter_content(chunk_size=chunk_size):
-                        fw.write(data)
-                        fw.flush()
-                else:
-                    fw.write(response.content)
+    logging.debug(f"download url = {response.url}, status = {status_code}, size= {total_size}")
+
+    if response.ok and total_size > 0:
+        if journal_file:
+            journal = {
+                "url": url or response.url,
+                "size": total_size,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+            }
+            _save_journal(journal_file, journal)
+
+        counter = None
+        if progress:
+            progress.begin(total_size, offset)
+            counter = progress.counter()
+        with open(file_path, mode) as fw:
+            if stream:
+                for data in response.iter_content(chunk_size=chunk_size):
+                    check_cancel(cancel)
+                    fw.write(data)
+                    if counter:
+                        counter.add(len(data))
+            else:
+                fw.write(response.content)
+                if counter:
+                    counter.add(len(response.content))
 
-        if total_size == 0 or Path(file_path).exists() and Path(file_path).stat().st_size != total_size:
-            raise RuntimeError("Could not download file")
-        return status_code, total_size
+    if total_size == 0 or Path(file_path).exists() and Path(file_path).stat().st_size != total_size:
+        raise RuntimeError("Could not download file")
+    return status_code, total_size
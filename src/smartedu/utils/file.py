@@ -1,26 +1,42 @@
 import logging
 import shutil
 import tempfile
+import threading
 from pathlib import Path
 from urllib.parse import urlparse
 
+# 本进程中已分配（正在下载）的文件名，避免并发任务写入同一个.part文件
+_claimed_files = set()
+_claimed_lock = threading.Lock()
+
 
 def gen_filename(url, name, save_path, default="output.txt"):
-    """确保文件名唯一，如果存在则添加添加(1), (2)等后缀"""
+    """确保文件名唯一，如果存在则添加添加(1), (2)等后缀
+
+    未完成的下载（.part文件）不占用文件名，再次下载时沿用同一文件名以便续传
+    """
     save_path = Path(save_path)
     filename = name if name else (Path(urlparse(url).path).name if url else default)
     new_filename = save_path / filename
     stem = new_filename.stem
 
     counter = 0
-    while new_filename.exists():
-        counter += 1
-        new_filename = save_path / f"{stem}({counter}){new_filename.suffix}"
+    with _claimed_lock:
+        while new_filename.exists() or new_filename in _claimed_files:
+            counter += 1
+            new_filename = save_path / f"{stem}({counter}){new_filename.suffix}"
+        _claimed_files.add(new_filename)
 
     logging.debug(f"new file = {new_filename}, counter={counter}")
     return new_filename
 
 
+def release_filename(file_path):
+    # 下载结束后释放文件名
+    with _claimed_lock:
+        _claimed_files.discard(Path(file_path))
+
+
 def clean_dir(temp_dir):
     # 清理临时文件
     try:
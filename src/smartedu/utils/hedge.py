@@ -0,0 +1,100 @@
+"""
+对冲请求：配置请求超过近期延迟的p95仍未返回时，向另一个镜像主机再发一次，取先返回的结果
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import as_completed, Executor, wait
+from functools import partial
+from typing import Any
+
+from .cache import ResponseCache
+from .dl import FetchPlan, run_plan
+from .mirrors import ranked_urls
+from .retry import RetryPolicy
+
+MIN_SAMPLES = 20  # 样本太少时不对冲
+WINDOW = 200
+
+
+class LatencyTracker:
+    """最近WINDOW个请求的耗时，线程安全"""
+
+    def __init__(self, quantile: float = 0.95, window: int = WINDOW):
+        self.quantile = quantile
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, elapsed: float):
+        with self._lock:
+            self._samples.append(elapsed)
+
+    def delay(self) -> float | None:
+        """对冲等待时间（p95），样本不足时返回None"""
+        with self._lock:
+            if len(self._samples) < MIN_SAMPLES:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(int(len(samples) * self.quantile), len(samples) - 1)]
+
+
+def hedge_targets(url: str, tracker: LatencyTracker) -> tuple[str, str | None, float | None]:
+    """
+    (主请求的镜像, 对冲请求的镜像, 对冲前等待的秒数)；只有一个镜像或样本不足时不对冲，后两项为None
+    主请求出错时按fetch_file的规则换主机、重试，对冲请求只请求一次；同步和asyncio引擎共用
+    """
+    mirrors = ranked_urls(url)
+    delay = tracker.delay()
+    if len(mirrors) < 2 or delay is None:
+        return mirrors[0], None, None
+    return mirrors[0], mirrors[1], delay
+
+
+def _timed_fetch(tracker, plan, timeout):
+    start = time.perf_counter()
+    result = run_plan(plan, timeout)
+    if result is not None:
+        tracker.record(time.perf_counter() - start)
+    return result
+
+
+def hedged_fetch(
+    url: str,
+    headers: dict,
+    timeout: int,
+    data_format: str,
+    cache: ResponseCache,
+    executor: Executor,
+    tracker: LatencyTracker,
+    retry: RetryPolicy = None,
+) -> Any:
+    """
+    先请求最优镜像（出错时按fetch_file的规则换主机、重试），超过p95未返回时向次优镜像发出对冲请求
+
+    executor 应与调用方的线程池分开，否则对冲请求可能排队等待；
+    requests无法中断进行中的请求，落后的请求只是被丢弃（尚未开始的会被取消）
+    """
+    # 缓存只读取一次，一次请求只计入一次重试预算；只有主请求会重试
+    plan = FetchPlan(url, headers, data_format, cache, retry=retry)
+    found, data = plan.load_cache()
+    if found:
+        # 缓存命中不计入延迟统计
+        return data
+
+    primary, backup, delay = hedge_targets(url, tracker)
+    fetch = partial(_timed_fetch, tracker, timeout=timeout)
+    futures = [executor.submit(fetch, plan.for_mirror(primary, True, retry))]
+    if backup and not wait(futures, timeout=delay).done:
+        logging.debug(f"hedge request after {delay:.3f}s: {backup}")
+        futures.append(executor.submit(fetch, plan.for_mirror(backup, False)))
+
+    result = None
+    for future in as_completed(futures):
+        result = future.result()
+        if result is not None:
+            break
+    for future in futures:
+        future.cancel()
+    return result
@@ -0,0 +1,226 @@
+"""
+HLS(m3u8)视频下载：选择码率最高的清晰度，分片并发下载，按顺序追加到同一个文件，直接拼接，无需转封装；
+TS分片保存为.ts，带 #EXT-X-MAP 的fMP4分片（初始化段 + 各分片）保存为.mp4
+
+中断后按分片续传：.part.json 记录已写入的分片数和字节数
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+import requests
+
+from .concurrency import is_overload
+from .dl import _load_journal, _save_journal, check_cancel, DownloadCancelled
+from .file import gen_filename, release_filename
+from .mirrors import get_scoreboard, ranked_urls
+from .progress import FileProgress
+from .retry import parse_retry_after
+from .session import get_session, set_pool_size
+
+HLS_WORKERS = 8
+WINDOW = HLS_WORKERS * 4  # 已下载、尚未写入的分片上限，限制内存占用
+SEGMENT_ATTEMPTS = 3
+
+_attr_pattern = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+def is_hls(url: str) -> bool:
+    return urlsplit(url).path.lower().endswith(".m3u8")
+
+
+def _parse_attrs(value: str) -> dict:
+    # 'BANDWIDTH=800000,RESOLUTION=640x360,CODECS="a,b"' -> {"BANDWIDTH": "800000", ...}
+    return {key: v.strip('"') for key, v in _attr_pattern.findall(value)}
+
+
+def parse_playlist(text: str, base_url: str) -> dict:
+    """
+    解析m3u8，返回 {"variants": [(带宽, URL)], "segments": [URL], "init": URL, "encrypted": bool}
+    主列表（多清晰度）只有variants，媒体列表只有segments
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or lines[0] != "#EXTM3U":
+        raise ValueError(f"Not a m3u8 playlist: {base_url}")
+
+    playlist = {"variants": [], "segments": [], "init": None, "encrypted": False}
+    bandwidth = None
+    for line in lines[1:]:
+        tag, _, value = line.partition(":")
+        if tag == "#EXT-X-STREAM-INF":
+            bandwidth = int(_parse_attrs(value).get("BANDWIDTH") or 0)
+        elif tag == "#EXT-X-MAP":
+            playlist["init"] = urljoin(base_url, _parse_attrs(value)["URI"])
+        elif tag == "#EXT-X-KEY":
+            playlist["encrypted"] |= _parse_attrs(value).get("METHOD", "NONE") != "NONE"
+        elif line.startswith("#"):
+            continue
+        elif bandwidth is not None:
+            playlist["variants"].append((bandwidth, urljoin(base_url, line)))
+            bandwidth = None
+        else:
+            playlist["segments"].append(urljoin(base_url, line))
+    return playlist
+
+
+def _fetch_playlist(url, headers, timeout) -> tuple[dict, requests.Response]:
+    # 主列表时选择码率最高的清晰度，返回 (媒体列表, 主列表的响应)
+    response = get_session(url).get(url, headers=headers, timeout=timeout)
+    logging.debug(f"m3u8 url = {url}, status = {response.status_code}")
+    response.raise_for_status()
+    playlist = parse_playlist(response.text, url)
+    if playlist["variants"]:
+        bandwidth, variant_url = max(playlist["variants"])
+        logging.debug(f"m3u8 variant: {variant_url}, bandwidth = {bandwidth}")
+        variant = get_session(variant_url).get(variant_url, headers=headers, timeout=timeout)
+        variant.raise_for_status()
+        playlist = parse_playlist(variant.text, variant_url)
+    return playlist, response
+
+
+def _fetch_segment(url: str, headers: dict, timeout: int) -> bytes:
+    # 依次尝试各镜像主机，共 SEGMENT_ATTEMPTS 次
+    scoreboard = get_scoreboard()
+    mirrors = ranked_urls(url)
+    error = None
+    for attempt in range(SEGMENT_ATTEMPTS):
+        mirror_url = mirrors[attempt % len(mirrors)]
+        start = time.perf_counter()
+        try:
+            response = get_session(mirror_url).get(mirror_url, headers=headers, timeout=timeout)
+            elapsed = time.perf_counter() - start
+            scoreboard.record(mirror_url, elapsed, response.ok, len(response.content))
+            if response.ok:
+                return response.content
+            error = f"status = {response.status_code}"
+        except requests.exceptions.RequestException as res_err:
+            scoreboard.record(mirror_url, time.perf_counter() - start, False)
+            error = res_err
+        logging.debug(f"segment failed: {mirror_url}, {error}")
+    raise RuntimeError(f"Segment failed: {url}, {error}")
+
+
+def _iter_segments(urls: list, headers: dict, timeout: int, workers: int):
+    """并发下载，按顺序产出分片内容"""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        urls = iter(urls)
+
+        def submit(count):
+            for url in islice(urls, count):
+                pending.append(executor.submit(_fetch_segment, url, headers, timeout))
+
+        submit(WINDOW)
+        try:
+            while pending:
+                data = pending.popleft().result()
+                submit(1)
+                yield data
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def download_hls(
+    file_path: str | Path,
+    url: str,
+    headers: dict,
+    timeout: int = 10,
+    workers: int = HLS_WORKERS,
+    progress: FileProgress = None,
+    cancel: threading.Event = None,
+) -> dict:
+    """
+    下载m3u8中的全部分片，按顺序写入file_path；返回值与 dl.download_file 一致
+    fMP4（有 #EXT-X-MAP）完成后改用.mp4扩展名，实际保存的文件见返回值中的file
+    cancel: 设置后在下一个分片处停止，返回 "cancelled"，已写入的分片保留以便续传
+    """
+    out = {"url": url, "status": "failed", "code": -1, "file": str(file_path), "size": -1}
+    start_time = time.perf_counter()
+    set_pool_size(workers)
+
+    file_path = Path(file_path)
+    part_file = Path(f"{file_path}.part")
+    journal_file = Path(f"{file_path}.part.json")
+    try:
+        playlist, response = _fetch_playlist(url, headers, timeout)
+        if playlist["encrypted"]:
+            raise ValueError(f"Encrypted HLS is not supported: {url}")
+        segments = ([playlist["init"]] if playlist["init"] else []) + playlist["segments"]
+        if not segments:
+            raise ValueError(f"Empty playlist: {url}")
+
+        journal = _load_journal(journal_file, url) if part_file.exists() else {}
+        if journal.get("segments") != len(segments):
+            journal = {}
+        journal.update(url=url, segments=len(segments))
+        journal.update(etag=response.headers.get("etag"))
+        journal.update(last_modified=response.headers.get("last-modified"))
+        written, size = journal.get("written", 0), journal.get("size", 0)
+        if written:
+            logging.debug(f"resume hls: {url}, segments = {written}/{len(segments)}")
+
+        counter = None
+        if progress:
+            progress.begin(None, size)
+            counter = progress.counter()
+        with open(part_file, "r+b" if written else "wb") as fw:
+            fw.truncate(size)
+            fw.seek(size)
+            for data in _iter_segments(segments[written:], headers, timeout, workers):
+                check_cancel(cancel)
+                fw.write(data)
+                fw.flush()
+                written, size = written + 1, size + len(data)
+                journal.update(written=written, size=size)
+                _save_journal(journal_file, journal)
+                if counter:
+                    # 文件大小未知，按已写入分片的平均大小估计
+                    counter.add(len(data))
+                    progress.size = size * len(segments) // written
+
+        claimed = None
+        if playlist["init"] and file_path.suffix.lower() != ".mp4":
+            # fMP4不是TS格式，改用.mp4扩展名（.part文件仍按原文件名，以便续传）
+            claimed = gen_filename(None, file_path.with_suffix(".mp4").name, file_path.parent)
+            file_path = claimed
+            out["file"] = str(file_path)
+        try:
+            part_file.replace(file_path)
+        finally:
+            # 文件写入后才释放文件名，避免其他下载同时选中同一个.mp4
+            if claimed:
+                release_filename(claimed)
+        journal_file.unlink(missing_ok=True)
+        out.update(status="success", code=response.status_code, size=size)
+        out.update(etag=journal["etag"], last_modified=journal["last_modified"])
+        # 更新检查（HEAD）针对的是播放列表，记录其大小而不是视频的大小
+        out["remote_size"] = int(response.headers.get("content-length", len(response.content)))
+        logging.debug(f"Download success: {url} -> {file_path}, segments = {len(segments)}")
+        return out
+
+    except DownloadCancelled:
+        logging.debug(f"Download cancelled: {url} -> {part_file}")
+        out["status"] = "cancelled"
+        return out
+    except requests.exceptions.HTTPError as http_err:
+        response = http_err.response
+        out["code"] = response.status_code
+        out["retry_after"] = parse_retry_after(response.headers.get("retry-after"))
+        logging.warning(f"URL: {url}; HTTP Error: {http_err}")
+    except requests.exceptions.RequestException as res_err:
+        logging.warning(f"URL: {url}; Request Error: {res_err}")
+    except IOError as io_err:
+        logging.warning(f"URL: {url}; IO Error: {io_err}")
+    except Exception as err:
+        logging.error(f"Download failed: {url}, 错误: {err}")
+    if is_overload(out["code"]):
+        get_scoreboard().record(url, time.perf_counter() - start_time, False)
+    return out
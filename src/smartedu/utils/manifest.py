@@ -0,0 +1,128 @@
+"""
+下载记录（SQLite，保存在下载目录中），用于增量下载：已下载且未变化的资源直接跳过
+"""
+
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+MANIFEST_NAME = ".smartedu.db"
+UUID_PATTERN = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+def file_sha256(file_path: str | Path, chunk_size: int = 1024 * 1024) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while data := f.read(chunk_size):
+            sha256.update(data)
+    return sha256.hexdigest()
+
+
+def content_id_from_url(config_url: str) -> str:
+    # 配置链接中的contentId/courseId等（UUID）
+    match = UUID_PATTERN.search(config_url or "")
+    return match.group(0) if match else ""
+
+
+def add_column(conn: sqlite3.Connection, table: str, column: str):
+    # 旧版本创建的数据库中没有新增的列时添加，已有的行该列为NULL
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column.split()[0] not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+
+
+def resource_key(url: str) -> str:
+    # 同一资源可能来自不同的镜像主机（r1/r2/r3-ndr），只保留路径
+    return urlparse(url).path
+
+
+class DownloadManifest:
+    """
+    按 contentId + 资源URL 记录文件、大小、ETag/Last-Modified、sha256
+
+    remote_size 是服务器上资源的大小，用于判断是否有更新（见 dl.check_modified）；
+    一般与文件大小相同，HLS视频为m3u8播放列表的大小
+    """
+
+    def __init__(self, save_dir: str | Path):
+        self.save_dir = Path(save_dir)
+        self.db_file = self.save_dir / MANIFEST_NAME
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS resources (
+                content_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                file TEXT NOT NULL,
+                size INTEGER,
+                etag TEXT,
+                last_modified TEXT,
+                sha256 TEXT,
+                updated REAL,
+                remote_size INTEGER,
+                PRIMARY KEY (content_id, url)
+            )
+            """
+        )
+        add_column(self._conn, "resources", "remote_size INTEGER")
+        self._conn.commit()
+
+    def get(self, content_id: str, url: str) -> dict | None:
+        """返回已下载记录；本地文件不存在或大小不一致时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file, size, etag, last_modified, sha256, remote_size FROM resources "
+                "WHERE content_id = ? AND url = ?",
+                (content_id or "", resource_key(url)),
+            ).fetchone()
+        if row is None:
+            return None
+
+        file, size, etag, last_modified, sha256, remote_size = row
+        file_path = self.save_dir / file
+        if not file_path.exists() or file_path.stat().st_size != size:
+            logging.debug(f"manifest: file missing or changed, {file_path}")
+            return None
+        return {
+            "file": str(file_path),
+            "size": size,
+            "etag": etag,
+            "last_modified": last_modified,
+            "sha256": sha256,
+            "remote_size": size if remote_size is None else remote_size,
+        }
+
+    def update(self, content_id: str, url: str, result: dict):
+        """记录下载成功的文件"""
+        file_path = Path(result["file"])
+        try:
+            file = str(file_path.relative_to(self.save_dir))
+        except ValueError:
+            file = str(file_path)
+        sha256 = result.get("sha256") or file_sha256(file_path)
+        values = (
+            content_id or "",
+            resource_key(url),
+            file,
+            result["size"],
+            result.get("etag"),
+            result.get("last_modified"),
+            sha256,
+            time.time(),
+            result.get("remote_size"),
+        )
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", values
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,102 @@
+"""
+镜像主机记分：按主机统计延迟、吞吐、错误率（EWMA），新请求优先发往最优主机，失败时换下一个
+"""
+
+import random
+import re
+import threading
+
+from ..configs.resources import SERVER_LIST, STORAGE_LIST
+
+ALPHA = 0.3  # EWMA权重
+LARGE_SIZE = 256 * 1024  # 大于该值的响应用于估计吞吐，否则用于估计延迟
+REFERENCE_SIZE = 1024 * 1024  # 按1M文件估算传输时间
+FAILURE_COST = 5.0  # 一次失败约等于一次超时（秒）
+MAX_ERROR = 0.95
+
+# s-file-1/2/3 以及 r1/r2/r3-ndr(-private) 内容一致，可互相替换
+_mirror_groups = [
+    (re.compile(r"//({})\.".format("|".join(map(re.escape, SERVER_LIST)))), SERVER_LIST),
+    (re.compile(r"//({})(?=-ndr[\w-]*\.)".format("|".join(STORAGE_LIST))), STORAGE_LIST),
+]
+
+
+def _ewma(old, value):
+    return value if old is None else old + ALPHA * (value - old)
+
+
+class _HostScore:
+    __slots__ = ("latency", "throughput", "error")
+
+    def __init__(self):
+        self.latency = None
+        self.throughput = None
+        self.error = 0.0
+
+
+class MirrorScoreboard:
+    """线程安全；未测量过的主机代价为0，会优先被尝试"""
+
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def record(self, url: str, elapsed: float, ok: bool, size: int = 0):
+        host = _host(url)
+        with self._lock:
+            score = self._hosts.setdefault(host, _HostScore())
+            score.error = _ewma(score.error, 0.0 if ok else 1.0)
+            if ok and size >= LARGE_SIZE and elapsed > 0:
+                score.throughput = _ewma(score.throughput, size / elapsed)
+            elif ok:
+                score.latency = _ewma(score.latency, elapsed)
+
+    def cost(self, url: str) -> float:
+        """预计耗时（秒）：延迟 + 传输时间，按错误率放大，再加上失败的代价"""
+        with self._lock:
+            score = self._hosts.get(_host(url))
+            if score is None:
+                return 0.0
+            cost = score.latency or 0.0
+            if score.throughput:
+                cost += REFERENCE_SIZE / score.throughput
+            error = min(score.error, MAX_ERROR)
+            return cost / (1 - error) + error * FAILURE_COST
+
+    def rank(self, urls: list) -> list:
+        # 代价相同时随机，分散负载
+        return sorted(urls, key=lambda url: (self.cost(url), random.random()))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                host: {"latency": s.latency, "throughput": s.throughput, "error": s.error}
+                for host, s in self._hosts.items()
+            }
+
+
+def _host(url: str) -> str:
+    # "https://s-file-1.ykt.cbern.com.cn/..." -> "s-file-1.ykt.cbern.com.cn"
+    return url.split("/", 3)[2] if "//" in url else url
+
+
+def mirror_urls(url: str) -> list:
+    """同一资源在各镜像主机上的URL（含原URL），不属于镜像主机时只返回原URL"""
+    for pattern, prefixes in _mirror_groups:
+        match = pattern.search(url)
+        if match:
+            start, end = match.span(1)
+            return [url[:start] + prefix + url[end:] for prefix in prefixes]
+    return [url]
+
+
+_scoreboard = MirrorScoreboard()
+
+
+def get_scoreboard() -> MirrorScoreboard:
+    return _scoreboard
+
+
+def ranked_urls(url: str) -> list:
+    """按代价从低到高排列的镜像URL"""
+    return _scoreboard.rank(mirror_urls(url))
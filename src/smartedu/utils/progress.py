@@ -0,0 +1,140 @@
+"""
+下载进度：已下载字节数、单个文件和总体的速度、预计剩余时间、进行中的文件数
+
+每个写入数据的线程（含分段下载、视频分片）使用自己的计数器，累加时不加锁；
+界面按固定间隔调用 snapshot() 时才汇总，锁只在文件开始、结束和汇总时使用
+"""
+
+import threading
+import time
+from collections import deque
+
+SPEED_WINDOW = 3.0  # 总体速度取最近3秒的平均值
+
+
+class ByteCounter:
+    """只由一个线程写入的字节数"""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def add(self, size: int):
+        self.value += size
+
+
+class FileProgress:
+    """单个文件的进度，done包括续传前已保存的部分"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.size = None  # 文件大小，未知时为None
+        self.start_time = time.perf_counter()
+        self._counters = []
+        self._base = 0
+
+    def counter(self) -> ByteCounter:
+        # 每个写入线程取一个计数器
+        counter = ByteCounter()
+        self._counters.append(counter)
+        return counter
+
+    def begin(self, size: int | None, offset: int = 0):
+        """每次（重新）开始写入时调用：size为文件大小，offset为已保存的字节数"""
+        self.size = size or None
+        self._base = offset - self.transferred
+
+    @property
+    def transferred(self) -> int:
+        # 本次运行实际下载的字节数（含失败后重试的部分）
+        return sum(counter.value for counter in self._counters)
+
+    @property
+    def done(self) -> int:
+        return self._base + self.transferred
+
+    def speed(self, now: float = None) -> float:
+        elapsed = (now or time.perf_counter()) - self.start_time
+        return self.transferred / elapsed if elapsed > 0 else 0.0
+
+
+class ProgressTracker:
+    """汇总所有文件的下载进度"""
+
+    def __init__(self, window: float = SPEED_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._active = set()
+        self._finished_files = 0
+        self._finished_bytes = 0
+        # 已下载文件的大小，用于估计尚未开始的文件
+        self._sized_files = 0
+        self._sized_bytes = 0
+        self._samples = deque([(time.perf_counter(), 0)])
+
+    def start(self, name: str) -> FileProgress:
+        file_progress = FileProgress(name)
+        with self._lock:
+            self._active.add(file_progress)
+        return file_progress
+
+    def finish(self, file_progress: FileProgress):
+        with self._lock:
+            self._active.discard(file_progress)
+            self._finished_files += 1
+            self._finished_bytes += file_progress.transferred
+            if file_progress.transferred > 0:
+                self._sized_files += 1
+                self._sized_bytes += file_progress.done
+
+    def snapshot(self, total_files: int = None) -> dict:
+        """
+        返回 {"bytes", "speed", "eta", "in_flight", "finished", "files"}
+        speed为字节/秒；total_files（资源总数）未知或无法估计时eta为None
+        files: 进行中的文件 [{"name", "done", "size", "speed"}]
+        """
+        now = time.perf_counter()
+        with self._lock:
+            active = list(self._active)
+            files = [
+                {"name": f.name, "done": f.done, "size": f.size, "speed": f.speed(now)}
+                for f in active
+            ]
+            transferred = self._finished_bytes + sum(f.transferred for f in active)
+
+            self._samples.append((now, transferred))
+            while len(self._samples) > 2 and self._samples[1][0] <= now - self.window:
+                self._samples.popleft()
+            start, start_bytes = self._samples[0]
+            speed = (transferred - start_bytes) / (now - start) if now > start else 0.0
+
+            eta = None
+            pending = max(total_files - self._finished_files - len(active), 0) if total_files else 0
+            if total_files is not None and speed > 0 and (pending == 0 or self._sized_files):
+                # 进行中的文件按剩余字节，尚未开始的按已下载文件的平均大小估计
+                remaining = sum(max(f["size"] - f["done"], 0) for f in files if f["size"])
+                if pending:
+                    remaining += pending * self._sized_bytes / self._sized_files
+                eta = remaining / speed
+
+            return {
+                "bytes": transferred,
+                "speed": speed,
+                "eta": eta,
+                "in_flight": len(active),
+                "finished": self._finished_files,
+                "files": files,
+            }
+
+
+def format_speed(speed: float) -> str:
+    return f"{speed / 1024 / 1024:.2f} MB/s"
+
+
+def format_eta(eta: float | None) -> str:
+    if eta is None:
+        return "--:--"
+    minutes, seconds = divmod(int(eta), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
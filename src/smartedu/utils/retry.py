@@ -0,0 +1,101 @@
+"""
+重试策略：按错误类型决定是否重试，指数退避 + 随机抖动，遵循Retry-After，整批请求共享重试预算
+"""
+
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# 各类错误的最大重试次数；其他4xx（如404）不重试
+RETRY_RULES = {
+    "network": 3,  # 连接错误、超时、数据不完整（code = -1）
+    "throttled": 4,  # 429
+    "server": 2,  # 5xx
+}
+BASE_DELAY = 0.5
+MAX_DELAY = 10.0
+MAX_RETRY_AFTER = 60.0
+
+
+def error_class(code: int) -> str | None:
+    if code == -1:
+        return "network"
+    if code == 429:
+        return "throttled"
+    if code >= 500:
+        return "server"
+    return None
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    # Retry-After: 秒数或HTTP日期
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """整批请求的重试预算：重试次数不超过 min_retries + ratio * 请求数，避免故障时请求量成倍增加"""
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.requests = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self.retries >= self.min_retries + self.ratio * self.requests:
+                return False
+            self.retries += 1
+            return True
+
+
+class RetryPolicy:
+    """同一批下载共享一个实例（线程安全）"""
+
+    def __init__(
+        self,
+        rules: dict = None,
+        base_delay: float = BASE_DELAY,
+        max_delay: float = MAX_DELAY,
+        budget: RetryBudget = None,
+    ):
+        self.rules = RETRY_RULES if rules is None else rules
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+
+    def should_retry(self, retries: int, code: int) -> bool:
+        """已重试retries次后，是否再试一次（消耗预算）"""
+        if retries >= self.rules.get(error_class(code), 0):
+            return False
+        if not self.budget.spend():
+            logging.debug(f"retry budget exhausted, code = {code}")
+            return False
+        return True
+
+    def delay(self, retries: int, retry_after: float = None) -> float:
+        # 指数退避 + 全抖动；服务器给出Retry-After时以其为准
+        if retry_after is not None:
+            return min(retry_after, MAX_RETRY_AFTER)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retries))
+
+    def wait(self, retries: int, retry_after: float = None):
+        seconds = self.delay(retries, retry_after)
+        logging.debug(f"retry {retries + 1} after {seconds:.2f}s")
+        time.sleep(seconds)
@@ -0,0 +1,72 @@
+"""
+按主机复用的requests会话：keep-alive连接池，线程安全
+"""
+
+import logging
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+
+
+class SessionPool:
+    """每个主机一个Session，连接池大小不小于并发数"""
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE):
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _mount(self, session: requests.Session):
+        old_adapters = set(session.adapters.values())
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        # 关闭被替换的连接池：空闲连接立即断开，进行中的请求结束后归还时断开
+        for old_adapter in old_adapters:
+            old_adapter.close()
+
+    def get(self, url: str) -> requests.Session:
+        host = urlparse(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                logging.debug(f"new session, host = {host}, pool size = {self.pool_size}")
+                session = requests.Session()
+                self._mount(session)
+                self._sessions[host] = session
+        return session
+
+    def resize(self, pool_size: int):
+        # 只扩大不缩小；旧连接池上进行中的请求不受影响
+        with self._lock:
+            if pool_size <= self.pool_size:
+                return
+            logging.debug(f"resize pool, {self.pool_size} -> {pool_size}")
+            self.pool_size = pool_size
+            for session in self._sessions.values():
+                self._mount(session)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+
+_pool = SessionPool()
+
+
+def get_session(url: str) -> requests.Session:
+    return _pool.get(url)
+
+
+def set_pool_size(pool_size: int):
+    _pool.resize(pool_size)
+
+
+def close_sessions():
+    _pool.close()
@@ -0,0 +1,235 @@
+"""
+内容寻址存储（可选）：下载的文件按sha256保存一份，再硬链接到各输出目录
+
+下载前按规范化URL查找已有文件（不同镜像、ndr/ndr-private为同一资源），
+下载后按sha256查找内容相同的文件，都只保留一份
+
+- 只使用硬链接：输出目录与存储不在同一文件系统时不使用存储，不会多保存一份
+- 保存的文件设为只读，避免在某个目录中直接修改文件时影响其他目录中的同一文件；
+  资源更新时先删除输出目录中的只读链接再保存新文件（见 remove_readonly）
+- 总大小超过 max_size 时，按最近使用时间删除旧的文件（已链接到输出目录的文件不受影响）
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import stat
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from ..configs.conf import STORE_MAX_SIZE, STORE_PATH
+from .manifest import add_column, file_sha256
+from .mirrors import mirror_urls
+
+INDEX_NAME = "index.db"
+
+
+def blob_key(url: str) -> str:
+    # 只统一主机：ndr-private -> ndr，镜像主机统一为第一个；路径（文件名）保持不变
+    url = url.split("?")[0]
+    url = re.sub("ndr-(doc-)?private", "ndr", url)
+    return mirror_urls(url)[0]
+
+
+def link_file(src: str | Path, dst: str | Path):
+    """dst 指向 src 的硬链接（替换已有文件）；跨文件系统等不支持硬链接时抛出OSError，dst不变"""
+    dst = Path(dst)
+    tmp_file = dst.with_name(f"{dst.name}.link")
+    tmp_file.unlink(missing_ok=True)
+    os.link(src, tmp_file)
+    os.replace(tmp_file, dst)
+
+
+def _set_readonly(path: Path):
+    mode = path.stat().st_mode
+    path.chmod(mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def _unlink_readonly(path: Path) -> bool:
+    """删除只读文件；Windows上只读文件不能删除，先去掉只读属性。去掉了只读属性时返回True"""
+    try:
+        path.unlink(missing_ok=True)
+        return False
+    except PermissionError:
+        path.chmod(path.stat().st_mode | stat.S_IWUSR)
+        path.unlink()
+        return True
+
+
+def remove_readonly(path: str | Path, restore=None):
+    """
+    删除只读文件（如输出目录中指向blob的硬链接），以便覆盖更新；可写的文件不处理
+    Windows上去掉只读属性会同时改变blob，删除后调用restore()恢复
+    """
+    path = Path(path)
+    try:
+        if path.stat().st_mode & stat.S_IWUSR:
+            return
+    except OSError:
+        return
+    if _unlink_readonly(path) and restore:
+        restore()
+
+
+class BlobStore:
+    """
+    blobs/<sha256前2位>/<sha256>；index.db 记录 规范化URL -> sha256、大小、ETag/Last-Modified，
+    以及服务器上资源的大小（remote_size，见 manifest.DownloadManifest）
+    """
+
+    def __init__(self, store_dir: str | Path, max_size: int = STORE_MAX_SIZE):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._url_locks = {}  # 规范化URL -> [锁, 使用中的任务数]，没有任务使用时删除
+        self._conn = sqlite3.connect(self.store_dir / INDEX_NAME, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                size INTEGER,
+                etag TEXT,
+                last_modified TEXT,
+                updated REAL,
+                remote_size INTEGER
+            )
+            """
+        )
+        add_column(self._conn, "urls", "remote_size INTEGER")
+        self._conn.commit()
+        self._total_size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM "
+            "(SELECT MAX(size) AS size FROM urls GROUP BY sha256)"
+        ).fetchone()[0]
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.store_dir / "blobs" / sha256[:2] / sha256
+
+    @contextmanager
+    def lock(self, url: str):
+        # 同一资源同时只下载一次，其他任务等待后直接链接
+        key = blob_key(url)
+        with self._lock:
+            entry = self._url_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._url_locks[key]
+
+    def get(self, url: str) -> dict | None:
+        """已保存的资源，blob文件不存在或大小不一致时返回None"""
+        key = blob_key(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, size, etag, last_modified, remote_size FROM urls WHERE url = ?",
+                (key,),
+            ).fetchone()
+            if row is not None:
+                # 最近使用时间，超出大小上限时先删除最久未用的
+                self._conn.execute("UPDATE urls SET updated = ? WHERE url = ?", (time.time(), key))
+                self._conn.commit()
+        if row is None:
+            return None
+
+        sha256, size, etag, last_modified, remote_size = row
+        blob = self.blob_path(sha256)
+        if not blob.exists() or blob.stat().st_size != size:
+            logging.debug(f"store: blob missing or changed, {blob}")
+            return None
+        return {
+            "blob": str(blob),
+            "sha256": sha256,
+            "size": size,
+            "etag": etag,
+            "last_modified": last_modified,
+            "remote_size": size if remote_size is None else remote_size,
+        }
+
+    def protect(self, url: str):
+        # 恢复已保存文件的只读属性，见 remove_readonly
+        entry = self.get(url)
+        if entry is not None:
+            _set_readonly(Path(entry["blob"]))
+
+    def add(self, url: str, result: dict) -> str | None:
+        """
+        保存下载成功的文件：内容已存在时，把result["file"]替换为指向已有blob的硬链接
+        返回sha256；无法硬链接（如不在同一文件系统）时不保存，返回None
+        """
+        file_path = Path(result["file"])
+        sha256 = result.get("sha256") or file_sha256(file_path)
+        blob = self.blob_path(sha256)
+        with self._lock:
+            try:
+                if blob.exists() and blob.stat().st_size == file_path.stat().st_size:
+                    logging.debug(f"store: same content, link {file_path} -> {blob}")
+                    link_file(blob, file_path)
+                else:
+                    blob.parent.mkdir(parents=True, exist_ok=True)
+                    link_file(file_path, blob)
+                    _set_readonly(blob)
+                    self._total_size += result["size"]
+            except OSError as e:
+                logging.debug(f"store: hardlink failed, skip {file_path}, {e}")
+                return None
+
+            values = (
+                blob_key(url),
+                sha256,
+                result["size"],
+                result.get("etag"),
+                result.get("last_modified"),
+                time.time(),
+                result.get("remote_size"),
+            )
+            self._conn.execute("INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?, ?, ?)", values)
+            self._conn.commit()
+            if self._total_size > self.max_size:
+                self._evict()
+        return sha256
+
+    def _evict(self):
+        # 调用时已持有self._lock；按最近使用时间删除，直到不超过max_size
+        rows = self._conn.execute(
+            "SELECT sha256, MAX(size) FROM urls GROUP BY sha256 ORDER BY MAX(updated)"
+        ).fetchall()
+        for sha256, size in rows:
+            if self._total_size <= self.max_size:
+                break
+            logging.debug(f"store: evict {sha256}, size = {size}")
+            # 输出目录中指向该blob的链接随之变为可写（不再由存储共享，可以直接修改）
+            try:
+                _unlink_readonly(self.blob_path(sha256))
+            except OSError as e:
+                # 删除失败（如文件被占用）时保留该文件和记录，下次超出上限时再删除
+                logging.debug(f"store: evict failed, keep {sha256}, {e}")
+                continue
+            self._conn.execute("DELETE FROM urls WHERE sha256 = ?", (sha256,))
+            self._conn.commit()
+            self._total_size -= size or 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_store() -> BlobStore:
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = BlobStore(Path(STORE_PATH).expanduser())
+    return _default_store